@@ -0,0 +1,255 @@
+# bench/fake_openai.py
+"""
+로컬 OpenAI 대역 서버 (chat.completions / embeddings).
+
+실제 쿼터를 쓰지 않고 main.py 를 부하 테스트하기 위한 용도입니다.
+  python bench/fake_openai.py --port 8100 --chat-latency lognormal:1.5,0.4 --error-rate 0.02
+  OPENAI_BASE_URL=http://127.0.0.1:8100/v1 OPENAI_API_KEY=fake uvicorn main:app
+
+지연 분포 형식: fixed:초 | uniform:최소,최대 | lognormal:중앙값,sigma | normal:평균,표준편차
+
+실행 중에 장애 상황을 바꿀 수 있음 (resilience.py의 재시도/헤징/서킷 브레이커 확인용):
+  curl -X POST localhost:8100/_config -d '{"chat_latency": "fixed:30"}'    # 응답 지연(brownout)
+  curl -X POST localhost:8100/_config -d '{"error_rate": 1, "error_codes": [503]}'
+  curl -X POST localhost:8100/_config -d '{"reset": true}'                 # 기동 시 설정으로
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+EMBEDDING_DIM = 1536
+
+RESUME_KEYS = ["education", "activities", "awards", "certificates"]
+COVER_LETTER_KEYS = [
+    "reason_for_application",
+    "expertise_experience",
+    "collaboration_experience",
+    "challenging_goal_experience",
+    "growth_process",
+]
+
+
+# =========================
+# 설정
+# =========================
+def parse_latency(spec: str):
+    """'lognormal:1.5,0.4' 같은 문자열을 샘플러 함수로 변환합니다."""
+    kind, _, args = (spec or "fixed:0").partition(":")
+    nums = [float(x) for x in args.split(",") if x.strip()] or [0.0]
+    if kind == "fixed":
+        return lambda: nums[0]
+    if kind == "uniform":
+        return lambda: random.uniform(nums[0], nums[1])
+    if kind == "lognormal":
+        median, sigma = nums[0], (nums[1] if len(nums) > 1 else 0.5)
+        return lambda: random.lognormvariate(math.log(max(median, 1e-6)), sigma)
+    if kind == "normal":
+        mean, std = nums[0], (nums[1] if len(nums) > 1 else 0.1)
+        return lambda: max(0.0, random.gauss(mean, std))
+    raise ValueError(f"알 수 없는 지연 분포: {spec}")
+
+
+CONFIG: Dict[str, Any] = {
+    "chat_latency": parse_latency(os.getenv("FAKE_OPENAI_CHAT_LATENCY", "lognormal:1.5,0.4")),
+    "embedding_latency": parse_latency(os.getenv("FAKE_OPENAI_EMBEDDING_LATENCY", "lognormal:0.15,0.3")),
+    "error_rate": float(os.getenv("FAKE_OPENAI_ERROR_RATE", "0")),
+    "error_codes": [int(x) for x in os.getenv("FAKE_OPENAI_ERROR_CODES", "429,500,503").split(",")],
+    "stream_chunks": int(os.getenv("FAKE_OPENAI_STREAM_CHUNKS", "20")),
+}
+
+STATS: Dict[str, int] = {"chat": 0, "embeddings": 0, "errors": 0}
+_INITIAL_CONFIG: Dict[str, Any] = dict(CONFIG)  # /_config {"reset": true} 용
+
+app = FastAPI()
+
+
+# =========================
+# 응답 생성
+# =========================
+def _estimate_tokens(text: str) -> int:
+    # 한국어 기준 대략 2글자 ≈ 1토큰
+    return max(1, len(text) // 2)
+
+
+def _fake_embedding(text: str) -> List[float]:
+    # 입력이 같으면 항상 같은 벡터 (유사도/중복 판정 경로가 실제처럼 동작)
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+    rng = random.Random(seed)
+    vec = [rng.gauss(0.0, 1.0) for _ in range(EMBEDDING_DIM)]
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return [v / norm for v in vec]
+
+
+def _fake_completion_content(messages: List[Dict[str, Any]]) -> str:
+    system = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+    user = next((m.get("content", "") for m in messages if m.get("role") == "user"), "")
+    if "기업 분석 전문가" in system:
+        return json.dumps({
+            "company_summary": "가짜 기업 요약입니다.",
+            "key_values": "고객 중심, 데이터 기반 의사결정",
+            "competencies_to_highlight": ["문제 해결", "협업", "주도성"],
+            "interview_tips": "최근 제품 출시와 연결된 경험을 준비하세요.",
+        }, ensure_ascii=False)
+    if "구간별로 정리하는" in system:
+        # 포트폴리오 map 단계 (utils.map_portfolio_chunks)
+        header = user.split("\n", 1)[0]
+        return json.dumps({"chunk_summary": f"{header} 가짜 구간 요약: 프로젝트, 역할, 성과 정리."}, ensure_ascii=False)
+    if "[피드백 요청 - 이력서]" in user:
+        keys = RESUME_KEYS
+    elif "[피드백 요청 - 자기소개서]" in user:
+        keys = COVER_LETTER_KEYS
+    else:
+        keys = []
+    return json.dumps({
+        "summary": "이전 대비 변화: 구체적 수치가 추가되었습니다.\n가짜 요약 본문입니다.",
+        "overall_feedback": "가짜 총평입니다. " * 20,
+        "individual_feedbacks": {k: f"📌 핵심 문제: {k} 가짜 피드백" for k in keys},
+    }, ensure_ascii=False)
+
+
+def _maybe_error() -> Optional[JSONResponse]:
+    if CONFIG["error_rate"] > 0 and random.random() < CONFIG["error_rate"]:
+        STATS["errors"] += 1
+        code = random.choice(CONFIG["error_codes"])
+        headers = {"retry-after": "1"} if code == 429 else {}
+        return JSONResponse(
+            status_code=code,
+            content={"error": {"message": f"fake error {code}", "type": "fake_error", "code": code}},
+            headers=headers,
+        )
+    return None
+
+
+# =========================
+# 엔드포인트
+# =========================
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    STATS["chat"] += 1
+    await asyncio.sleep(CONFIG["chat_latency"]())
+    err = _maybe_error()
+    if err:
+        return err
+
+    model = body.get("model", "fake-model")
+    messages = body.get("messages", [])
+    content = _fake_completion_content(messages)
+    prompt_tokens = sum(_estimate_tokens(str(m.get("content", ""))) for m in messages)
+    completion_tokens = _estimate_tokens(content)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+    created = int(time.time())
+
+    if body.get("stream"):
+        async def _events():
+            n = max(1, CONFIG["stream_chunks"])
+            step = max(1, math.ceil(len(content) / n))
+            for i in range(0, len(content), step):
+                chunk = {
+                    "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": {"content": content[i:i + step]}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                await asyncio.sleep(0)
+            done = {
+                "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            }
+            yield f"data: {json.dumps(done)}\n\n"
+            yield "data: [DONE]\n\n"
+        return StreamingResponse(_events(), media_type="text/event-stream")
+
+    return JSONResponse(content={
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": created,
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    })
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    STATS["embeddings"] += 1
+    await asyncio.sleep(CONFIG["embedding_latency"]())
+    err = _maybe_error()
+    if err:
+        return err
+
+    inputs = body.get("input", "")
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    tokens = sum(_estimate_tokens(t) for t in inputs)
+    return JSONResponse(content={
+        "object": "list",
+        "data": [{"object": "embedding", "index": i, "embedding": _fake_embedding(t)} for i, t in enumerate(inputs)],
+        "model": body.get("model", "fake-embedding"),
+        "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+    })
+
+
+@app.get("/v1/models")
+async def models():
+    return {"object": "list", "data": [{"id": "fake-model", "object": "model", "created": 0, "owned_by": "fake"}]}
+
+
+@app.get("/_stats")
+async def stats():
+    return STATS
+
+
+@app.post("/_config")
+async def update_config(request: Request):
+    body = await request.json()
+    if body.get("reset"):
+        CONFIG.update(_INITIAL_CONFIG)
+        STATS.update({k: 0 for k in STATS})
+    for key in ("chat_latency", "embedding_latency"):
+        if key in body:
+            CONFIG[key] = parse_latency(body[key])
+    if "error_rate" in body:
+        CONFIG["error_rate"] = float(body["error_rate"])
+    if "error_codes" in body:
+        CONFIG["error_codes"] = [int(x) for x in body["error_codes"]]
+    return {k: v for k, v in CONFIG.items() if not callable(v)}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Local fake OpenAI server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--chat-latency", default=None, help="예: lognormal:1.5,0.4")
+    parser.add_argument("--embedding-latency", default=None, help="예: fixed:0.1")
+    parser.add_argument("--error-rate", type=float, default=None, help="0~1")
+    parser.add_argument("--error-codes", default=None, help="예: 429,500")
+    args = parser.parse_args()
+
+    if args.chat_latency:
+        CONFIG["chat_latency"] = parse_latency(args.chat_latency)
+    if args.embedding_latency:
+        CONFIG["embedding_latency"] = parse_latency(args.embedding_latency)
+    if args.error_rate is not None:
+        CONFIG["error_rate"] = args.error_rate
+    if args.error_codes:
+        CONFIG["error_codes"] = [int(x) for x in args.error_codes.split(",")]
+    _INITIAL_CONFIG.update(CONFIG)
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,79 @@
+# bench/import_time.py
+"""
+main.py import 시간 측정 (매번 새 인터프리터에서 실행).
+
+  python bench/import_time.py                      # 5회 측정, 중앙값과 main이 직접 import하는 모듈별 비용
+  python bench/import_time.py --budget-ms 1500     # 예산 초과 시 종료 코드 1 (CI 게이트)
+  python bench/import_time.py --exclude-framework  # fastapi 등 프레임워크를 뺀 앱 자체 비용으로 예산 비교
+
+`python -X importtime` 출력의 누적(cumulative) 시간을 사용합니다.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+FRAMEWORK = ("fastapi", "starlette", "pydantic", "pydantic_core", "anyio", "typing_extensions")
+
+
+def importtime(module: str) -> List[Tuple[int, str, int]]:
+    # (깊이, 모듈명, 누적 µs) 목록. 깊이 0이 최상위 import
+    env = {**os.environ, "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "import-bench")}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        parts = line.partition(":")[2].split("|")
+        if len(parts) != 3:
+            continue
+        name = parts[2]
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        rows.append((depth, name.strip(), int(parts[1])))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time of the app")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget-ms", type=float, default=None)
+    parser.add_argument("--exclude-framework", action="store_true")
+    args = parser.parse_args()
+
+    totals: List[float] = []
+    children: Dict[str, List[float]] = {}
+    for _ in range(args.runs):
+        rows = importtime(args.module)
+        total = next((us for depth, name, us in rows if depth == 0 and name == args.module), 0) / 1000.0
+        framework = 0.0
+        for depth, name, us in rows:
+            if depth != 1:
+                continue
+            children.setdefault(name, []).append(us / 1000.0)
+            if name.split(".")[0] in FRAMEWORK:
+                framework += us / 1000.0
+        totals.append(total - framework if args.exclude_framework else total)
+
+    median_ms = statistics.median(totals)
+    label = " (excluding framework)" if args.exclude_framework else ""
+    print(f"import {args.module}: median {median_ms:.1f} ms, min {min(totals):.1f} ms over {args.runs} runs{label}")
+    ranked = sorted(((statistics.median(v), k) for k, v in children.items()), reverse=True)
+    for ms, name in ranked[: args.top]:
+        print(f"  {name:<40}{ms:>10.1f} ms")
+
+    if args.budget_ms is not None and median_ms > args.budget_ms:
+        print(f"over budget: {median_ms:.1f} ms > {args.budget_ms:.1f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,422 @@
+# bench/microbench.py
+"""
+서버 핫패스 마이크로벤치마크.
+
+  python bench/microbench.py                       # 전체 실행
+  python bench/microbench.py -k hash -k cosine     # 이름에 포함된 케이스만
+  python bench/microbench.py --save before         # bench/baselines/before.json 으로 저장
+  python bench/microbench.py --compare before      # 저장된 기준과 비교 (느려진 케이스 표시)
+  python bench/microbench.py --pdf my.pdf          # 실제 PDF 추출도 측정
+
+결과는 케이스별 1회 실행당 시간(µs)의 min/median/mean 입니다.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("OPENAI_API_KEY", "bench-placeholder")
+
+BASELINE_DIR = Path(__file__).resolve().parent / "baselines"
+
+CASES: List[Tuple[str, Callable[[], Callable[[], Any]]]] = []
+
+
+def case(name: str):
+    # setup 함수를 등록. setup은 측정할 0-인자 함수를 반환
+    def deco(setup: Callable[[], Callable[[], Any]]):
+        CASES.append((name, setup))
+        return setup
+    return deco
+
+
+# =========================
+# 샘플 데이터
+# =========================
+_rng = random.Random(42)
+_SENTENCES = [
+    "대용량 트래픽을 처리하는 결제 API를 설계하며 p95 지연을 320ms에서 140ms로 줄였습니다.",
+    "팀원 4명과 함께 장애 대응 프로세스를 정비해 MTTR을 45분에서 12분으로 단축했습니다.",
+    "사내 스터디를 운영하며 Kubernetes 운영 경험을 공유했습니다.",
+    "고객 피드백을 데이터로 정리해 우선순위를 정하는 습관이 있습니다.",
+]
+COVER_LETTER_KEYS = [
+    "reason_for_application",
+    "expertise_experience",
+    "collaboration_experience",
+    "challenging_goal_experience",
+    "growth_process",
+]
+
+
+def sample_cover_letter(chars_per_section: int) -> Dict[str, str]:
+    doc = {}
+    for k in COVER_LETTER_KEYS:
+        text = ""
+        while len(text) < chars_per_section:
+            text += _rng.choice(_SENTENCES) + " "
+        doc[k] = text[:chars_per_section]
+    return doc
+
+
+def sample_embedding(dim: int = 1536) -> List[float]:
+    return [_rng.uniform(-0.1, 0.1) for _ in range(dim)]
+
+
+def sample_version_doc(version: int) -> Dict[str, Any]:
+    content = sample_cover_letter(1000)
+    return {
+        "job_title": "백엔드 개발자",
+        "doc_type": "cover_letter",
+        "version": version,
+        "content": content,
+        "feedback": "총평 " * 200,
+        "individual_feedbacks": {k: "피드백 " * 80 for k in COVER_LETTER_KEYS},
+        "embedding": sample_embedding(),
+        "content_hash": "0" * 64,
+    }
+
+
+def sample_pdf_bytes(pages: int) -> bytes:
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    pdf.set_font("Helvetica", size=11)
+    for i in range(pages):
+        pdf.add_page()
+        pdf.multi_cell(0, 6, txt=f"Project {i + 1}: payment API redesign, p95 320ms -> 140ms, 4 engineers. " * 30)
+    return pdf.output(dest="S").encode("latin-1")
+
+
+# =========================
+# 케이스
+# =========================
+@case("calculate_content_hash/cover_letter_5x5000")
+def _():
+    from utils import calculate_content_hash
+    doc = sample_cover_letter(5000)
+    return lambda: calculate_content_hash(doc)
+
+
+@case("cosine_similarity/1536")
+def _():
+    from utils import _cosine_similarity
+    a, b = sample_embedding(), sample_embedding()
+    return lambda: _cosine_similarity(a, b)
+
+
+@case("retrieval/rank_200_versions")
+def _():
+    from utils import _cosine_similarity
+    query = sample_embedding()
+    history = [{"version": i, "embedding": sample_embedding()} for i in range(200)]
+
+    def run():
+        scored = [(_cosine_similarity(query, h["embedding"]), h) for h in history]
+        scored.sort(key=lambda x: x[0], reverse=True)
+        return scored[:2]
+    return run
+
+
+@case("retrieval/rank_200_versions_batched")
+def _():
+    from embeddings import cosine_scores
+    query = sample_embedding()
+    history = [{"version": i, "embedding": sample_embedding()} for i in range(200)]
+
+    def run():
+        scores = cosine_scores(query, [h["embedding"] for h in history])
+        return sorted(zip(scores, range(len(history))), reverse=True)[:2]
+    return run
+
+
+@case("local_embedding/cover_letter_5x1200")
+def _():
+    from embeddings import local_vectorizer
+    text = " ".join(sample_cover_letter(1200).values())
+    local = local_vectorizer()
+    return lambda: local.embed(text)
+
+
+@case("local_embedding/rank_20_versions")
+def _():
+    # OpenAI 없이 검색: 현재 문서 벡터화 + 저장된 로컬 벡터 20개와 비교
+    from embeddings import local_vectorizer, cosine_scores
+    local = local_vectorizer()
+    text = " ".join(sample_cover_letter(1200).values())
+    history = [local.embed(" ".join(sample_cover_letter(1200).values())) for _ in range(20)]
+    return lambda: cosine_scores(local.transform(text), history)
+
+
+@case("prompt/cover_letter_with_prev_older")
+def _():
+    from prompts import get_document_analysis_prompt
+    current = sample_cover_letter(1200)
+    prev = sample_version_doc(3)
+    older = sample_version_doc(2)
+    company = {"company_summary": "요약 " * 50, "key_values": "가치 " * 20, "competencies_to_highlight": ["협업", "주도성"]}
+    return lambda: get_document_analysis_prompt(
+        job_title="백엔드 개발자",
+        doc_type="cover_letter",
+        document_content=current,
+        job_competencies=["Python", "FastAPI", "AWS"],
+        previous_document_data=prev,
+        older_document_data=older,
+        additional_user_context="수치를 보강했습니다.",
+        company_name="가나전자",
+        company_analysis=company,
+    )
+
+
+@case("job_lookup/get_job_title_from_slug")
+def _():
+    from utils import get_job_title_from_slug
+    return lambda: get_job_title_from_slug("devops-인프라-개발자")
+
+
+@case("user_paths/user_doc_dir")
+def _():
+    from user_paths import user_doc_dir
+    return lambda: user_doc_dir("bench-user-0001", "devops-%EC%9D%B8%ED%94%84%EB%9D%BC-%EA%B0%9C%EB%B0%9C%EC%9E%90", "resume")
+
+
+@case("job_lookup/get_job_document_schema")
+def _():
+    from job_data import get_job_document_schema
+    return lambda: get_job_document_schema("백엔드-개발자", "cover_letter")
+
+
+@case("storage/list_version_files_500")
+def _():
+    from main import _list_version_files
+    tmp = Path(tempfile.mkdtemp(prefix="bench-versions-"))
+    for i in range(500):
+        (tmp / f"v{i}.json").write_text("{}", encoding="utf-8")
+    (tmp / "v3_summary.pdf").write_text("", encoding="utf-8")
+    return lambda: _list_version_files(tmp)
+
+
+@case("storage/dump_json_with_embedding")
+def _():
+    from main import _dump_json
+    doc = sample_version_doc(7)
+    path = Path(tempfile.mkdtemp(prefix="bench-dump-")) / "v7.json"
+    return lambda: _dump_json(path, doc)
+
+
+@case("storage/load_json_with_embedding")
+def _():
+    from main import _dump_json, _load_json
+    path = Path(tempfile.mkdtemp(prefix="bench-load-")) / "v7.json"
+    _dump_json(path, sample_version_doc(7))
+    return lambda: _load_json(path)
+
+
+def _load_documents_payload() -> Dict[str, Any]:
+    # /apiText/load_documents 응답과 같은 모양 (문서 유형별 6개 버전)
+    return {"resume": [sample_version_doc(i) for i in range(6)],
+            "cover_letter": [sample_version_doc(i) for i in range(6)],
+            "portfolio": []}
+
+
+@case("response/render_load_documents_stdlib")
+def _():
+    from fastapi.responses import JSONResponse
+    payload = _load_documents_payload()
+    return lambda: JSONResponse(content=payload)
+
+
+@case("response/render_load_documents_fast")
+def _():
+    from fastjson import FastJSONResponse
+    payload = _load_documents_payload()
+    return lambda: FastJSONResponse(content=payload)
+
+
+@case("storage/dump_json_stdlib_indent2")
+def _():
+    doc = sample_version_doc(7)
+    path = Path(tempfile.mkdtemp(prefix="bench-dump-std-")) / "v7.json"
+
+    def run():
+        with open(str(path), "w", encoding="utf-8") as f:
+            json.dump(doc, f, ensure_ascii=False, indent=2)
+    return run
+
+
+@case("storage/load_json_stdlib")
+def _():
+    path = Path(tempfile.mkdtemp(prefix="bench-load-std-")) / "v7.json"
+    path.write_text(json.dumps(sample_version_doc(7), ensure_ascii=False, indent=2), encoding="utf-8")
+
+    def run():
+        with open(str(path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    return run
+
+
+@case("copy/json_roundtrip")
+def _():
+    doc = sample_version_doc(7)
+    return lambda: json.loads(json.dumps(doc, ensure_ascii=False))
+
+
+@case("copy/copy_document")
+def _():
+    from fastjson import copy_document
+    doc = sample_version_doc(7)
+    return lambda: copy_document(doc)
+
+
+@case("pdf/extract_text_10_pages")
+def _():
+    import PyPDF2
+    data = sample_pdf_bytes(10)
+
+    def run():
+        reader = PyPDF2.PdfReader(io.BytesIO(data))
+        return "".join((page.extract_text() or "") for page in reader.pages)
+    return run
+
+
+@case("pdf/extract_text_30_pages")
+def _():
+    import PyPDF2
+    data = sample_pdf_bytes(30)
+
+    def run():
+        reader = PyPDF2.PdfReader(io.BytesIO(data))
+        return "".join((page.extract_text() or "") for page in reader.pages)
+    return run
+
+
+def add_pdf_case(path: Path):
+    @case(f"pdf/extract_text_file:{path.name}")
+    def _():
+        import PyPDF2
+        data = path.read_bytes()
+
+        def run():
+            reader = PyPDF2.PdfReader(io.BytesIO(data))
+            return "".join((page.extract_text() or "") for page in reader.pages)
+        return run
+
+
+# =========================
+# 실행/비교
+# =========================
+def measure(fn: Callable[[], Any], min_time: float, repeat: int) -> Dict[str, float]:
+    fn()  # 워밍업
+    # 한 라운드가 min_time 이상 걸리도록 반복 횟수 결정
+    number = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        dt = time.perf_counter() - t0
+        if dt >= min_time or number >= 1_000_000:
+            break
+        number *= 2 if dt <= 0 else max(2, min(10, int(min_time / dt) + 1))
+    rounds = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        rounds.append((time.perf_counter() - t0) / number * 1e6)
+    return {
+        "min_us": round(min(rounds), 3),
+        "median_us": round(statistics.median(rounds), 3),
+        "mean_us": round(statistics.fmean(rounds), 3),
+        "loops": number,
+        "repeat": repeat,
+    }
+
+
+def environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=10
+        ).stdout.strip()
+    except Exception:
+        commit = ""
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "commit": commit,
+        "timestamp": int(time.time()),
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> int:
+    regressions = 0
+    print(f"\n{'case':<45}{'baseline':>12}{'current':>12}{'ratio':>8}")
+    for name, cur in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            print(f"{name:<45}{'-':>12}{cur['median_us']:>12.1f}{'new':>8}")
+            continue
+        ratio = cur["median_us"] / base["median_us"] if base["median_us"] else float("inf")
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  ▲ slower"
+            regressions += 1
+        elif ratio < 1 - threshold:
+            flag = "  ▼ faster"
+        print(f"{name:<45}{base['median_us']:>12.1f}{cur['median_us']:>12.1f}{ratio:>8.2f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Server hot-path microbenchmarks")
+    parser.add_argument("-k", dest="filters", action="append", default=[], help="케이스 이름 필터(부분 일치)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="라운드당 최소 측정 시간(초)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--pdf", action="append", default=[], help="추가로 측정할 PDF 파일")
+    parser.add_argument("--save", default=None, help="결과를 bench/baselines/<이름>.json 으로 저장")
+    parser.add_argument("--compare", default=None, help="bench/baselines/<이름>.json 과 비교")
+    parser.add_argument("--threshold", type=float, default=0.10, help="비교 시 허용 오차 비율")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    for p in args.pdf:
+        add_pdf_case(Path(p))
+
+    results: Dict[str, Any] = {}
+    for name, setup in CASES:
+        if args.filters and not any(f in name for f in args.filters):
+            continue
+        fn = setup()
+        r = measure(fn, args.min_time, args.repeat)
+        results[name] = r
+        print(f"{name:<45} median {r['median_us']:>12.1f} µs   min {r['min_us']:>12.1f} µs   ({r['loops']} loops)")
+
+    report = {"env": environment(), "results": results}
+
+    if args.save:
+        BASELINE_DIR.mkdir(parents=True, exist_ok=True)
+        out = BASELINE_DIR / f"{args.save}.json"
+        out.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"\nsaved: {out}")
+
+    if args.compare:
+        baseline_path = BASELINE_DIR / f"{args.compare}.json"
+        baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+        regressions = compare(report, baseline, args.threshold)
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,433 @@
+# cache.py
+# 2단 캐시: 프로세스 로컬 LRU(메모리) → 공유 계층(같은 호스트의 모든 워커가 공유).
+#  - 공유 계층: sqlite(WAL, 기본) | redis(REDIS_URL, "memory://"면 인메모리 대역) | memory(프로세스 전용) | none
+#  - 값은 JSON 직렬화 바이트로 저장 (fastjson), 네임스페이스별 기본 TTL
+#  - 로컬 LRU는 항목 수/바이트 상한, 공유 sqlite는 전체 바이트 상한으로 오래 안 쓴 항목부터 제거
+#  - 공유 계층 쓰기(set/delete/접근 시각 갱신/용량 정리)는 전용 스레드 하나에서 처리 (write-behind)
+#    → 이벤트 루프가 WAL 체크포인트/LRU 삭제/Redis 왕복을 기다리지 않음. 같은 프로세스는 로컬 LRU로 즉시 반영
+#    읽기는 기본 키 조회 한 번이라 그대로 호출 (WAL에서 읽기는 쓰기를 기다리지 않음, 로컬 미스일 때만)
+#
+#   emb = get_cache("embedding")
+#   vec = emb.get(key)            # 없으면 None
+#   emb.set(key, vec)             # 네임스페이스 기본 TTL
+#   emb.delete(key) / emb.clear()
+import fnmatch
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import fastjson
+from metrics import Counter, record_cache
+
+BASE_DIR = Path(__file__).resolve().parent
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "sqlite").lower()
+CACHE_SQLITE_PATH = Path(os.getenv("CACHE_SQLITE_PATH", str(BASE_DIR / "data" / "cache" / "shared_cache.sqlite3")))
+CACHE_SQLITE_MAX_MB = float(os.getenv("CACHE_SQLITE_MAX_MB", "256"))
+CACHE_LOCAL_MAX_ITEMS = int(os.getenv("CACHE_LOCAL_MAX_ITEMS", "4096"))
+CACHE_LOCAL_MAX_MB = float(os.getenv("CACHE_LOCAL_MAX_MB", "64"))
+# 다른 워커가 지운 값을 로컬 LRU가 계속 들고 있지 않도록 로컬 TTL 상한
+CACHE_LOCAL_TTL_SEC = float(os.getenv("CACHE_LOCAL_TTL_SEC", "60"))
+REDIS_URL = os.getenv("REDIS_URL", "")
+# 처리 대기 중인 공유 계층 쓰기가 이보다 많으면 새 쓰기는 버림 (공유 계층이 느려도 메모리가 늘지 않도록)
+CACHE_WRITE_QUEUE_MAX = int(os.getenv("CACHE_WRITE_QUEUE_MAX", "1000"))
+
+# 네임스페이스별 기본 TTL(초)
+DEFAULT_TTLS: Dict[str, float] = {
+    "embedding": 30 * 86400,   # 입력 텍스트 해시 키 → 내용이 같으면 결과도 같음
+    "feedback": 7 * 86400,     # 프롬프트 해시 키
+    "company": 86400,          # 기업명 키 (기업 정보는 하루 단위로 갱신)
+    "pdf_text": 30 * 86400,    # 업로드 PDF의 SHA-256 키 → 추출 텍스트/페이지 정보 (zlib 압축)
+    "diff": 30 * 86400,        # 두 버전의 content_hash 쌍 키 → 섹션별 diff
+    "portfolio_chunk": 30 * 86400,  # 모델/출력 한도/구간 프롬프트 해시 키 → 구간 요약
+}
+
+CACHE_TIER_HITS = Counter("cache_tier_hits_total", "Cache hits by tier", ("cache", "tier"))
+CACHE_WRITES_DROPPED = Counter("cache_shared_writes_dropped_total", "Shared-tier cache writes dropped because the writer queue was full")
+
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache-writer")
+_writer_pending = 0
+_writer_lock = threading.Lock()
+
+
+def _write_behind(label: str, fn, *args) -> None:
+    # 공유 계층 쓰기를 전용 스레드에 넘기고 바로 반환. 실패는 로그만 (캐시이므로 미스로 이어질 뿐)
+    global _writer_pending
+    with _writer_lock:
+        if _writer_pending >= CACHE_WRITE_QUEUE_MAX:
+            CACHE_WRITES_DROPPED.inc()
+            return
+        _writer_pending += 1
+
+    def _run():
+        global _writer_pending
+        try:
+            fn(*args)
+        except Exception as e:
+            print(f"[cache] shared {label} failed: {e}")
+        finally:
+            with _writer_lock:
+                _writer_pending -= 1
+
+    _writer.submit(_run)
+
+
+def flush_writes(timeout: float = 5.0) -> None:
+    # 대기 중인 공유 계층 쓰기가 끝날 때까지 (종료 직전, 벤치/점검용)
+    _writer.submit(lambda: None).result(timeout=timeout)
+
+
+def make_key(*parts: Any) -> str:
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(str(p).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+# =========================
+# 로컬 LRU
+# =========================
+class MemoryLRU:
+    def __init__(self, max_items: int = CACHE_LOCAL_MAX_ITEMS, max_bytes: int = int(CACHE_LOCAL_MAX_MB * 1024 * 1024)):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._data: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()  # warmup 스레드 등 루프 밖에서도 접근 가능
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires and expires < time.time():
+                self._pop(key)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            self._data[key] = (time.time() + ttl if ttl else 0.0, value)
+            self.nbytes += len(value)
+            while len(self._data) > self.max_items or self.nbytes > self.max_bytes:
+                self._pop(next(iter(self._data)))
+
+    def _pop(self, key: str) -> None:
+        _, value = self._data.pop(key)
+        self.nbytes -= len(value)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+
+    def delete_prefix(self, prefix: str) -> None:
+        with self._lock:
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                self._pop(key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"items": len(self._data), "bytes": self.nbytes}
+
+
+# =========================
+# 공유 계층: SQLite (WAL)
+# =========================
+class SQLiteCache:
+    """한 호스트의 여러 워커 프로세스가 공유하는 캐시. WAL 모드라 읽기는 쓰기를 기다리지 않음."""
+
+    _TOUCH_INTERVAL_SEC = 60  # 조회 시 접근 시각 갱신(쓰기)은 이 간격 이상일 때만
+    _EVICT_EVERY = 64         # set 이 만큼 호출될 때마다 용량 점검
+
+    def __init__(self, path: Path = CACHE_SQLITE_PATH, max_bytes: int = int(CACHE_SQLITE_MAX_MB * 1024 * 1024)):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._sets = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL,"
+            " size INTEGER NOT NULL, accessed REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache(accessed)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  # 캐시이므로 내구성보다 속도
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        # (값, 남은 TTL 초 또는 0=무기한)
+        row = self._conn().execute("SELECT value, expires, accessed FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires, accessed = row
+        now = time.time()
+        if expires and expires < now:
+            _write_behind("delete", self.delete, key)
+            return None
+        if now - accessed > self._TOUCH_INTERVAL_SEC:
+            _write_behind("touch", self._touch, key, now)
+        return bytes(value), (expires - now if expires else 0.0)
+
+    def _touch(self, key: str, now: float) -> None:
+        self._conn().execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        now = time.time()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO cache(key, value, expires, size, accessed) VALUES (?, ?, ?, ?, ?)",
+            (key, value, now + ttl if ttl else 0.0, len(value), now),
+        )
+        self._sets += 1
+        if self._sets % self._EVICT_EVERY == 0:
+            self.evict()
+
+    def delete(self, key: str) -> None:
+        self._conn().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def delete_prefix(self, prefix: str) -> None:
+        self._conn().execute("DELETE FROM cache WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+
+    def evict(self) -> int:
+        # 만료 항목 정리 후, 용량 초과분은 오래 안 쓴 항목부터 제거 (상한의 90%까지)
+        conn = self._conn()
+        removed = conn.execute("DELETE FROM cache WHERE expires > 0 AND expires < ?", (time.time(),)).rowcount
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        if total > self.max_bytes:
+            target = total - int(self.max_bytes * 0.9)
+            freed = 0
+            keys: List[str] = []
+            for key, size in conn.execute("SELECT key, size FROM cache ORDER BY accessed"):
+                keys.append(key)
+                freed += size
+                if freed >= target:
+                    break
+            conn.executemany("DELETE FROM cache WHERE key = ?", [(k,) for k in keys])
+            removed += len(keys)
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        items, nbytes = self._conn().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache").fetchone()
+        return {"backend": "sqlite", "path": str(self.path), "items": items, "bytes": nbytes}
+
+
+# =========================
+# 공유 계층: Redis 호환
+# =========================
+class InMemoryRedis:
+    """redis-py 클라이언트 중 캐시가 쓰는 명령만 흉내 내는 대역 (테스트/로컬용, REDIS_URL=memory://)."""
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[bytes, float]] = {}
+        self._lock = threading.Lock()
+
+    def _alive(self, key: str) -> Optional[Tuple[bytes, float]]:
+        item = self._data.get(key)
+        if item is not None and item[1] and item[1] < time.time():
+            del self._data[key]
+            return None
+        return item
+
+    def ping(self) -> bool:
+        return True
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._alive(key)
+            return item[0] if item else None
+
+    def set(self, key: str, value: bytes, ex: Optional[int] = None) -> bool:
+        with self._lock:
+            self._data[key] = (bytes(value), time.time() + ex if ex else 0.0)
+            return True
+
+    def ttl(self, key: str) -> int:
+        with self._lock:
+            item = self._alive(key)
+            if item is None:
+                return -2
+            return int(item[1] - time.time()) if item[1] else -1
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            return sum(1 for k in keys if self._data.pop(k, None) is not None)
+
+    def scan_iter(self, match: str = "*", count: int = 100) -> Iterator[str]:
+        with self._lock:
+            keys = [k for k in self._data if fnmatch.fnmatchcase(k, match)]
+        return iter(keys)
+
+    def dbsize(self) -> int:
+        return len(self._data)
+
+
+class RedisCache:
+    # 여러 호스트가 공유할 때. 용량/만료 관리는 Redis(maxmemory-policy allkeys-lru)에 맡김
+    def __init__(self, client, key_prefix: str = "kibwa:cache:"):
+        self.client = client
+        self.key_prefix = key_prefix
+
+    def get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        value = self.client.get(self.key_prefix + key)
+        if value is None:
+            return None
+        ttl = self.client.ttl(self.key_prefix + key)
+        return bytes(value), float(ttl) if ttl and ttl > 0 else 0.0
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        self.client.set(self.key_prefix + key, value, ex=int(ttl) if ttl else None)
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self.key_prefix + key)
+
+    def delete_prefix(self, prefix: str) -> None:
+        keys = list(self.client.scan_iter(match=self.key_prefix + prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+    def evict(self) -> int:
+        return 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "redis", "items": self.client.dbsize()}
+
+
+class _LocalOnly:
+    # CACHE_BACKEND=memory|none: 공유 계층 없음
+    def get(self, key: str):
+        return None
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        pass
+
+    def delete(self, key: str) -> None:
+        pass
+
+    def delete_prefix(self, prefix: str) -> None:
+        pass
+
+    def evict(self) -> int:
+        return 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": CACHE_BACKEND}
+
+
+def _make_shared_backend():
+    if CACHE_BACKEND == "redis":
+        if REDIS_URL.startswith("memory://"):
+            return RedisCache(InMemoryRedis())
+        try:
+            import redis
+        except ImportError:
+            print("[cache] CACHE_BACKEND=redis 이지만 redis 패키지가 없어 sqlite를 사용합니다.")
+            return SQLiteCache()
+        return RedisCache(redis.Redis.from_url(REDIS_URL or "redis://localhost:6379/0"))
+    if CACHE_BACKEND == "sqlite":
+        try:
+            return SQLiteCache()
+        except sqlite3.Error as e:
+            print(f"[cache] sqlite 캐시를 열 수 없어 로컬 캐시만 사용합니다: {e}")
+    return _LocalOnly()
+
+
+# =========================
+# 2단 캐시
+# =========================
+class TieredCache:
+    def __init__(self, namespace: str, local: MemoryLRU, shared, default_ttl: Optional[float] = None):
+        self.namespace = namespace
+        self.local = local
+        self.shared = shared
+        self.default_ttl = default_ttl
+        self.enabled = CACHE_BACKEND != "none"
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        if not self.enabled:
+            return None
+        k = self._key(key)
+        value = self.local.get(k)
+        if value is not None:
+            CACHE_TIER_HITS.inc(cache=self.namespace, tier="local")
+            record_cache(self.namespace, True)
+            return value
+        try:
+            found = self.shared.get(k)
+        except Exception as e:  # 공유 계층 장애는 캐시 미스로 취급
+            print(f"[cache] shared get failed ({self.namespace}): {e}")
+            found = None
+        if found is None:
+            record_cache(self.namespace, False)
+            return None
+        value, remaining = found
+        self.local.set(k, value, min(remaining, CACHE_LOCAL_TTL_SEC) if remaining else CACHE_LOCAL_TTL_SEC)
+        CACHE_TIER_HITS.inc(cache=self.namespace, tier="shared")
+        record_cache(self.namespace, True)
+        return value
+
+    def set_bytes(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        if not self.enabled:
+            return
+        ttl = self.default_ttl if ttl is None else ttl
+        k = self._key(key)
+        self.local.set(k, value, min(ttl, CACHE_LOCAL_TTL_SEC) if ttl else CACHE_LOCAL_TTL_SEC)
+        _write_behind(f"set ({self.namespace})", self.shared.set, k, value, ttl)
+
+    def get(self, key: str) -> Any:
+        value = self.get_bytes(key)
+        return None if value is None else fastjson.loads(value)
+
+    def set(self, key: str, obj: Any, ttl: Optional[float] = None) -> None:
+        self.set_bytes(key, fastjson.dumps(obj), ttl)
+
+    def delete(self, key: str) -> None:
+        k = self._key(key)
+        self.local.delete(k)
+        _write_behind(f"delete ({self.namespace})", self.shared.delete, k)
+
+    def clear(self) -> None:
+        prefix = f"{self.namespace}:"
+        self.local.delete_prefix(prefix)
+        _write_behind(f"clear ({self.namespace})", self.shared.delete_prefix, prefix)
+
+
+_local = MemoryLRU()
+_shared = None
+_caches: Dict[str, TieredCache] = {}
+
+
+def get_cache(namespace: str) -> TieredCache:
+    global _shared
+    cache = _caches.get(namespace)
+    if cache is None:
+        if _shared is None:
+            _shared = _make_shared_backend()
+        cache = _caches[namespace] = TieredCache(namespace, _local, _shared, DEFAULT_TTLS.get(namespace))
+    return cache
+
+
+def cache_stats() -> Dict[str, Any]:
+    return {"local": _local.stats(), "shared": _shared.stats() if _shared is not None else None}
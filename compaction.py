@@ -0,0 +1,264 @@
+# compaction.py
+# 버전 이력 보존 정책과 사용자별 저장 용량 한도.
+#
+#   python compaction.py                 # data/users 전체 정리 후 회수한 바이트 출력
+#   python compaction.py --user <id>     # 한 사용자만
+#   python compaction.py --dry-run       # 지우지 않고 계획만 출력
+#
+#  - 문서 디렉터리(users/<샤드>/<user>/<job>/<doc_type>)마다 최신 RETENTION_KEEP_LAST개와
+#    최근 RETENTION_KEEP_DAILY_DAYS일 동안 하루 한 개(그날의 마지막 버전)만 남기고 삭제 (요약 PDF 포함)
+#  - 최신 RETENTION_HOT_VERSIONS개를 제외한 버전은 embedding을 비움
+#    (유사 이력 검색(retrieve_relevant_feedback_history) 후보가 되면 embedding 캐시를 거쳐 다시 계산)
+#  - 삭제/embedding 제거는 버전 하나씩 잠금을 잡고, 그 안에서 head/mtime이 계획 때와 같은지 다시 확인
+#  - 사용자 전체 크기가 USER_STORAGE_QUOTA_MB를 넘으면 오래된 버전부터 추가로 정리
+#    (디렉터리마다 최신 RETENTION_MIN_KEEP개는 항상 유지)
+#  - head(롤백 포인터) 위의 파일은 version_store GC 담당이므로 건드리지 않음
+import argparse
+import asyncio
+import fcntl
+import os
+import time
+import traceback
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import fastjson
+from metrics import Counter, Gauge
+from user_paths import USERS_DIR, iter_doc_dirs, iter_user_dirs, user_base_dir
+from version_store import doc_dir_lock, is_visible, visible_versions
+
+RETENTION_KEEP_LAST = int(os.getenv("RETENTION_KEEP_LAST", "20"))
+RETENTION_KEEP_DAILY_DAYS = int(os.getenv("RETENTION_KEEP_DAILY_DAYS", "30"))
+RETENTION_HOT_VERSIONS = int(os.getenv("RETENTION_HOT_VERSIONS", "5"))
+RETENTION_MIN_KEEP = int(os.getenv("RETENTION_MIN_KEEP", "3"))
+USER_STORAGE_QUOTA_MB = float(os.getenv("USER_STORAGE_QUOTA_MB", "50"))  # 0이면 한도 없음
+# 이보다 최근에 수정된 버전은 편집 중일 수 있으므로 건드리지 않음
+COMPACTION_MIN_AGE_SEC = float(os.getenv("COMPACTION_MIN_AGE_SEC", "3600"))
+COMPACTION_INTERVAL_SEC = float(os.getenv("COMPACTION_INTERVAL_SEC", str(6 * 3600)))
+COMPACTION_ENABLED = os.getenv("COMPACTION_ENABLED", "1") not in ("0", "false", "False")
+
+COMPACTION_RECLAIMED_BYTES = Counter("compaction_reclaimed_bytes_total", "Bytes reclaimed by compaction", ("action",))
+COMPACTION_LAST_RUN_SECONDS = Gauge("compaction_last_run_seconds", "Duration of the last full compaction pass")
+USERS_OVER_QUOTA = Gauge("compaction_users_over_quota", "Users still over the storage quota after compaction")
+
+
+def _empty_report() -> Dict[str, int]:
+    return {"deleted_versions": 0, "deleted_pdfs": 0, "stripped_embeddings": 0, "reclaimed_bytes": 0}
+
+
+def _merge(total: Dict[str, Any], part: Dict[str, Any]) -> None:
+    for k, v in part.items():
+        if isinstance(v, int):
+            total[k] = total.get(k, 0) + v
+
+
+def _versions_with_mtime(doc_dir: Path) -> List[Tuple[int, float]]:
+    # 최신 버전 먼저
+    out = []
+    for v in visible_versions(doc_dir):
+        try:
+            out.append((v, (doc_dir / f"v{v}.json").stat().st_mtime))
+        except FileNotFoundError:
+            continue
+    out.sort(reverse=True)
+    return out
+
+
+def plan_retention(versions: List[Tuple[int, float]], now: float) -> Dict[str, List[int]]:
+    """(버전, mtime) 최신순 → {"keep": [...], "delete": [...], "cold": [...]} (cold: 남기되 embedding 제거)"""
+    keep: List[int] = []
+    delete: List[int] = []
+    days_kept = set()
+    for i, (v, mtime) in enumerate(versions):
+        day = date.fromtimestamp(mtime)
+        recent = now - mtime < COMPACTION_MIN_AGE_SEC
+        in_daily_window = now - mtime <= RETENTION_KEEP_DAILY_DAYS * 86400
+        if i < RETENTION_KEEP_LAST or recent or (in_daily_window and day not in days_kept):
+            keep.append(v)
+            days_kept.add(day)
+        else:
+            delete.append(v)
+    cold = [v for v in keep[RETENTION_HOT_VERSIONS:]]
+    return {"keep": keep, "delete": delete, "cold": cold}
+
+
+def _delete_version(doc_dir: Path, v: int, dry_run: bool, report: Dict[str, int]) -> None:
+    for name, key, action in ((f"v{v}.json", "deleted_versions", "delete_version"),
+                              (f"v{v}_summary.pdf", "deleted_pdfs", "delete_pdf")):
+        p = doc_dir / name
+        try:
+            size = p.stat().st_size
+        except FileNotFoundError:
+            continue
+        if not dry_run:
+            p.unlink(missing_ok=True)
+            COMPACTION_RECLAIMED_BYTES.inc(size, action=action)
+        report[key] += 1
+        report["reclaimed_bytes"] += size
+
+
+def _strip_embedding(doc_dir: Path, v: int, dry_run: bool, report: Dict[str, int]) -> None:
+    p = doc_dir / f"v{v}.json"
+    try:
+        st = p.stat()
+        doc = fastjson.load_file(p)
+    except (FileNotFoundError, ValueError):
+        return
+    if not doc.get("embedding"):
+        return
+    doc["embedding"] = []
+    body = fastjson.dumps(doc)
+    saved = st.st_size - len(body)
+    if not dry_run:
+        tmp = p.with_name(f".{p.name}.compact.tmp")
+        tmp.write_bytes(body)
+        os.utime(tmp, (st.st_atime, st.st_mtime))  # 일별 스냅샷 판단에 mtime을 쓰므로 유지
+        os.replace(tmp, p)
+        COMPACTION_RECLAIMED_BYTES.inc(max(saved, 0), action="strip_embedding")
+    report["stripped_embeddings"] += 1
+    report["reclaimed_bytes"] += max(saved, 0)
+
+
+def _apply_locked(step, doc_dir: Path, v: int, planned_mtime: float, dry_run: bool, report: Dict[str, int]) -> None:
+    # 버전 하나씩 잠금 (분석 요청의 쓰기를 오래 막지 않도록).
+    # 계획 이후 롤백으로 head 위가 됐거나 다시 쓰인 버전은 건너뜀
+    with doc_dir_lock(doc_dir):
+        if not is_visible(doc_dir, v):
+            return
+        try:
+            mtime = (doc_dir / f"v{v}.json").stat().st_mtime
+        except FileNotFoundError:
+            return
+        if mtime != planned_mtime:
+            return
+        step(doc_dir, v, dry_run, report)
+
+
+def compact_doc_dir(doc_dir: Path, now: Optional[float] = None, dry_run: bool = False) -> Dict[str, int]:
+    now = time.time() if now is None else now
+    report = _empty_report()
+    versions = _versions_with_mtime(doc_dir)
+    mtimes = dict(versions)
+    plan = plan_retention(versions, now)
+    for v in plan["delete"]:
+        _apply_locked(_delete_version, doc_dir, v, mtimes[v], dry_run, report)
+    for v in plan["cold"]:
+        _apply_locked(_strip_embedding, doc_dir, v, mtimes[v], dry_run, report)
+    return report
+
+
+def _doc_dirs(user_dir: Path) -> List[Path]:
+    return list(iter_doc_dirs(user_dir))
+
+
+def _dir_bytes(path: Path) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.stat(os.path.join(root, f)).st_size
+            except FileNotFoundError:
+                continue
+    return total
+
+
+def _enforce_quota(user_dir: Path, used: int, quota: int, now: float, dry_run: bool, report: Dict[str, int]) -> int:
+    # 오래된 버전부터: 먼저 embedding 제거, 그래도 넘으면 삭제 (디렉터리별 최신 RETENTION_MIN_KEEP개 제외)
+    candidates: List[Tuple[float, Path, int]] = []
+    for d in _doc_dirs(user_dir):
+        versions = _versions_with_mtime(d)
+        for v, mtime in versions[RETENTION_MIN_KEEP:]:
+            if now - mtime >= COMPACTION_MIN_AGE_SEC:
+                candidates.append((mtime, d, v))
+    candidates.sort()
+    for step in (_strip_embedding, _delete_version):
+        for mtime, d, v in candidates:
+            if used <= quota:
+                return used
+            before = report["reclaimed_bytes"]
+            _apply_locked(step, d, v, mtime, dry_run, report)
+            used -= report["reclaimed_bytes"] - before
+    return used
+
+
+def compact_user(user_dir: Path, now: Optional[float] = None, dry_run: bool = False) -> Dict[str, Any]:
+    now = time.time() if now is None else now
+    report: Dict[str, Any] = _empty_report()
+    for d in _doc_dirs(user_dir):
+        _merge(report, compact_doc_dir(d, now, dry_run))
+    quota = int(USER_STORAGE_QUOTA_MB * 1024 * 1024)
+    used = _dir_bytes(user_dir)
+    if dry_run:
+        used -= report["reclaimed_bytes"]
+    if quota and used > quota:
+        used = _enforce_quota(user_dir, used, quota, now, dry_run, report)
+    report["used_bytes"] = used
+    report["over_quota"] = bool(quota and used > quota)
+    return report
+
+
+def compact_all(users_dir: Path, dry_run: bool = False) -> Dict[str, Any]:
+    started = time.perf_counter()
+    total: Dict[str, Any] = {**_empty_report(), "users": 0, "users_over_quota": 0}
+    for user_dir in iter_user_dirs(users_dir):
+        try:
+            r = compact_user(user_dir, dry_run=dry_run)
+        except Exception:
+            traceback.print_exc()
+            continue
+        total["users"] += 1
+        total["users_over_quota"] += int(r["over_quota"])
+        _merge(total, {k: v for k, v in r.items() if k not in ("used_bytes", "over_quota")})
+    if not dry_run:
+        COMPACTION_LAST_RUN_SECONDS.set(time.perf_counter() - started)
+        USERS_OVER_QUOTA.set(total["users_over_quota"])
+    return total
+
+
+def _try_global_lock(users_dir: Path):
+    # 여러 워커 중 한 곳에서만 실행
+    users_dir.mkdir(parents=True, exist_ok=True)
+    f = open(users_dir / ".compaction.lock", "a+b")
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        f.close()
+        return None
+    return f
+
+
+async def run_compaction(users_dir: Path, interval: float = COMPACTION_INTERVAL_SEC) -> None:
+    await asyncio.sleep(min(interval, 300))  # 기동 직후 부하를 피함
+    while True:
+        lock = _try_global_lock(users_dir)
+        if lock is not None:
+            try:
+                report = await asyncio.to_thread(compact_all, users_dir)
+                print(f"[compaction] {report}")
+            except Exception:
+                traceback.print_exc()
+            finally:
+                lock.close()
+        await asyncio.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply version retention and storage quota")
+    parser.add_argument("--users-dir", default=str(USERS_DIR))
+    parser.add_argument("--user", default=None)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    users_dir = Path(args.users_dir)
+    if args.user:
+        report = compact_user(user_base_dir(args.user, users_dir), dry_run=args.dry_run)
+    else:
+        report = compact_all(users_dir, dry_run=args.dry_run)
+    label = "would reclaim" if args.dry_run else "reclaimed"
+    print(fastjson.dumps(report).decode("utf-8"))
+    print(f"{label} {report['reclaimed_bytes'] / (1024 * 1024):.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# compression.py
+# 응답 압축 공통 함수 + 동적 응답(JSON 등) 압축 미들웨어.
+#  - brotli 패키지가 있으면 br 우선, 없으면 gzip만 사용
+#  - 본문이 COMPRESS_MIN_BYTES 미만이면 압축하지 않음 (작은 응답은 CPU만 쓰고 이득이 없음)
+#  - 정적 파일은 빌드 시점에 미리 압축해 두고 static_assets.PrecompressedStaticFiles가 서빙
+import gzip
+import os
+from typing import List, Optional
+
+try:
+    import brotli
+    HAS_BROTLI = True
+except ImportError:
+    brotli = None
+    HAS_BROTLI = False
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "1") not in ("0", "false", "False")
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+# 동적 응답은 지연이 중요하므로 중간 압축 수준 (빌드 시점 압축은 최대 수준)
+DYNAMIC_GZIP_LEVEL = int(os.getenv("DYNAMIC_GZIP_LEVEL", "6"))
+DYNAMIC_BROTLI_QUALITY = int(os.getenv("DYNAMIC_BROTLI_QUALITY", "4"))
+COMPRESSIBLE_TYPES = ("application/json", "text/html", "text/plain")
+
+
+def compress(data: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=DYNAMIC_BROTLI_QUALITY if level is None else level)
+    # mtime=0: 같은 입력이면 같은 출력 (빌드 결과 재현성)
+    return gzip.compress(data, compresslevel=DYNAMIC_GZIP_LEVEL if level is None else level, mtime=0)
+
+
+def supported_encodings() -> List[str]:
+    return ["br", "gzip"] if HAS_BROTLI else ["gzip"]
+
+
+def accepted_encodings(accept_encoding: str) -> List[str]:
+    """Accept-Encoding 헤더가 허용하는 인코딩 중 서버가 지원하는 것 (서버 선호 순)."""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if token:
+            accepted[token.strip().lower()] = q
+    return [enc for enc in supported_encodings() if accepted.get(enc, accepted.get("*", 0.0)) > 0]
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    encodings = accepted_encodings(accept_encoding)
+    return encodings[0] if encodings else None
+
+
+def _header(headers, name: bytes) -> Optional[bytes]:
+    for k, v in headers:
+        if k.lower() == name:
+            return v
+    return None
+
+
+class CompressionMiddleware:
+    # 순수 ASGI 미들웨어. 압축 대상(JSON/HTML/텍스트, 임계값 이상)인 응답만 본문을 모아 한 번에 압축
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not COMPRESSION_ENABLED
+            or scope.get("method") == "HEAD"
+            or scope["path"].startswith("/static/")
+        ):
+            await self.app(scope, receive, send)
+            return
+        accept = _header(scope.get("headers", []), b"accept-encoding")
+        encoding = choose_encoding(accept.decode("latin-1")) if accept else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        body_parts: List[bytes] = []
+        passthrough = False
+
+        async def _send(message):
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                headers = message.get("headers", [])
+                ctype = (_header(headers, b"content-type") or b"").decode("latin-1")
+                if _header(headers, b"content-encoding") is not None or not ctype.startswith(COMPRESSIBLE_TYPES):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body_parts.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            body = b"".join(body_parts)
+            headers = [(k, v) for k, v in start_message.get("headers", []) if k.lower() != b"content-length"]
+            if len(body) >= self.minimum_size:
+                body = compress(body, encoding)
+                headers.append((b"content-encoding", encoding.encode("latin-1")))
+                vary = _header(headers, b"vary")
+                if vary is None:
+                    headers.append((b"vary", b"Accept-Encoding"))
+                elif b"accept-encoding" not in vary.lower():
+                    headers = [(k, v + b", Accept-Encoding" if k.lower() == b"vary" else v) for k, v in headers]
+                # 압축본은 원본과 바이트가 다르므로 강한 ETag를 약한 ETag로 (If-None-Match는 약한 비교)
+                headers = [(k, b"W/" + v if k.lower() == b"etag" and not v.startswith(b"W/") else v) for k, v in headers]
+            headers.append((b"content-length", str(len(body)).encode("latin-1")))
+            await send({**start_message, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, _send)
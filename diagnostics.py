@@ -0,0 +1,135 @@
+# diagnostics.py
+# 요청별 Server-Timing 헤더와 옵트인 샘플링 프로파일러.
+#  - 모든 응답에 stage_timer로 기록된 구간을 Server-Timing 헤더로 붙임 (브라우저 devtools에서 바로 확인)
+#  - "X-Profile: <PROFILING_TOKEN>" 헤더 또는 "?__profile=<PROFILING_TOKEN>" 쿼리가 있으면
+#    해당 요청 동안 이벤트 루프 스레드 스택을 샘플링해 flamegraph 호환(collapsed) 파일로 저장
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter as _Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from metrics import request_spans
+
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "1") not in ("0", "false", "False")
+# 토큰이 설정되지 않으면 프로파일링은 비활성화 (임의 사용자가 켤 수 없도록)
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+PROFILING_INTERVAL_SEC = float(os.getenv("PROFILING_INTERVAL_SEC", "0.005"))
+DIAGNOSTICS_DIR = Path(os.getenv("DIAGNOSTICS_DIR", str(Path(__file__).resolve().parent / "data" / "diagnostics")))
+
+
+# =========================
+# 샘플링 프로파일러
+# =========================
+class StackSampler:
+    """대상 스레드의 스택을 주기적으로 수집합니다 (collapsed stack 포맷)."""
+
+    def __init__(self, thread_id: int, interval: float = PROFILING_INTERVAL_SEC):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: _Counter = _Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=1.0)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack: List[str] = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{Path(code.co_filename).name}:{code.co_name}")
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+
+    def save(self, name: str) -> Path:
+        DIAGNOSTICS_DIR.mkdir(parents=True, exist_ok=True)
+        path = DIAGNOSTICS_DIR / f"profile-{time.strftime('%Y%m%d-%H%M%S')}-{name}.folded"
+        with open(str(path), "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+
+def _profile_requested(scope) -> bool:
+    if not PROFILING_TOKEN:
+        return False
+    for key, value in scope.get("headers", []):
+        if key == b"x-profile" and value.decode("latin-1") == PROFILING_TOKEN:
+            return True
+    qs = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    return PROFILING_TOKEN in qs.get("__profile", [])
+
+
+# =========================
+# Server-Timing
+# =========================
+def format_server_timing(spans: List[Tuple[str, float]], total_sec: float) -> str:
+    # 같은 이름의 구간은 합산하고 호출 횟수를 desc로 표시
+    agg: Dict[str, List[float]] = {}
+    for name, dur in spans:
+        a = agg.setdefault(name, [0.0, 0])
+        a[0] += dur
+        a[1] += 1
+    parts = []
+    for name, (dur, n) in agg.items():
+        entry = f"{re.sub(r'[^A-Za-z0-9_.-]', '_', name)};dur={dur * 1000:.1f}"
+        if n > 1:
+            entry += f';desc="x{n}"'
+        parts.append(entry)
+    parts.append(f"total;dur={total_sec * 1000:.1f}")
+    return ", ".join(parts)
+
+
+class ServerTimingMiddleware:
+    # 순수 ASGI 미들웨어. 요청마다 구간 리스트를 contextvar로 열어 두고 응답 시작 시 헤더로 기록
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        spans: List[Tuple[str, float]] = []
+        token = request_spans.set(spans)
+        sampler: Optional[StackSampler] = None
+        if _profile_requested(scope):
+            sampler = StackSampler(threading.get_ident())
+            sampler.start()
+        started = time.perf_counter()
+
+        async def _send(message):
+            nonlocal sampler
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                if SERVER_TIMING_ENABLED:
+                    value = format_server_timing(spans, time.perf_counter() - started)
+                    headers.append((b"server-timing", value.encode("latin-1")))
+                if sampler is not None:
+                    sampler.stop()
+                    route = re.sub(r"[^A-Za-z0-9_-]+", "_", scope["path"]).strip("_")[:60] or "root"
+                    path = sampler.save(route)
+                    headers.append((b"x-profile-file", path.name.encode("latin-1")))
+                    sampler = None
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            request_spans.reset(token)
+            if sampler is not None:
+                sampler.stop()
@@ -0,0 +1,218 @@
+# embeddings.py
+# 임베딩 백엔드 선택과 로컬(오프라인) 임베딩.
+#
+#   python embeddings.py fit-idf            # data/users 문서로 IDF 표를 만들어 data/embedding_idf.npy 저장
+#   python embeddings.py fit-idf --dry-run  # 저장하지 않고 문서 수/모델 ID만 출력
+#
+#  - EMBEDDING_BACKEND=openai(기본): text-embedding-3-small, 실패하면 EMBEDDING_FALLBACK=local로 대체
+#  - EMBEDDING_BACKEND=local: 네트워크 없이 문자 n-gram 해싱 TF-IDF (NumPy, 고정 차원)
+#  - 모든 벡터는 모델 ID와 함께 저장("embedding_model")하고 같은 모델끼리만 비교
+#    (필드가 없는 기존 문서는 LEGACY_EMBEDDING_MODEL로 간주)
+#  - numpy는 utils와 마찬가지로 첫 사용(또는 warmup) 때 import
+import argparse
+import json
+import os
+import unicodedata
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import fastjson
+from user_paths import USERS_DIR, iter_doc_dirs, iter_user_dirs
+
+OPENAI_EMBEDDING_MODEL = "text-embedding-3-small"
+LEGACY_EMBEDDING_MODEL = OPENAI_EMBEDDING_MODEL
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai")  # openai | local
+EMBEDDING_FALLBACK = os.getenv("EMBEDDING_FALLBACK", "local")  # local | none
+LOCAL_EMBEDDING_DIM = int(os.getenv("LOCAL_EMBEDDING_DIM", "2048"))
+LOCAL_EMBEDDING_NGRAMS = (2, 3)  # 한글은 음절 2~3개 단위가 형태소 경계를 대략 덮음
+LOCAL_EMBEDDING_IDF_PATH = Path(
+    os.getenv("LOCAL_EMBEDDING_IDF_PATH", str(Path(__file__).resolve().parent / "data" / "embedding_idf.npy"))
+)
+
+# 64비트 곱셈 해시 상수 (파이썬 hash()는 프로세스마다 달라 쓸 수 없음)
+_PRIME = 0x100000001B3
+_MIX = 0xFF51AFD7ED558CCD
+
+
+# =========================
+# 문서 → 임베딩 텍스트
+# =========================
+def document_embedding_text(doc_type: str, content: Dict[str, Any]) -> str:
+    # 저장된 문서의 임베딩 텍스트 (검색 시 로컬 공간 재계산, fit-idf)
+    c = content or {}
+    if doc_type == "cover_letter":
+        return " ".join(c.get(k, "") for k in (
+            "reason_for_application",
+            "expertise_experience",
+            "collaboration_experience",
+            "challenging_goal_experience",
+            "growth_process",
+        ))
+    if doc_type == "resume":
+        return " ".join(
+            json.dumps(c.get(k, []), ensure_ascii=False) for k in ("education", "activities", "awards", "certificates")
+        )
+    if doc_type == "portfolio":
+        return c.get("summary", "") or ""
+    return ""
+
+
+# =========================
+# 로컬 벡터라이저
+# =========================
+class HashedNgramVectorizer:
+    """문자 n-gram을 고정 차원으로 해싱 → log(1+tf) × idf → L2 정규화."""
+
+    def __init__(self, dim: int = LOCAL_EMBEDDING_DIM, ngrams: Sequence[int] = LOCAL_EMBEDDING_NGRAMS,
+                 idf=None):
+        import numpy as np
+
+        if idf is not None and idf.shape != (dim,):
+            raise ValueError(f"IDF shape {idf.shape} does not match dim {dim}")
+        self.dim = dim
+        self.ngrams = tuple(ngrams)
+        self.idf = idf
+        # IDF 표가 바뀌면 벡터 공간도 바뀌므로 모델 ID에 지문을 넣음
+        idf_tag = f"idf{zlib.crc32(idf.astype(np.float32).tobytes()):08x}" if idf is not None else "tf"
+        self.model_id = f"local-hashngram-v1-n{''.join(map(str, self.ngrams))}-d{dim}-{idf_tag}"
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        return " " + " ".join(unicodedata.normalize("NFKC", text).lower().split()) + " "
+
+    def bucket_ids(self, text: str):
+        # 코드포인트 배열에서 n-gram 해시를 한 번에 계산 (파이썬 루프 없음)
+        import numpy as np
+
+        prime, mix, shift = np.uint64(_PRIME), np.uint64(_MIX), np.uint64(33)
+        cp = np.frombuffer(self._normalize(text).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+        parts = []
+        for n in self.ngrams:
+            if len(cp) < n:
+                continue
+            h = np.full(len(cp) - n + 1, np.uint64(n), dtype=np.uint64)
+            for k in range(n):
+                h = h * prime + cp[k:len(cp) - n + 1 + k]
+            h ^= h >> shift
+            h *= mix
+            h ^= h >> shift
+            parts.append(h % np.uint64(self.dim))
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(parts).astype(np.int64)
+
+    def transform(self, text: str):
+        import numpy as np
+
+        tf = np.bincount(self.bucket_ids(text), minlength=self.dim).astype(np.float32)
+        vec = np.log1p(tf)
+        if self.idf is not None:
+            vec *= self.idf
+        norm = float(np.linalg.norm(vec))
+        return vec / norm if norm else vec
+
+    def embed(self, text: str) -> List[float]:
+        # JSON에 저장할 리스트 (0은 "0.0"으로 짧게 직렬화됨)
+        return self.transform(text).round(5).tolist()
+
+
+def fit_idf(texts: Iterable[str], dim: int = LOCAL_EMBEDDING_DIM,
+            ngrams: Sequence[int] = LOCAL_EMBEDDING_NGRAMS):
+    import numpy as np
+
+    plain = HashedNgramVectorizer(dim, ngrams)
+    df = np.zeros(dim, dtype=np.float64)
+    n_docs = 0
+    for text in texts:
+        if not text.strip():
+            continue
+        df[np.unique(plain.bucket_ids(text))] += 1
+        n_docs += 1
+    # smooth idf (문서에 없던 버킷도 유한한 값)
+    return (np.log((1 + n_docs) / (1 + df)) + 1).astype(np.float32)
+
+
+_local: Optional[HashedNgramVectorizer] = None
+
+
+def local_vectorizer() -> HashedNgramVectorizer:
+    global _local
+    if _local is None:
+        import numpy as np
+
+        idf = None
+        try:
+            idf = np.load(LOCAL_EMBEDDING_IDF_PATH)
+            if idf.shape != (LOCAL_EMBEDDING_DIM,):
+                print(f"[embeddings] ignoring {LOCAL_EMBEDDING_IDF_PATH}: dim {idf.shape} != {LOCAL_EMBEDDING_DIM}")
+                idf = None
+        except FileNotFoundError:
+            pass
+        _local = HashedNgramVectorizer(idf=idf)
+    return _local
+
+
+def embedding_model_of(doc: Dict[str, Any]) -> str:
+    return doc.get("embedding_model") or LEGACY_EMBEDDING_MODEL
+
+
+# =========================
+# 유사도
+# =========================
+def cosine_scores(query: Sequence[float], vectors: Sequence[Sequence[float]]):
+    """query와 vectors 각각의 코사인 유사도 (행렬곱 한 번). 차원이 다르면 ValueError."""
+    import numpy as np
+
+    if not len(vectors):
+        return np.empty(0, dtype=np.float32)
+    q = np.asarray(query, dtype=np.float32)
+    m = np.asarray(vectors, dtype=np.float32)
+    if m.ndim != 2 or m.shape[1] != q.shape[0]:
+        raise ValueError("Embedding dimensions do not match")
+    denom = np.linalg.norm(m, axis=1) * np.linalg.norm(q)
+    dots = m @ q
+    return np.divide(dots, denom, out=np.zeros_like(dots), where=denom > 0)
+
+
+# =========================
+# CLI
+# =========================
+def _iter_document_texts(users_dir: Path) -> Iterable[str]:
+    for user_dir in iter_user_dirs(users_dir):
+        for doc_dir in iter_doc_dirs(user_dir):
+            for p in doc_dir.glob("v*.json"):
+                try:
+                    doc = fastjson.load_file(p)
+                except (ValueError, OSError):
+                    continue
+                yield document_embedding_text(doc.get("doc_type") or doc_dir.name, doc.get("content") or {})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local embedding utilities")
+    sub = parser.add_subparsers(dest="command", required=True)
+    fit = sub.add_parser("fit-idf", help="Fit the IDF table for the local embedding backend")
+    fit.add_argument("--users-dir", default=str(USERS_DIR))
+    fit.add_argument("--out", default=str(LOCAL_EMBEDDING_IDF_PATH))
+    fit.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    texts = [t for t in _iter_document_texts(Path(args.users_dir)) if t.strip()]
+    idf = fit_idf(texts)
+    model_id = HashedNgramVectorizer(idf=idf).model_id
+    if not args.dry_run:
+        out = Path(args.out)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        tmp = out.with_name(f".{out.name}.tmp")
+        import numpy as np
+
+        with open(tmp, "wb") as f:
+            np.save(f, idf)
+        os.replace(tmp, out)
+    print(f"{len(texts)} documents → {model_id}" + (" (dry run)" if args.dry_run else f" → {args.out}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# fastjson.py
+# JSON 직렬화 백엔드. orjson이 설치되어 있으면 사용하고, 없으면 표준 json으로 동작.
+#  - 응답(FastJSONResponse)과 디스크 저장(dump_file/load_file) 모두 공백 없는 compact 출력
+#  - copy_document: json.loads(json.dumps(...)) 왕복 대신 dict/list만 새로 만드는 구조 복사
+import json
+import os
+from pathlib import Path
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+# JSON_BACKEND=auto(기본) | orjson | stdlib
+JSON_BACKEND = os.getenv("JSON_BACKEND", "auto").lower()
+
+try:
+    if JSON_BACKEND == "stdlib":
+        raise ImportError
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    orjson = None
+    HAS_ORJSON = False
+    if JSON_BACKEND == "orjson":
+        raise
+
+_ORJSON_OPTS = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS) if HAS_ORJSON else 0
+
+
+def dumps(obj: Any) -> bytes:
+    if HAS_ORJSON:
+        return orjson.dumps(obj, option=_ORJSON_OPTS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data: Any) -> Any:
+    # str/bytes 모두 허용
+    if HAS_ORJSON:
+        return orjson.loads(data)
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data).decode("utf-8")
+    return json.loads(data)
+
+
+def load_file(path: Path) -> Any:
+    with open(str(path), "rb") as f:
+        return loads(f.read())
+
+
+def dump_file(path: Path, obj: Any) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(str(path), "wb") as f:
+        f.write(dumps(obj))
+
+
+class FastJSONResponse(JSONResponse):
+    # JSONResponse와 동일하게 쓰되 렌더링만 compact/orjson으로 교체
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def copy_document(obj: Any) -> Any:
+    """JSON 호환 문서의 구조 복사. 문자열/숫자 등 불변 값은 공유하고 dict/list만 새로 만듭니다."""
+    t = type(obj)
+    if t is dict:
+        return {k: copy_document(v) for k, v in obj.items()}
+    if t is list:
+        # 임베딩처럼 평평한 숫자 리스트는 얕은 복사로 충분
+        if not obj or type(obj[0]) is float:
+            if all(type(x) is float for x in obj):
+                return obj.copy()
+        return [copy_document(v) for v in obj]
+    if t is tuple:
+        return [copy_document(v) for v in obj]
+    return obj
@@ -0,0 +1,106 @@
+# idempotency.py
+# 분석/포트폴리오 요청의 중복 실행 방지.
+#  - 같은 사용자·직무·문서 종류·버전·내용(content_hash)의 요청이 처리 중이면 새로 실행하지 않고
+#    그 결과를 함께 받음 (single-flight, 워커 프로세스 단위)
+#  - 작업은 별도 태스크로 실행 → 먼저 보낸 요청의 연결이 끊겨도 계속 진행되고 뒤에 온 요청이 결과를 받음
+#  - 성공(2xx) 응답은 IDEMPOTENCY_REPLAY_SEC 동안 공유 캐시에 보관 → 재시도/다른 워커로 간 중복 요청은 재생
+#  - Idempotency-Key 헤더가 있으면 그 키로도 재생. 같은 키를 다른 내용에 쓰면 422
+#  - 재생/합류한 응답에는 Idempotent-Replayed: true 헤더
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from fastapi.responses import Response
+
+from cache import get_cache, make_key
+from metrics import Counter
+
+IDEMPOTENCY_ENABLED = os.getenv("IDEMPOTENCY_ENABLED", "1") not in ("0", "false", "False")
+IDEMPOTENCY_REPLAY_SEC = float(os.getenv("IDEMPOTENCY_REPLAY_SEC", "300"))
+IDEMPOTENCY_KEY_MAX_LEN = 255
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+IDEMPOTENT_REQUESTS = Counter("idempotent_requests_total", "Analyze/portfolio requests by dedup outcome", ("scope", "outcome"))
+
+# fingerprint → (실행 중인 태스크)
+_inflight: Dict[str, "asyncio.Task[Tuple[int, bytes, str]]"] = {}
+
+
+def _respond(status: int, body: bytes, media_type: str, replayed: bool) -> Response:
+    headers = {REPLAYED_HEADER: "true"} if replayed else None
+    return Response(content=body, status_code=status, media_type=media_type, headers=headers)
+
+
+def _replay(entry: Optional[Dict[str, Any]], fingerprint: str) -> Optional[Response]:
+    if entry is None:
+        return None
+    if entry["fingerprint"] != fingerprint:
+        raise HTTPException(status_code=422, detail="Idempotency-Key가 다른 요청에 이미 사용되었습니다.")
+    return _respond(entry["status"], entry["body"].encode("utf-8"), entry["media_type"], True)
+
+
+async def _execute(run: Callable[[], Awaitable[Response]]) -> Tuple[int, bytes, str]:
+    response = await run()
+    return response.status_code, bytes(response.body), response.media_type or "application/json"
+
+
+async def idempotent(
+    request: Request,
+    user_id: str,
+    scope: str,
+    natural_key: Tuple[Any, ...],
+    run: Callable[[], Awaitable[Response]],
+    replay_valid: Optional[Callable[[], bool]] = None,
+) -> Response:
+    """natural_key = (job_slug, doc_type, version, content_hash). run()은 JSON Response를 반환하는 실제 처리.
+
+    replay_valid: 저장된 응답을 재생해도 되는지 (롤백 등으로 그 결과가 더는 보이지 않으면 False → 다시 실행)
+    """
+    if not IDEMPOTENCY_ENABLED:
+        return await run()
+    idem_key = (request.headers.get("idempotency-key") or "").strip()
+    if len(idem_key) > IDEMPOTENCY_KEY_MAX_LEN:
+        raise HTTPException(status_code=400, detail="Idempotency-Key가 너무 깁니다.")
+
+    fingerprint = make_key(scope, user_id, *natural_key)
+    store = get_cache("idempotency")
+    key_slot = make_key("key", scope, user_id, idem_key) if idem_key else None
+
+    # 1) 이미 끝난 요청이면 재생 (명시적 키 우선, 없으면 내용 기준)
+    replayed = _replay(store.get(key_slot), fingerprint) if key_slot else None
+    if replayed is None:
+        replayed = _replay(store.get(make_key("fp", fingerprint)), fingerprint)
+    if replayed is not None and (replay_valid is None or replay_valid()):
+        IDEMPOTENT_REQUESTS.inc(scope=scope, outcome="replayed")
+        return replayed
+
+    # 2) 처리 중이면 합류
+    task = _inflight.get(fingerprint)
+    if task is not None:
+        IDEMPOTENT_REQUESTS.inc(scope=scope, outcome="coalesced")
+        status, body, media_type = await asyncio.shield(task)
+        return _respond(status, body, media_type, True)
+
+    # 3) 새로 실행
+    IDEMPOTENT_REQUESTS.inc(scope=scope, outcome="executed")
+    task = asyncio.create_task(_execute(run))
+    _inflight[fingerprint] = task
+
+    def _done(t: "asyncio.Task[Tuple[int, bytes, str]]") -> None:
+        _inflight.pop(fingerprint, None)
+        if t.cancelled() or t.exception() is not None:
+            return  # 실패는 보관하지 않음 (재시도하면 다시 실행)
+        status, body, media_type = t.result()
+        if 200 <= status < 300:
+            entry = {"fingerprint": fingerprint, "status": status, "body": body.decode("utf-8"), "media_type": media_type}
+            try:
+                store.set(make_key("fp", fingerprint), entry, IDEMPOTENCY_REPLAY_SEC)
+                if key_slot:
+                    store.set(key_slot, entry, IDEMPOTENCY_REPLAY_SEC)
+            except Exception as e:
+                print(f"[idempotency] failed to store replay entry: {e}")
+
+    task.add_done_callback(_done)
+    status, body, media_type = await asyncio.shield(task)
+    return _respond(status, body, media_type, False)
@@ -336,13 +336,38 @@ JOB_DOCUMENT_SCHEMAS = {
     }
 }
 
+# AI 피드백 단위가 되는 문서 섹션 (individual_feedbacks 키와 동일)
+DOC_SECTION_KEYS = {
+    "resume": ["education", "activities", "awards", "certificates"],
+    "cover_letter": [
+        "reason_for_application",
+        "expertise_experience",
+        "collaboration_experience",
+        "challenging_goal_experience",
+        "growth_process",
+    ],
+}
+
+DOC_SECTION_LABELS = {
+    "resume": {"education": "학력", "activities": "대외활동", "awards": "수상경력", "certificates": "자격증"},
+    "cover_letter": {
+        "reason_for_application": "지원 동기",
+        "expertise_experience": "전문성 경험",
+        "collaboration_experience": "협업 경험",
+        "challenging_goal_experience": "도전적 목표 경험",
+        "growth_process": "성장 과정",
+    },
+}
+
 # 모든 직무를 플랫 리스트로 만들기 (URL 슬러그로 사용하기 위함)
 ALL_JOB_SLUGS = []
+JOB_SLUG_TO_TITLE: Dict[str, str] = {}  # 슬러그 → 직무명 (요청마다 순회하지 않도록 미리 계산)
 for category_jobs in JOB_CATEGORIES.values():
     for job_title in category_jobs:
         # URL 친화적인 슬러그 생성 (예: "프론트엔드 개발자" -> "프론트엔드-개발자")
         slug = job_title.replace(" ", "-").replace("/", "-").lower()
         ALL_JOB_SLUGS.append(slug)
+        JOB_SLUG_TO_TITLE[slug] = job_title
 
 def get_job_document_schema(job_slug: str, doc_type: str) -> Optional[Dict[str, Any]]:
     """
@@ -350,12 +375,7 @@ def get_job_document_schema(job_slug: str, doc_type: str) -> Optional[Dict[str,
     현재는 직무에 상관없이 문서 타입별 공통 스키마를 사용합니다.
     """
     # job_slug를 실제 job_title로 변환 (필요시)
-    job_title_map = {}
-    for category_jobs in JOB_CATEGORIES.values():
-        for jt in category_jobs:
-            job_title_map[jt.replace(" ", "-").replace("/", "-").lower()] = jt
-
-    actual_job_title = job_title_map.get(job_slug)
+    actual_job_title = JOB_SLUG_TO_TITLE.get(job_slug)
     
     # 향후 job_title에 따라 스키마를 다르게 줄 수도 있습니다.
     # 예: if actual_job_title == "프론트엔드 개발자": return specific_frontend_resume_schema
@@ -1,16 +1,18 @@
+import time
+_IMPORT_STARTED = time.perf_counter()  # import 시간 측정 (warmup.IMPORT_TIME_BUDGET_MS와 비교)
+
 from dotenv import load_dotenv
-from fastapi import FastAPI, Request, HTTPException, Depends, UploadFile, File, Form
-from fastapi.responses import HTMLResponse, JSONResponse, FileResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, Request, HTTPException, Depends, UploadFile, File, Form, Query
+from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, PlainTextResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple, Union
 from pathlib import Path
-import os, json, traceback, re
+import os, json, traceback, re, asyncio
 from urllib.parse import unquote, quote
 from pydantic import BaseModel
 
-load_dotenv()
+load_dotenv()  # .env는 여기서 한 번만 로드 (이후 import되는 모듈들이 환경변수를 읽음)
 
 # --- utils ---
 from utils import (
@@ -19,26 +21,58 @@ from utils import (
     load_company_analysis,
     get_embedding,
     calculate_content_hash,
+    calculate_section_hashes,
+    get_changed_sections,
+    select_model_tier,
+    is_minor_change,
     summarize_portfolio_and_generate_pdf,
 )
 
 # --- JWT(dep) ---
 from auth_local import get_current_user  # Authorization: Bearer ... → user_id(str)
-from job_data import JOB_CATEGORIES, JOB_DETAILS, get_job_document_schema
+from job_data import JOB_CATEGORIES, JOB_DETAILS, DOC_SECTION_KEYS, get_job_document_schema
+from metrics import MetricsMiddleware, stage_timer, record_cache, render_metrics, monitor_event_loop_lag, METRICS_ENABLED
+from diagnostics import ServerTimingMiddleware
+from ratelimit import llm_scheduler
+import fastjson
+from fastjson import FastJSONResponse, copy_document, load_file, dump_file
+from compression import CompressionMiddleware
+from static_assets import PrecompressedStaticFiles, asset_url
+from warmup import run_warmup, readiness, record_import_time, WARMUP_BLOCKING
+from user_cache import user_doc_cache, cached_json_response, etag_matches
+from cache import get_cache, make_key, flush_writes as flush_cache_writes
+from text_diff import diff_document
+from uploads import UploadLimitMiddleware, upload_sha256
+from idempotency import idempotent
+from resilience import RequestBudgetMiddleware, resilience_stats
+from version_store import (
+    list_version_files, visible_versions, write_versions, rollback as rollback_versions, undo_rollback, is_visible,
+    run_version_gc, ROLLBACK_UNDO_WINDOW_SEC, VERSION_GC_ENABLED,
+)
+from compaction import run_compaction, COMPACTION_ENABLED
+from user_paths import USERS_DIR, user_doc_dir, user_company_file, user_profile_file
 
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
 
 BASE_DIR = Path(__file__).resolve().parent
 DATA_DIR = BASE_DIR / "data"
 STATIC_DIR = BASE_DIR / "static"
 TEMPLATES_DIR = BASE_DIR / "templates"
 
-os.makedirs(DATA_DIR, exist_ok=True)
-os.makedirs(STATIC_DIR, exist_ok=True)
-os.makedirs(TEMPLATES_DIR, exist_ok=True)
+# 배치 분석 시 동시에 진행할 문서 분석 수 (모든 요청이 공유)
+BATCH_ANALYSIS_CONCURRENCY = int(os.getenv("BATCH_ANALYSIS_CONCURRENCY", "4"))
+_batch_semaphore = asyncio.Semaphore(BATCH_ANALYSIS_CONCURRENCY)
 
-app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
+# 빌드된 해시 파일(static/dist)은 immutable 캐시, .br/.gz가 있으면 사전 압축본 전송 (python static_assets.py)
+app.mount("/static", PrecompressedStaticFiles(directory=str(STATIC_DIR)), name="static")
 templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
+templates.env.globals["asset_url"] = asset_url
+
+# ---- 요청 예산 (이 요청의 OpenAI 호출 타임아웃/재시도가 REQUEST_BUDGET_SEC 안에서만) ----
+app.add_middleware(RequestBudgetMiddleware)
+
+# ---- 업로드 크기 제한 (본문 버퍼링 전에 413, CORS 헤더가 붙도록 가장 안쪽) ----
+app.add_middleware(UploadLimitMiddleware)
 
 # ---- CORS (dev) ----
 app.add_middleware(
@@ -49,42 +83,77 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ---- JSON/HTML 응답 압축 (COMPRESS_MIN_BYTES 이상) ----
+app.add_middleware(CompressionMiddleware)
+
+# ---- metrics (/metrics) & Server-Timing / 요청 프로파일링 ----
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(ServerTimingMiddleware)
+
+@app.on_event("startup")
+async def _start_event_loop_lag_monitor():
+    if METRICS_ENABLED:
+        app.state.loop_lag_task = asyncio.create_task(monitor_event_loop_lag())
+
+@app.on_event("startup")
+async def _start_version_maintenance():
+    if VERSION_GC_ENABLED:
+        app.state.version_gc_task = asyncio.create_task(run_version_gc(USERS_DIR))
+    if COMPACTION_ENABLED:
+        app.state.compaction_task = asyncio.create_task(run_compaction(USERS_DIR))
+
+@app.on_event("startup")
+async def _start_warmup():
+    if WARMUP_BLOCKING:
+        await run_warmup()
+    else:
+        app.state.warmup_task = asyncio.create_task(run_warmup())
+
+@app.on_event("shutdown")
+async def _flush_cache_writes():
+    # 공유 캐시 write-behind 대기분을 반영하고 종료
+    await asyncio.to_thread(flush_cache_writes)
+
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    return {"status": "ok"}
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    info = readiness()
+    info["circuits"] = resilience_stats()  # 열려 있어도 대체 경로가 있으므로 readiness에는 반영하지 않음
+    return FastJSONResponse(content=info, status_code=200 if info["ready"] else 503)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # -------- helpers --------
 def _list_version_files(doc_dir: Path) -> List[str]:
-    if not doc_dir.is_dir():
-        return []
-    files = [f.name for f in doc_dir.iterdir() if f.is_file() and re.fullmatch(r"v\d+\.json", f.name)]
-    files.sort(key=lambda name: int(re.findall(r"\d+", name)[0]))
-    return files
+    # HEAD(롤백 포인터) 이하 버전만
+    return list_version_files(doc_dir)
 
 def _load_json(path: Path) -> Any:
-    with open(str(path), "r", encoding="utf-8") as f:
-        return json.load(f)
+    return load_file(path)
 
 def _dump_json(path: Path, obj: Any) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with open(str(path), "w", encoding="utf-8") as f:
-        json.dump(obj, f, ensure_ascii=False, indent=2)
+    # compact 출력 (임베딩 1536개 float가 대부분이라 들여쓰기는 크기/시간만 늘림)
+    dump_file(path, obj)
+
+def _write_versions(writes: List[Tuple[Path, Dict[str, Any]]]) -> None:
+    # vN.json 저장 + head 갱신을 디렉터리 잠금 안에서 (롤백 GC와 겹치지 않도록; 스레드에서 호출)
+    by_dir: Dict[Path, List[Tuple[Path, Dict[str, Any]]]] = {}
+    for path, doc in writes:
+        by_dir.setdefault(path.parent, []).append((path, doc))
+    for d, items in by_dir.items():
+        def write(items=items):
+            for path, doc in items:
+                _dump_json(path, doc)
+        write_versions(d, [int(doc["version"]) for _, doc in items], write)
 
 def _slugify_job_title(job_title: str) -> str:
     return job_title.replace(" ", "-").replace("/", "-").lower()
 
-# ---- user paths ----
-def _user_base_dir(user_id: str) -> Path:
-    return DATA_DIR / "users" / user_id
-
-def _user_job_dir(user_id: str, job_slug: str) -> Path:
-    return _user_base_dir(user_id) / unquote(job_slug)
-
-def _user_doc_dir(user_id: str, job_slug: str, doc_type: str) -> Path:
-    return _user_job_dir(user_id, job_slug) / doc_type
-
-def _user_company_file(user_id: str) -> Path:
-    return _user_base_dir(user_id) / "companies" / "current_company_analysis.json"
-
-def _user_profile_file(user_id: str) -> Path:
-    return _user_base_dir(user_id) / "profile.json"
-
 # -------- models --------
 class AnalyzeDocumentRequest(BaseModel):
     job_title: str
@@ -92,6 +161,19 @@ class AnalyzeDocumentRequest(BaseModel):
     version: int
     feedback_reflection: Optional[str] = None
     company_name: Optional[str] = None
+    force_reanalyze: bool = False
+
+class BatchDocumentItem(BaseModel):
+    doc_type: str
+    document_content: Dict[str, Any]
+    version: int
+    feedback_reflection: Optional[str] = None
+    force_reanalyze: bool = False
+
+class AnalyzeDocumentsBatchRequest(BaseModel):
+    job_title: str
+    company_name: Optional[str] = None
+    documents: List[BatchDocumentItem]
 
 class AnalyzeCompanyRequest(BaseModel):
     company_name: str
@@ -118,7 +200,7 @@ async def get_document_editor_page(request: Request, job_slug: str):
         {"request": request, "job_title": job_title, "job_slug": job_slug, "job_details": job_details}
     )
 
-@app.get("/apiText/document_schema/{doc_type}", response_class=JSONResponse)
+@app.get("/apiText/document_schema/{doc_type}", response_class=FastJSONResponse)
 async def get_document_schema_endpoint(doc_type: str, job_slug: str):
     job_title = get_job_title_from_slug(job_slug)
     if not job_title:
@@ -126,35 +208,36 @@ async def get_document_schema_endpoint(doc_type: str, job_slug: str):
     schema = get_job_document_schema(job_title, doc_type)
     if not schema:
         raise HTTPException(status_code=404, detail="Document schema not found for this type or job.")
-    return JSONResponse(content=schema)
+    return FastJSONResponse(content=schema)
 
 # -------- profile (mypage) --------
-@app.get("/apiText/user_profile", response_class=JSONResponse)
-async def get_user_profile(user_id: str = Depends(get_current_user)):
-    p = _user_profile_file(user_id)
-    if not p.exists():
-        return JSONResponse(content={
-            "education": [{"level": "", "status": "", "school": "", "major": ""}],
-            "activities": [{"title": "", "content": ""}],
-            "awards": [{"title": "", "content": ""}],
-            "certificates": [""],
-        })
+_DEFAULT_PROFILE = {
+    "education": [{"level": "", "status": "", "school": "", "major": ""}],
+    "activities": [{"title": "", "content": ""}],
+    "awards": [{"title": "", "content": ""}],
+    "certificates": [""],
+}
+
+@app.get("/apiText/user_profile", response_class=FastJSONResponse)
+async def get_user_profile(request: Request, user_id: str = Depends(get_current_user)):
+    # 메모리 캐시(write-through)에서 바로 응답, 변경이 없으면 304
     try:
-        return JSONResponse(content=_load_json(p))
+        etag, body = user_doc_cache.get(user_profile_file(user_id), _DEFAULT_PROFILE)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to read profile: {e}")
+    return cached_json_response(request, etag, body)
 
-@app.post("/apiText/user_profile", response_class=JSONResponse)
+@app.post("/apiText/user_profile", response_class=FastJSONResponse)
 async def save_user_profile(profile: UserProfile, user_id: str = Depends(get_current_user)):
     try:
-        path = _user_profile_file(user_id)
-        _dump_json(path, profile.dict())
-        return JSONResponse(content={"status": "ok"})
+        path = user_profile_file(user_id)
+        etag, _ = user_doc_cache.put(path, profile.dict())
+        return FastJSONResponse(content={"status": "ok"}, headers={"ETag": etag})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save profile: {e}")
 
 # -------- load documents --------
-@app.get("/apiText/load_documents/{job_slug}", response_class=JSONResponse)
+@app.get("/apiText/load_documents/{job_slug}", response_class=FastJSONResponse)
 async def api_load_documents(job_slug: str, user_id: str = Depends(get_current_user)):
     job_title = get_job_title_from_slug(job_slug)
     if not job_title:
@@ -162,81 +245,211 @@ async def api_load_documents(job_slug: str, user_id: str = Depends(get_current_u
     try:
         result: Dict[str, List[Dict[str, Any]]] = {"resume": [], "cover_letter": [], "portfolio": []}
         for doc_type in result.keys():
-            d = _user_doc_dir(user_id, job_slug, doc_type)
-            for name in _list_version_files(d):
-                try:
-                    result[doc_type].append(_load_json(d / name))
-                except Exception:
-                    traceback.print_exc()
-        return JSONResponse(content=result)
+            d = user_doc_dir(user_id, job_slug, doc_type)
+            with stage_timer("load_documents", "list_versions"):
+                names = _list_version_files(d)
+            with stage_timer("load_documents", "read_versions"):
+                for name in names:
+                    try:
+                        result[doc_type].append(_load_json(d / name))
+                    except Exception:
+                        traceback.print_exc()
+        with stage_timer("load_documents", "serialize"):
+            response = FastJSONResponse(content=result)
+        return response
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Failed to load documents: {e}")
 
+# -------- version diff --------
+DIFF_FORMAT_VERSION = 1  # diff 결과 형식이 바뀌면 올려서 캐시 무효화
+
+@app.get("/apiText/diff/{doc_type}/{job_slug}", response_class=FastJSONResponse)
+async def diff_document_versions(
+    request: Request,
+    doc_type: str,
+    job_slug: str,
+    from_version: Optional[int] = Query(None, alias="from"),
+    to_version: Optional[int] = Query(None, alias="to"),
+    user_id: str = Depends(get_current_user),
+):
+    # 두 버전만 읽어 섹션별 어절 단위 diff. 결과는 content_hash 쌍으로 캐시 (버전 번호와 무관)
+    if doc_type not in DOC_SECTION_KEYS:
+        raise HTTPException(status_code=400, detail="diff는 resume, cover_letter만 지원합니다.")
+    doc_dir = user_doc_dir(user_id, job_slug, doc_type)
+    if from_version is None or to_version is None:
+        versions = visible_versions(doc_dir)
+        if to_version is None:
+            if not versions:
+                raise HTTPException(status_code=404, detail="No versions found")
+            to_version = versions[-1]
+        if from_version is None:
+            older = [v for v in versions if v < to_version]
+            if not older:
+                raise HTTPException(status_code=400, detail="비교할 이전 버전이 없습니다.")
+            from_version = older[-1]
+
+    docs = []
+    with stage_timer("diff", "load_versions"):
+        for v in (from_version, to_version):
+            p = doc_dir / f"v{v}.json"
+            if not p.exists() or not is_visible(doc_dir, v):
+                raise HTTPException(status_code=404, detail=f"Version v{v} not found")
+            docs.append(_load_json(p).get("content") or {})
+    old_content, new_content = docs
+
+    from_hash = calculate_content_hash(old_content)
+    to_hash = calculate_content_hash(new_content)
+    cache_key = make_key(DIFF_FORMAT_VERSION, doc_type, from_hash, to_hash)
+    etag = '"' + make_key(cache_key, from_version, to_version)[:32] + '"'
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return cached_json_response(request, etag, b"")
+
+    diff_cache = get_cache("diff")
+    result = diff_cache.get(cache_key)
+    if result is None:
+        with stage_timer("diff", "compute"):
+            result = await asyncio.to_thread(diff_document, doc_type, old_content, new_content)
+        diff_cache.set(cache_key, result)
+
+    body = fastjson.dumps({
+        "doc_type": doc_type,
+        "from": from_version,
+        "to": to_version,
+        "from_hash": from_hash,
+        "to_hash": to_hash,
+        **result,
+    })
+    return cached_json_response(request, etag, body)
+
 # -------- company analysis --------
-@app.post("/apiText/analyze_company", response_class=JSONResponse)
+@app.post("/apiText/analyze_company", response_class=FastJSONResponse)
 async def analyze_company_endpoint(request_data: AnalyzeCompanyRequest, user_id: str = Depends(get_current_user)):
     company_name = request_data.company_name
     if not company_name:
         raise HTTPException(status_code=400, detail="기업명을 입력해주세요.")
+    llm_scheduler.precheck(user_id)
     from utils import perform_company_analysis
-    user_company_file = _user_company_file(user_id)
-    user_company_file.parent.mkdir(parents=True, exist_ok=True)
-    return await perform_company_analysis(company_name, str(user_company_file))
-
-@app.get("/apiText/load_last_company_analysis", response_class=JSONResponse)
-async def load_last_company_analysis(user_id: str = Depends(get_current_user)):
-    company_file = _user_company_file(user_id)
-    if not company_file.exists():
-        return JSONResponse(content={
-            "company_name": "",
-            "summary": "",
-            "core_values": [],
-            "key_strengths": [],
-            "interview_tips": [],
-            "raw": {}
-        })
+    company_file = user_company_file(user_id)
+    company_file.parent.mkdir(parents=True, exist_ok=True)
+    return await perform_company_analysis(company_name, str(company_file), user_id=user_id)
+
+_DEFAULT_COMPANY_ANALYSIS = {
+    "company_name": "",
+    "summary": "",
+    "core_values": [],
+    "key_strengths": [],
+    "interview_tips": [],
+    "raw": {}
+}
+
+@app.get("/apiText/load_last_company_analysis", response_class=FastJSONResponse)
+async def load_last_company_analysis(request: Request, user_id: str = Depends(get_current_user)):
     try:
-        data = _load_json(company_file)
-        return JSONResponse(content=data)
+        etag, body = user_doc_cache.get(user_company_file(user_id), _DEFAULT_COMPANY_ANALYSIS)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to read analysis: {e}")
+    return cached_json_response(request, etag, body)
 
 # -------- analyze & save (update current, clone next) --------
-@app.post("/apiText/analyze_document/{doc_type}")
-async def analyze_document_endpoint(
+async def _analyze_document(
+    user_id: str,
     doc_type: str,
     request_data: AnalyzeDocumentRequest,
-    user_id: str = Depends(get_current_user),
-):
-    try:
-        job_title = request_data.job_title
-        doc_content_dict = request_data.document_content
-        current_version = int(request_data.version or 0)  # 편집 중인 버전
-        next_version = current_version + 1
-
-        feedback_reflection = request_data.feedback_reflection
-        company_name = request_data.company_name
+    company_analysis: Optional[Dict[str, Any]],
+) -> Union[JSONResponse, Tuple[Dict[str, Any], List[Tuple[Path, Dict[str, Any]]]]]:
+    # 분석만 수행하고 (응답 payload, 저장할 (경로, 문서) 목록)을 반환. AI 오류는 JSONResponse 그대로 반환
+    job_title = request_data.job_title
+    doc_content_dict = request_data.document_content
+    current_version = int(request_data.version or 0)  # 편집 중인 버전
+    next_version = current_version + 1
+
+    feedback_reflection = request_data.feedback_reflection
+    company_name = request_data.company_name
 
-        company_analysis = await load_company_analysis(user_id)
-        job_slug = _slugify_job_title(job_title)
+    job_slug = _slugify_job_title(job_title)
 
-        # 비교용 이전/그전 버전은 "현재 버전 기준"으로 로드
-        doc_dir = _user_doc_dir(user_id, job_slug, doc_type)
-        prev_path = doc_dir / f"v{current_version}.json"
-        older_path = doc_dir / f"v{current_version-1}.json"
+    # 비교용 이전/그전 버전은 "현재 버전 기준"으로 로드
+    doc_dir = user_doc_dir(user_id, job_slug, doc_type)
+    prev_path = doc_dir / f"v{current_version}.json"
+    older_path = doc_dir / f"v{current_version-1}.json"
+    with stage_timer("analyze_document", "history_retrieval"):
         previous_document_data = _load_json(prev_path) if prev_path.exists() else None
         older_document_data = _load_json(older_path) if older_path.exists() else None
+        if request_data.force_reanalyze:
+            # 강제 재분석은 경미한 변경 판정 뒤에 오므로 vN에는 이미 같은 내용이 저장돼 있음 → 한 버전 앞과 비교
+            oldest_path = doc_dir / f"v{current_version-2}.json"
+            previous_document_data = older_document_data
+            older_document_data = _load_json(oldest_path) if oldest_path.exists() else None
+
+    # 임베딩 텍스트 (포트폴리오는 AI 요약으로 임베딩하므로 LLM 이후 계산)
+    def _embedding_text(summary: str) -> str:
+        if doc_type == "portfolio":
+            return summary
+        if doc_type == "resume":
+            return " ".join([
+                json.dumps(doc_content_dict.get("education", []), ensure_ascii=False),
+                json.dumps(doc_content_dict.get("activities", []), ensure_ascii=False),
+                json.dumps(doc_content_dict.get("awards", []), ensure_ascii=False),
+                json.dumps(doc_content_dict.get("certificates", []), ensure_ascii=False),
+            ])
+        # cover_letter
+        return (
+            f"지원 이유: {doc_content_dict.get('reason_for_application', '')} "
+            f"전문성 경험: {doc_content_dict.get('expertise_experience', '')} "
+            f"협업 경험: {doc_content_dict.get('collaboration_experience', '')} "
+            f"도전적 목표 경험: {doc_content_dict.get('challenging_goal_experience', '')} "
+            f"성장 과정: {doc_content_dict.get('growth_process', '')}"
+        )
+
+    current_doc_embedding = None
+    current_embedding_model = None
+    if doc_type != "portfolio":
+        with stage_timer("analyze_document", "embedding"):
+            current_embedding_model, current_doc_embedding = await get_embedding(_embedding_text(""), user_id=user_id)
+
+    # 오타/공백 수준의 재제출이면 LLM 호출 없이 이전 피드백 재사용
+    minor_change = not request_data.force_reanalyze and is_minor_change(
+        doc_type, doc_content_dict, current_doc_embedding, previous_document_data, current_embedding_model
+    )
+    if previous_document_data and doc_type in DOC_SECTION_KEYS:
+        record_cache("near_duplicate", minor_change)
+    changed_sections: Optional[List[str]] = None
+    model_tier: Optional[str] = None
+    tier_reason = "minor_change"
+    if minor_change:
+        overall_ai_feedback = previous_document_data.get("feedback", "")
+        individual_ai_feedbacks = previous_document_data.get("individual_feedbacks", {}) or {}
+        ai_summary = previous_document_data.get("summary", "")
+        changed_sections = []
+    else:
+        if request_data.force_reanalyze:
+            # 사용자가 명시적으로 요청 → 모든 섹션을 full 티어로 다시 분석
+            changed_sections, reused_feedbacks = None, {}
+            model_tier, tier_reason = "full", "forced"
+        else:
+            # 변경된 섹션만 재분석 (나머지는 이전 버전 피드백 재사용)
+            with stage_timer("analyze_document", "hashing"):
+                changed_sections, reused_feedbacks = get_changed_sections(doc_type, doc_content_dict, previous_document_data)
+            for key in DOC_SECTION_KEYS.get(doc_type, []) if previous_document_data else []:
+                record_cache("section_feedback", key in reused_feedbacks)
+            # 변경 규모에 따라 모델 티어 선택
+            model_tier, tier_reason = select_model_tier(doc_type, doc_content_dict, previous_document_data)
 
         # AI 피드백 생성 (현재 vs 이전 비교)
-        feedback_response_json = await get_ai_feedback(
-            job_title, doc_type, doc_content_dict,
-            previous_document_data=previous_document_data,
-            older_document_data=older_document_data,
-            additional_user_context=feedback_reflection,
-            company_name=company_name,
-            company_analysis=company_analysis,
-        )
+        with stage_timer("analyze_document", "llm_call"):
+            feedback_response_json = await get_ai_feedback(
+                job_title, doc_type, doc_content_dict,
+                previous_document_data=previous_document_data,
+                older_document_data=older_document_data,
+                additional_user_context=feedback_reflection,
+                company_name=company_name,
+                company_analysis=company_analysis,
+                target_sections=changed_sections,
+                reused_feedbacks=reused_feedbacks,
+                model_tier=model_tier,
+                user_id=user_id,
+            )
         if getattr(feedback_response_json, "status_code", 200) != 200:
             return feedback_response_json
 
@@ -245,67 +458,162 @@ async def analyze_document_endpoint(
         individual_ai_feedbacks = feedback_content.get("individual_feedbacks", {})
         ai_summary = feedback_content.get("summary", "")
 
-        # 임베딩 텍스트
-        if doc_type == "portfolio":
-            text_for_current_embedding = ai_summary
-        elif doc_type == "resume":
-            text_for_current_embedding = " ".join([
-                json.dumps(doc_content_dict.get("education", []), ensure_ascii=False),
-                json.dumps(doc_content_dict.get("activities", []), ensure_ascii=False),
-                json.dumps(doc_content_dict.get("awards", []), ensure_ascii=False),
-                json.dumps(doc_content_dict.get("certificates", []), ensure_ascii=False),
-            ])
-        else:  # cover_letter
-            text_for_current_embedding = (
-                f"지원 이유: {doc_content_dict.get('reason_for_application', '')} "
-                f"전문성 경험: {doc_content_dict.get('expertise_experience', '')} "
-                f"협업 경험: {doc_content_dict.get('collaboration_experience', '')} "
-                f"도전적 목표 경험: {doc_content_dict.get('challenging_goal_experience', '')} "
-                f"성장 과정: {doc_content_dict.get('growth_process', '')}"
-            )
-
-        current_doc_embedding = await get_embedding(text_for_current_embedding)
+    if current_doc_embedding is None:
+        with stage_timer("analyze_document", "embedding"):
+            current_embedding_model, current_doc_embedding = await get_embedding(_embedding_text(ai_summary), user_id=user_id)
+    with stage_timer("analyze_document", "hashing"):
         current_content_hash = calculate_content_hash(doc_content_dict)
+        section_hashes = calculate_section_hashes(doc_type, doc_content_dict)
+
+    # 1) 현재 버전 저장/갱신 (vN)
+    current_doc = {
+        "job_title": job_title,
+        "doc_type": doc_type,
+        "version": current_version,
+        "content": doc_content_dict,
+        "summary": ai_summary,
+        "feedback": overall_ai_feedback,
+        "individual_feedbacks": individual_ai_feedbacks,
+        "minor_change": minor_change,
+        "embedding": current_doc_embedding,
+        "embedding_model": current_embedding_model,
+        "content_hash": current_content_hash,
+        "section_hashes": section_hashes,
+        "company_name": company_name,
+    }
 
-        # 1) 현재 버전 저장/갱신 (vN)
-        current_doc = {
-            "job_title": job_title,
-            "doc_type": doc_type,
-            "version": current_version,
-            "content": doc_content_dict,
-            "feedback": overall_ai_feedback,
-            "individual_feedbacks": individual_ai_feedbacks,
-            "embedding": current_doc_embedding,
-            "content_hash": current_content_hash,
-            "company_name": company_name,
-        }
-        _dump_json(doc_dir / f"v{current_version}.json", current_doc)
-
-        # 2) 다음 버전 복제 생성 (vN+1)
-        next_doc = json.loads(json.dumps(current_doc, ensure_ascii=False))
-        next_doc["version"] = next_version
-        _dump_json(doc_dir / f"v{next_version}.json", next_doc)
-
-        return JSONResponse(content={
-            "message": "Document analyzed and saved successfully!",
-            "summary": ai_summary,
-            # 편의 필드(기존 프론트 호환)
-            "ai_feedback": overall_ai_feedback,
-            "individual_feedbacks": individual_ai_feedbacks,
-            # 명시적으로 두 버전 반환
-            "current_version_data": current_doc,
-            "next_version_data": next_doc,
-        })
+    # 2) 다음 버전 복제 생성 (vN+1)
+    next_doc = copy_document(current_doc)
+    next_doc["version"] = next_version
+
+    payload = {
+        "message": "Document analyzed and saved successfully!",
+        "summary": ai_summary,
+        # 편의 필드(기존 프론트 호환)
+        "ai_feedback": overall_ai_feedback,
+        "individual_feedbacks": individual_ai_feedbacks,
+        # 이번에 다시 분석한 섹션 (None이면 전체 분석)
+        "reanalyzed_sections": changed_sections,
+        "model_tier": model_tier,
+        "model_tier_reason": tier_reason,
+        # 경미한 변경으로 이전 피드백 재사용 (force_reanalyze=true로 재요청 시 강제 분석)
+        "minor_change": minor_change,
+        # 명시적으로 두 버전 반환
+        "current_version_data": current_doc,
+        "next_version_data": next_doc,
+    }
+    writes = [(doc_dir / f"v{current_version}.json", current_doc), (doc_dir / f"v{next_version}.json", next_doc)]
+    return payload, writes
+
+def _replay_still_valid(doc_dir: Path, next_version: int):
+    # 재생하려는 응답이 만든 vN+1이 아직 보이는지 (그 사이 롤백했다면 다시 실행)
+    return lambda: (doc_dir / f"v{next_version}.json").exists() and is_visible(doc_dir, next_version)
+
+@app.post("/apiText/analyze_document/{doc_type}")
+async def analyze_document_endpoint(
+    request: Request,
+    doc_type: str,
+    request_data: AnalyzeDocumentRequest,
+    user_id: str = Depends(get_current_user),
+):
+    async def _run():
+        # 사용자 요청 한도를 넘었으면 문서 로드/임베딩 전에 429
+        llm_scheduler.precheck(user_id)
+        try:
+            with stage_timer("analyze_document", "company_load"):
+                company_analysis = await load_company_analysis(user_id)
+            result = await _analyze_document(user_id, doc_type, request_data, company_analysis)
+            if isinstance(result, JSONResponse):
+                return result
+            payload, writes = result
+            with stage_timer("analyze_document", "disk_write"):
+                await asyncio.to_thread(_write_versions, writes)
+            return FastJSONResponse(content=payload)
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            traceback.print_exc()
+            raise HTTPException(status_code=500, detail=f"Server error during analysis and saving: {e}")
+
+    # 더블 클릭/재시도로 같은 요청이 겹치면 한 번만 분석하고 결과를 공유
+    job_slug = _slugify_job_title(request_data.job_title)
+    content_hash = calculate_content_hash({
+        "document_content": request_data.document_content,
+        "feedback_reflection": request_data.feedback_reflection,
+        "company_name": request_data.company_name,
+        "force_reanalyze": request_data.force_reanalyze,
+    })
+    return await idempotent(
+        request, user_id, "analyze_document",
+        (job_slug, doc_type, int(request_data.version or 0), content_hash),
+        _run,
+        replay_valid=_replay_still_valid(user_doc_dir(user_id, job_slug, doc_type), int(request_data.version or 0) + 1),
+    )
+
+# -------- batch analyze: 여러 문서를 동시에 분석 후 한 번에 저장 --------
+@app.post("/apiText/analyze_documents_batch", response_class=FastJSONResponse)
+async def analyze_documents_batch_endpoint(
+    request_data: AnalyzeDocumentsBatchRequest,
+    user_id: str = Depends(get_current_user),
+):
+    doc_types = [d.doc_type for d in request_data.documents]
+    if not doc_types:
+        raise HTTPException(status_code=400, detail="분석할 문서가 없습니다.")
+    if len(set(doc_types)) != len(doc_types):
+        raise HTTPException(status_code=400, detail="doc_type은 요청당 한 번씩만 지정할 수 있습니다.")
+    llm_scheduler.precheck(user_id)
+    try:
+        # 기업 분석은 한 번만 로드해 모든 문서에 공유
+        company_analysis = await load_company_analysis(user_id)
 
+        async def _run(item: BatchDocumentItem):
+            async with _batch_semaphore:
+                return await _analyze_document(
+                    user_id,
+                    item.doc_type,
+                    AnalyzeDocumentRequest(
+                        job_title=request_data.job_title,
+                        company_name=request_data.company_name,
+                        document_content=item.document_content,
+                        version=item.version,
+                        feedback_reflection=item.feedback_reflection,
+                        force_reanalyze=item.force_reanalyze,
+                    ),
+                    company_analysis,
+                )
+
+        outcomes = await asyncio.gather(*[_run(item) for item in request_data.documents], return_exceptions=True)
+
+        results: Dict[str, Any] = {}
+        all_writes: List[Tuple[Path, Dict[str, Any]]] = []
+        for doc_type, outcome in zip(doc_types, outcomes):
+            if isinstance(outcome, HTTPException):
+                results[doc_type] = {"error": outcome.detail, "status_code": outcome.status_code}
+            elif isinstance(outcome, Exception):
+                traceback.print_exception(type(outcome), outcome, outcome.__traceback__)
+                results[doc_type] = {"error": f"Server error during analysis: {outcome}", "status_code": 500}
+            elif isinstance(outcome, JSONResponse):
+                results[doc_type] = {**json.loads(outcome.body.decode("utf-8")), "status_code": outcome.status_code}
+            else:
+                payload, writes = outcome
+                results[doc_type] = {**payload, "status_code": 200}
+                all_writes.extend(writes)
+
+        # 모든 분석이 끝난 뒤 성공한 문서만 한 번에 저장
+        await asyncio.to_thread(_write_versions, all_writes)
+
+        return FastJSONResponse(content={"job_title": request_data.job_title, "results": results})
     except HTTPException:
         raise
     except Exception as e:
         traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Server error during analysis and saving: {e}")
+        raise HTTPException(status_code=500, detail=f"Server error during batch analysis: {e}")
 
 # -------- portfolio summary: update current, clone next --------
-@app.post("/apiText/portfolio_summary", response_class=JSONResponse)
+@app.post("/apiText/portfolio_summary", response_class=FastJSONResponse)
 async def portfolio_summary(
+    request: Request,
     job_title: str = Form(...),
     company_name: Optional[str] = Form(None),
     portfolio_link: Optional[str] = Form(None),
@@ -313,94 +621,113 @@ async def portfolio_summary(
     portfolio_pdf: Optional[UploadFile] = File(None),
     user_id: str = Depends(get_current_user),
 ):
-    try:
-        job_slug = _slugify_job_title(job_title)
-        doc_dir = _user_doc_dir(user_id, job_slug, "portfolio")
+    async def _run():
+        llm_scheduler.precheck(user_id)
+        try:
+            job_slug = _slugify_job_title(job_title)
+            doc_dir = user_doc_dir(user_id, job_slug, "portfolio")
+
+            current_version = int(version or 0)
+            next_version = current_version + 1
+
+            # 현재 버전(vN)으로 요약/PDF 생성 및 JSON 저장
+            pdf_path, download_url, ai_summary = await summarize_portfolio_and_generate_pdf(
+                user_id=user_id,
+                file=portfolio_pdf,
+                url=portfolio_link,
+                job_title=job_title,
+                version=current_version,      # vN 저장
+                feedback_reflection=None,
+                company_name=company_name,
+            )
 
+            # 방금 저장한 vN.json 읽기
+            vN_path = doc_dir / f"v{current_version}.json"
+            current_doc = _load_json(vN_path) if vN_path.exists() else {
+                "job_title": job_title,
+                "doc_type": "portfolio",
+                "version": current_version,
+                "content": {"summary": ai_summary or "", "portfolio_link": portfolio_link or ""},
+                "feedback": ai_summary or "",
+                "individual_feedbacks": {},
+                "embedding": [],
+                "content_hash": calculate_content_hash({"summary": ai_summary or "", "portfolio_link": portfolio_link or ""}),
+                "company_name": company_name,
+            }
+
+            # 다음 버전(vN+1) 복제 생성
+            next_doc = copy_document(current_doc)
+            next_doc["version"] = next_version
+            with stage_timer("portfolio_summary", "disk_write"):
+                await asyncio.to_thread(_write_versions, [(doc_dir / f"v{next_version}.json", next_doc)])
+
+            return FastJSONResponse(content={
+                "download_url": download_url,
+                "ai_summary": current_doc.get("content", {}).get("summary", ai_summary),
+                "individual_feedbacks": current_doc.get("individual_feedbacks", {}),
+                "current_version_data": current_doc,
+                "next_version_data": next_doc,
+            })
+        except HTTPException:
+            raise
+        except Exception as e:
+            traceback.print_exc()
+            raise HTTPException(status_code=500, detail=f"Portfolio summary failed: {e}")
+
+    # 같은 PDF/링크를 같은 버전에 중복 제출하면 요약(map-reduce 포함)을 한 번만 실행
+    try:
         current_version = int(version or 0)
-        next_version = current_version + 1
-
-        # 현재 버전(vN)으로 요약/PDF 생성 및 JSON 저장
-        pdf_path, download_url, ai_summary = await summarize_portfolio_and_generate_pdf(
-            user_id=user_id,
-            file=portfolio_pdf,
-            url=portfolio_link,
-            job_title=job_title,
-            version=current_version,      # vN 저장
-            feedback_reflection=None,
-            company_name=company_name,
-        )
-
-        # 방금 저장한 vN.json 읽기
-        vN_path = doc_dir / f"v{current_version}.json"
-        current_doc = _load_json(vN_path) if vN_path.exists() else {
-            "job_title": job_title,
-            "doc_type": "portfolio",
-            "version": current_version,
-            "content": {"summary": ai_summary or "", "portfolio_link": portfolio_link or ""},
-            "feedback": ai_summary or "",
-            "individual_feedbacks": {},
-            "embedding": [],
-            "content_hash": calculate_content_hash({"summary": ai_summary or "", "portfolio_link": portfolio_link or ""}),
-            "company_name": company_name,
-        }
-
-        # 다음 버전(vN+1) 복제 생성
-        next_doc = json.loads(json.dumps(current_doc, ensure_ascii=False))
-        next_doc["version"] = next_version
-        _dump_json(doc_dir / f"v{next_version}.json", next_doc)
-
-        return JSONResponse(content={
-            "download_url": download_url,
-            "ai_summary": current_doc.get("content", {}).get("summary", ai_summary),
-            "individual_feedbacks": current_doc.get("individual_feedbacks", {}),
-            "current_version_data": current_doc,
-            "next_version_data": next_doc,
-        })
-    except HTTPException:
-        raise
-    except Exception as e:
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Portfolio summary failed: {e}")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="version은 정수여야 합니다.")
+    pdf_sha256 = await upload_sha256(portfolio_pdf) if portfolio_pdf and portfolio_pdf.filename else None
+    job_slug = _slugify_job_title(job_title)
+    content_hash = calculate_content_hash({
+        "pdf_sha256": pdf_sha256,
+        "portfolio_link": portfolio_link,
+        "company_name": company_name,
+    })
+    return await idempotent(
+        request, user_id, "portfolio_summary",
+        (job_slug, "portfolio", current_version, content_hash),
+        _run,
+        replay_valid=_replay_still_valid(user_doc_dir(user_id, job_slug, "portfolio"), current_version + 1),
+    )
 
 # -------- rollback --------
+def _latest_visible(doc_dir: Path, version: int) -> Tuple[int, Dict[str, Any]]:
+    # 보통 head 파일 하나만 읽음 (중간 버전 파일이 없을 때만 목록 조회)
+    p = doc_dir / f"v{version}.json"
+    if p.exists():
+        return version, _load_json(p)
+    remaining = _list_version_files(doc_dir)
+    if not remaining:
+        return 0, {}
+    return int(re.findall(r"\d+", remaining[-1])[0]), _load_json(doc_dir / remaining[-1])
+
 @app.delete("/apiText/rollback_document/{doc_type}/{job_slug}/{version}")
 async def rollback_document(doc_type: str, job_slug: str, version: int, user_id: str = Depends(get_current_user)):
+    # head 포인터 이동 + tombstone 기록만 수행. 버려진 파일은 undo 기간 이후 백그라운드 GC가 삭제
     try:
-        doc_dir = _user_doc_dir(user_id, job_slug, doc_type)
+        doc_dir = user_doc_dir(user_id, job_slug, doc_type)
         if not doc_dir.is_dir():
             raise HTTPException(status_code=404, detail="Document path not found")
-
-        files = _list_version_files(doc_dir)
-        if not files:
+        try:
+            result = await asyncio.to_thread(rollback_versions, doc_dir, version)
+        except FileNotFoundError:
             raise HTTPException(status_code=404, detail="No versions to rollback")
-
-        max_ver = int(re.findall(r"\d+", files[-1])[0])
-        if version < 0 or version > max_ver:
+        except ValueError:
             raise HTTPException(status_code=400, detail="Invalid target version")
-        
-        deleted: List[str] = []
-        for name in files:
-            v = int(re.findall(r"\d+", name)[0])
-            if v > version:
-                try:
-                    (doc_dir / name).unlink(missing_ok=False)
-                    deleted.append(name)
-                except Exception as e:
-                    raise HTTPException(status_code=500, detail=f"Failed to delete {name}: {e}")
-
-        remaining = _list_version_files(doc_dir)
-        latest_version = int(re.findall(r"\d+", remaining[-1])[0]) if remaining else 0
-        latest_data: Dict[str, Any] = {}
-        if remaining:
-            latest_path = doc_dir / remaining[-1]
-            latest_data = _load_json(latest_path)
-
-        return JSONResponse(content={
+
+        latest_version, latest_data = _latest_visible(doc_dir, version)
+        tombstone = result["tombstone"]
+        return FastJSONResponse(content={
             "status": "ok",
-            "deleted": deleted,
+            "deleted": [f"v{v}.json" for v in range(version + 1, result["previous_head"] + 1)],
             "latest_version": latest_version,
             "latest_data": latest_data,
+            # undo 기간 안에 POST .../undo 로 되돌릴 수 있음
+            "undo_token": tombstone["id"] if tombstone else None,
+            "undo_window_sec": ROLLBACK_UNDO_WINDOW_SEC if tombstone else 0,
         })
     except HTTPException:
         raise
@@ -408,11 +735,34 @@ async def rollback_document(doc_type: str, job_slug: str, version: int, user_id:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Rollback failed: {e}")
 
+@app.post("/apiText/rollback_document/{doc_type}/{job_slug}/undo", response_class=FastJSONResponse)
+async def undo_rollback_document(doc_type: str, job_slug: str, undo_token: Optional[str] = None, user_id: str = Depends(get_current_user)):
+    try:
+        doc_dir = user_doc_dir(user_id, job_slug, doc_type)
+        try:
+            result = await asyncio.to_thread(undo_rollback, doc_dir, undo_token)
+        except LookupError:
+            raise HTTPException(status_code=409, detail="되돌릴 수 있는 롤백이 없습니다. (기간이 지났거나 이후에 새 버전이 저장됨)")
+        latest_version, latest_data = _latest_visible(doc_dir, result["head"])
+        return FastJSONResponse(content={
+            "status": "ok",
+            "latest_version": latest_version,
+            "latest_data": latest_data,
+        })
+    except HTTPException:
+        raise
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Undo rollback failed: {e}")
+
 # -------- pdf download --------
 @app.get("/apiText/download_pdf/{job_slug}/{doc_type}/{filename}")
 async def download_pdf_file(job_slug: str, doc_type: str, filename: str, user_id: str = Depends(get_current_user)):
-    file_path = _user_doc_dir(user_id, job_slug, doc_type) / filename
-    if not file_path.exists():
+    doc_dir = user_doc_dir(user_id, job_slug, doc_type)
+    file_path = doc_dir / filename
+    m = re.fullmatch(r"v(\d+)_summary\.pdf", filename)
+    if not file_path.exists() or (m and not is_visible(doc_dir, int(m.group(1)))):
+        # 롤백으로 버려진 버전의 요약 PDF는 GC 전이라도 내려주지 않음
         raise HTTPException(status_code=404, detail="File not found.")
     encoded_filename = quote(filename)
     return FileResponse(
@@ -460,6 +810,8 @@ def auth_bridge():
     html = html.replace("__ALLOWED__", allowed_json)
     return HTMLResponse(html)
 
+record_import_time(time.perf_counter() - _IMPORT_STARTED)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,226 @@
+# metrics.py
+# Prometheus 텍스트 포맷(0.0.4) 메트릭. 외부 의존성 없이 카운터/게이지/히스토그램만 구현.
+# 이벤트 루프 단일 스레드에서 갱신되므로 락 없이 dict 연산만 사용 (운영 상시 활성화 가능한 오버헤드)
+import asyncio
+import bisect
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") not in ("0", "false", "False")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+LLM_BUCKETS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0, 120.0)
+
+_REGISTRY: List["_Metric"] = []
+
+
+def _fmt_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        _REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, v in self.values.items():
+            lines.append(f"{self.name}{_fmt_labels(self.labelnames, key)} {_fmt_value(v)}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        if not METRICS_ENABLED:
+            return
+        self.values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.bounds = tuple(sorted(buckets))
+        # key → [버킷별 개수(누적 아님) + inf, 합계, 개수]
+        self.series: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        s = self.series.get(key)
+        if s is None:
+            s = self.series[key] = [[0] * (len(self.bounds) + 1), 0.0, 0]
+        s[0][bisect.bisect_left(self.bounds, value)] += 1
+        s[1] += value
+        s[2] += 1
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, (counts, total, n) in self.series.items():
+            cumulative = 0
+            for bound, c in zip(self.bounds + (float("inf"),), counts):
+                cumulative += c
+                le = f'le="{_fmt_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.labelnames, key)} {_fmt_value(total)}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.labelnames, key)} {n}")
+        return lines
+
+
+# =========================
+# 메트릭 정의
+# =========================
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status")
+)
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being served", ("group",))
+STAGE_DURATION = Histogram(
+    "stage_duration_seconds", "Latency of handler stages", ("handler", "stage")
+)
+OPENAI_REQUEST_DURATION = Histogram(
+    "openai_request_duration_seconds", "OpenAI API call latency", ("kind", "model", "tier", "outcome"), LLM_BUCKETS
+)
+OPENAI_TOKENS = Counter("openai_tokens_total", "OpenAI token usage", ("model", "tier", "type"))
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups by result", ("cache", "result"))
+OPENAI_IN_FLIGHT = Gauge("openai_requests_in_flight", "OpenAI API calls currently awaiting a response", ("kind",))
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds", "Delay between scheduled and actual event loop wake-ups",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+EVENT_LOOP_LAG_LAST = Gauge("event_loop_lag_last_seconds", "Most recent event loop lag sample")
+
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for m in _REGISTRY:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+
+# =========================
+# 헬퍼
+# =========================
+# 요청 단위 구간 기록 (diagnostics.ServerTimingMiddleware가 요청마다 리스트를 설정)
+request_spans: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar(
+    "request_spans", default=None
+)
+
+
+@contextmanager
+def stage_timer(handler: str, stage: str):
+    # with stage_timer("analyze_document", "llm_call"): ...
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_DURATION.observe(elapsed, handler=handler, stage=stage)
+        spans = request_spans.get()
+        if spans is not None:
+            spans.append((stage, elapsed))
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def record_openai_call(kind: str, model: str, tier: str, latency_sec: float, usage=None, error: bool = False) -> None:
+    OPENAI_REQUEST_DURATION.observe(latency_sec, kind=kind, model=model, tier=tier, outcome="error" if error else "ok")
+    if usage is not None:
+        OPENAI_TOKENS.inc(getattr(usage, "prompt_tokens", 0) or 0, model=model, tier=tier, type="prompt")
+        OPENAI_TOKENS.inc(getattr(usage, "completion_tokens", 0) or 0, model=model, tier=tier, type="completion")
+
+
+async def monitor_event_loop_lag(interval: float = 0.5) -> None:
+    # interval 만큼 잠들었다가 실제로 깨어난 시점과의 차이를 측정
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag = max(0.0, time.perf_counter() - started - interval)
+        EVENT_LOOP_LAG.observe(lag)
+        EVENT_LOOP_LAG_LAST.set(lag)
+
+
+class MetricsMiddleware:
+    # 순수 ASGI 미들웨어 (BaseHTTPMiddleware보다 오버헤드가 작고 스트리밍 응답을 버퍼링하지 않음)
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_holder = {"status": 500}
+        is_static = scope["path"].startswith("/static/")
+        group = "static" if is_static else "api"
+        HTTP_IN_FLIGHT.inc(group=group)
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                status_holder["status"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            HTTP_IN_FLIGHT.dec(group=group)
+            # 경로 파라미터가 치환되지 않은 라우트 템플릿을 라벨로 사용 (카디널리티 제한)
+            route_path: Optional[str] = getattr(scope.get("route"), "path", None)
+            if route_path is None:
+                route_path = "/static" if is_static else "unmatched"
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - started,
+                method=scope.get("method", ""),
+                route=route_path,
+                status=str(status_holder["status"]),
+            )
@@ -2,6 +2,9 @@
 import json
 from typing import Dict, Any, Optional, List, Tuple
 
+from job_data import DOC_SECTION_KEYS, DOC_SECTION_LABELS
+from text_diff import diff_sections, format_section_diffs, condense_feedback
+
 # ------------------------------------------------------------
 # 기업 분석 프롬프트 (원본 유지)
 # ------------------------------------------------------------
@@ -23,6 +26,26 @@ def get_company_analysis_prompt(company_name: str) -> Tuple[str, str]:
     return system_instruction, user_prompt
 
 
+# ------------------------------------------------------------
+# 포트폴리오 구간 요약 프롬프트 (map 단계, 직무와 무관하게 사실만 정리 → 캐시 재사용)
+# ------------------------------------------------------------
+def get_portfolio_chunk_prompt(chunk_text: str, first_page: int, last_page: int, total_pages: int) -> Tuple[str, str]:
+    system_instruction = """
+당신은 포트폴리오 문서를 구간별로 정리하는 AI입니다. 전체 문서 중 일부 구간만 주어집니다.
+- 모든 응답은 반드시 한국어로 작성합니다.
+- 반환은 아래 JSON 스키마를 정확히 따릅니다. 그 외 텍스트/마크다운/설명은 금지합니다.
+- 구간에 있는 사실(프로젝트명, 기간, 역할, 사용 기술, 수치화된 성과)만 정리하고, 없는 내용은 추측하지 않습니다.
+
+반환 JSON 스키마:
+{
+  "chunk_summary": "string"   // 이 구간의 핵심 내용 (3~6줄)
+}
+"""
+    pages = f"{first_page}" if first_page == last_page else f"{first_page}~{last_page}"
+    user_prompt = f"[포트폴리오 {pages}페이지 / 전체 {total_pages}페이지]\n{chunk_text}"
+    return system_instruction, user_prompt
+
+
 # ------------------------------------------------------------
 # 문서 분석 프롬프트 (자기소개서 강화, 스키마/시그니처 불변)
 # ------------------------------------------------------------
@@ -36,7 +59,10 @@ def get_document_analysis_prompt(
     additional_user_context: Optional[str] = None,
     company_name: Optional[str] = None,
     company_analysis: Optional[Dict[str, Any]] = None,
+    target_sections: Optional[List[str]] = None,
+    reused_feedbacks: Optional[Dict[str, str]] = None,
 ) -> Tuple[str, str]:
+    # target_sections가 주어지면 해당 섹션만 재분석하고, 나머지는 reused_feedbacks(기존 피드백)를 요약해 문맥으로만 제공
 
     # ---------------- System: 규칙 강화 (스키마는 불변) ----------------
     system_instruction = f"""
@@ -101,6 +127,12 @@ def get_document_analysis_prompt(
     if job_competencies:
         parts.append(f"직무 핵심역량: {', '.join(job_competencies)}")
 
+    def _is_reused(key: str) -> bool:
+        return target_sections is not None and key not in target_sections
+
+    def _reused_line(key: str) -> str:
+        return f"(변경 없음 · 기존 피드백 요약: {condense_feedback((reused_feedbacks or {}).get(key), max_chars=120)})"
+
     # 현재 문서 내용
     parts.append("\n--- 현재 문서 내용 ---")
     if doc_type == "resume":
@@ -110,17 +142,29 @@ def get_document_analysis_prompt(
         certs = document_content.get("certificates", [])
 
         lines = ["■ 학력"]
-        for e in edu:
-            lines.append(f"- 학력:{e.get('level','')}, 상태:{e.get('status','')}, 학교:{e.get('school','')}, 전공:{e.get('major','')}")
+        if _is_reused("education"):
+            lines.append(_reused_line("education"))
+        else:
+            for e in edu:
+                lines.append(f"- 학력:{e.get('level','')}, 상태:{e.get('status','')}, 학교:{e.get('school','')}, 전공:{e.get('major','')}")
         lines.append("\n■ 대외활동")
-        for a in acts:
-            lines.append(f"- 제목:{a.get('title','')}, 내용:{a.get('content','')}")
+        if _is_reused("activities"):
+            lines.append(_reused_line("activities"))
+        else:
+            for a in acts:
+                lines.append(f"- 제목:{a.get('title','')}, 내용:{a.get('content','')}")
         lines.append("\n■ 수상경력")
-        for w in awds:
-            lines.append(f"- 제목:{w.get('title','')}, 내용:{w.get('content','')}")
+        if _is_reused("awards"):
+            lines.append(_reused_line("awards"))
+        else:
+            for w in awds:
+                lines.append(f"- 제목:{w.get('title','')}, 내용:{w.get('content','')}")
         lines.append("\n■ 자격증")
-        for c in certs:
-            lines.append(f"- {c}")
+        if _is_reused("certificates"):
+            lines.append(_reused_line("certificates"))
+        else:
+            for c in certs:
+                lines.append(f"- {c}")
         parts.append("\n".join(lines) if any([edu, acts, awds, certs]) else "이력서 항목이 거의 비어 있습니다.")
 
     elif doc_type == "cover_letter":
@@ -132,7 +176,10 @@ def get_document_analysis_prompt(
             ("growth_process", "성장 과정"),
         ]
         for k, label in qmap:
-            parts.append(f"- {label}: {document_content.get(k,'').strip() or '작성되지 않음'}")
+            if _is_reused(k):
+                parts.append(f"- {label}: {_reused_line(k)}")
+            else:
+                parts.append(f"- {label}: {document_content.get(k,'').strip() or '작성되지 않음'}")
 
         # 회사명 일치성 체크 가이드
         if company_name:
@@ -145,7 +192,16 @@ def get_document_analysis_prompt(
         extracted = document_content.get("extracted_text", "")
         if not extracted:
             return system_instruction, "오류: 추출된 텍스트가 제공되지 않았습니다."
-        parts.append(f"[포트폴리오 텍스트 일부]\n{extracted[:2000]}...")
+        chunk_summaries = document_content.get("chunk_summaries")
+        if chunk_summaries:
+            # 긴 포트폴리오: 구간별 요약(map)을 모아 문서 전체를 평가(reduce)
+            parts.append(
+                "[포트폴리오 구간별 요약 (문서 전체)]\n"
+                + "\n".join(f"- p.{c.get('pages', '?')}: {c.get('summary', '')}" for c in chunk_summaries)
+                + "\n- 위 구간 요약을 모두 종합해 문서 전체 기준으로 summary/overall_feedback을 작성."
+            )
+        else:
+            parts.append(f"[포트폴리오 텍스트]\n{extracted}")
 
     elif doc_type == "portfolio_summary_url":
         url = document_content.get("portfolio_url", "")
@@ -159,47 +215,37 @@ def get_document_analysis_prompt(
     else:
         return system_instruction, f"오류: 알 수 없는 문서 타입 '{doc_type}'입니다."
 
-    # 이전 버전 비교 컨텍스트
-    def _fmt_prev(d: Dict[str, Any]) -> str:
-        c = d.get("content", {}) or {}
-        if doc_type == "resume":
-            keep = {
-                "education": c.get("education", []),
-                "activities": c.get("activities", []),
-                "awards": c.get("awards", []),
-                "certificates": c.get("certificates", []),
-            }
-            return json.dumps(keep, ensure_ascii=False, indent=2)
-        elif doc_type == "cover_letter":
-            keep = {k: c.get(k, "") for k in [
-                "reason_for_application", "expertise_experience", "collaboration_experience",
-                "challenging_goal_experience", "growth_process"
-            ]}
-            return json.dumps(keep, ensure_ascii=False, indent=2)
-        else:
-            return json.dumps(c, ensure_ascii=False, indent=2)
+    # 이전 버전 비교 컨텍스트 (전체 JSON 대신 섹션별 diff + 압축 피드백)
+    def _fmt_changes(old: Dict[str, Any], new_content: Dict[str, Any], max_ops: int) -> str:
+        if doc_type in DOC_SECTION_KEYS:
+            diffs = diff_sections(doc_type, old.get("content", {}) or {}, new_content)
+            return format_section_diffs(doc_type, diffs, max_ops_per_section=max_ops)
+        # 포트폴리오 계열은 섹션 구조가 없으므로 이전 요약만 짧게 전달
+        c = old.get("content", {}) or {}
+        return f"이전 요약: {condense_feedback(c.get('summary') or c, max_chars=400)}"
 
     added_change_guide = False
     if previous_document_data:
         parts.append(
-            f"\n--- 관련 이전 버전 (v{previous_document_data.get('version','?')}) ---\n"
-            f"{_fmt_prev(previous_document_data)}\n"
-            f"그 당시 피드백: {previous_document_data.get('feedback','(없음)')}\n"
+            f"\n--- 이전 버전 (v{previous_document_data.get('version','?')}) → 현재 변경 사항 ---\n"
+            f"{_fmt_changes(previous_document_data, document_content, max_ops=8)}\n"
+            f"그 당시 피드백(요약): {condense_feedback(previous_document_data.get('feedback'))}\n"
         )
         added_change_guide = True
 
     if older_document_data:
+        older_to_prev = (previous_document_data or {}).get("content", {}) or document_content
         parts.append(
-            f"\n--- 그 다음 이전 버전 (v{older_document_data.get('version','?')}) ---\n"
-            f"{_fmt_prev(older_document_data)}\n"
-            f"그 당시 피드백: {older_document_data.get('feedback','(없음)')}\n"
+            f"\n--- 그 전 버전 (v{older_document_data.get('version','?')}) → 이전 버전 변경 사항 ---\n"
+            f"{_fmt_changes(older_document_data, older_to_prev, max_ops=3)}\n"
+            f"그 당시 피드백(요약): {condense_feedback(older_document_data.get('feedback'), max_chars=150)}\n"
         )
         added_change_guide = True
 
     if added_change_guide:
         parts.append(
             "\n[비교 지침]\n"
-            "- 반드시 '이전 대비 변화(추가/수정/삭제)'를 명확히 지적.\n"
+            "- 위 변경 사항(+ 추가, - 삭제, ~ 수정)을 근거로 '이전 대비 변화'를 명확히 지적.\n"
             "- 내용이 늘어도 구체성/직무적합성/논리성 저하 시 '질 하락'으로 판단하고 보완안을 제시.\n"
         )
 
@@ -235,4 +281,21 @@ def get_document_analysis_prompt(
             "- individual_feedbacks는 비워도 무방.\n"
         )
 
+    # ----------- 섹션 단위 부분 재분석 -----------
+    if target_sections is not None and doc_type in DOC_SECTION_KEYS:
+        labels = DOC_SECTION_LABELS.get(doc_type, {})
+        if target_sections:
+            parts.append(
+                "\n[부분 재분석]\n"
+                f"- 이번에는 변경된 섹션만 다시 평가합니다: {', '.join(labels.get(k, k) for k in target_sections)}\n"
+                f"- individual_feedbacks에는 {', '.join(repr(k) for k in target_sections)} 키만 포함(다른 키 금지).\n"
+                "- summary/overall_feedback은 변경 없는 섹션의 기존 피드백까지 종합해 문서 전체 기준으로 다시 작성.\n"
+            )
+        else:
+            parts.append(
+                "\n[부분 재분석]\n"
+                "- 섹션 내용 변경이 없습니다. individual_feedbacks는 빈 객체({})로 두고, "
+                "summary/overall_feedback만 기존 피드백을 종합해 다시 작성.\n"
+            )
+
     return system_instruction, "\n".join(parts)
@@ -0,0 +1,234 @@
+# ratelimit.py
+# OpenAI 호출 앞단의 토큰 버킷 + 공정 큐 스케줄러.
+#  - 사용자별 버킷(요청 수/추정 토큰)을 넘으면 즉시 429 + Retry-After
+#  - 전역 버킷(공급자 한도)이 비면 사용자별 큐에 대기, 사용자 간 라운드로빈으로 배분
+#  - 대기 예상이 길거나 사용자 큐가 가득 차면 역시 429로 조기 거절
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+
+from metrics import Counter, Gauge
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") not in ("0", "false", "False")
+LLM_GLOBAL_RPM = float(os.getenv("LLM_GLOBAL_RPM", "500"))
+LLM_GLOBAL_TPM = float(os.getenv("LLM_GLOBAL_TPM", "300000"))
+LLM_USER_RPM = float(os.getenv("LLM_USER_RPM", "20"))
+LLM_USER_TPM = float(os.getenv("LLM_USER_TPM", "60000"))
+LLM_QUEUE_MAX_WAIT_SEC = float(os.getenv("LLM_QUEUE_MAX_WAIT_SEC", "20"))
+LLM_USER_MAX_QUEUED = int(os.getenv("LLM_USER_MAX_QUEUED", "4"))
+# 이 주기마다 가득 찬(=새로 만든 것과 같은) 사용자 버킷을 정리해 사용자 수만큼 메모리가 늘지 않게 함
+LLM_USER_BUCKET_SWEEP_SEC = float(os.getenv("LLM_USER_BUCKET_SWEEP_SEC", "60"))
+
+RATE_LIMIT_REJECTIONS = Counter("rate_limit_rejections_total", "Requests rejected by the LLM scheduler", ("reason",))
+LLM_QUEUE_DEPTH = Gauge("llm_queue_depth", "Requests waiting for global LLM capacity")
+
+
+def estimate_tokens(text: str) -> int:
+    # 한국어 위주 텍스트는 대략 2글자 ≈ 1토큰
+    return len(text or "") // 2 + 1
+
+
+class TokenBucket:
+    """capacity 만큼 모였다가 분당 per_minute 속도로 다시 차는 버킷."""
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        # amount 를 꺼낼 수 있을 때까지 남은 시간(초). 0이면 즉시 가능
+        self._refill(time.monotonic())
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate if self.rate > 0 else math.inf
+
+    def take(self, amount: float) -> None:
+        self._refill(time.monotonic())
+        self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount: float) -> None:
+        self._refill(time.monotonic())
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+def _reject(reason: str, retry_after: float) -> HTTPException:
+    RATE_LIMIT_REJECTIONS.inc(reason=reason)
+    return HTTPException(
+        status_code=429,
+        detail="요청이 너무 많습니다. 잠시 후 다시 시도해주세요.",
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+class _Slot:
+    def __init__(self, user_id: str, tokens: int):
+        self.user_id = user_id
+        self.reserved_tokens = tokens
+        self.actual_tokens: Optional[int] = None  # 호출 후 실제 사용량을 기록하면 차액을 환불
+
+
+class LLMScheduler:
+    def __init__(self):
+        self.global_requests = TokenBucket(LLM_GLOBAL_RPM)
+        self.global_tokens = TokenBucket(LLM_GLOBAL_TPM)
+        self.user_buckets: Dict[str, Tuple[TokenBucket, TokenBucket]] = {}
+        self.queues: Dict[str, Deque[Tuple[int, asyncio.Future]]] = {}
+        self.round_robin: Deque[str] = deque()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._last_sweep = time.monotonic()
+
+    # ---- 사용자 버킷 ----
+    def _user(self, user_id: str) -> Tuple[TokenBucket, TokenBucket]:
+        b = self.user_buckets.get(user_id)
+        if b is None:
+            self._sweep_idle_users()
+            b = self.user_buckets[user_id] = (TokenBucket(LLM_USER_RPM), TokenBucket(LLM_USER_TPM))
+        return b
+
+    def _sweep_idle_users(self) -> None:
+        # 다 찬 버킷은 새로 만든 버킷과 같으므로 지워도 한도 계산이 달라지지 않음
+        now = time.monotonic()
+        if now - self._last_sweep < LLM_USER_BUCKET_SWEEP_SEC:
+            return
+        self._last_sweep = now
+        idle = [
+            uid for uid, (req, tok) in self.user_buckets.items()
+            if uid not in self.queues and req.is_full(now) and tok.is_full(now)
+        ]
+        for uid in idle:
+            del self.user_buckets[uid]
+
+    def precheck(self, user_id: Optional[str]) -> None:
+        """요청 처리 전에 사용자 요청 한도를 확인 (남은 작업을 하기 전에 조기 거절)."""
+        if not RATE_LIMIT_ENABLED or not user_id:
+            return
+        wait = self._user(user_id)[0].wait_time(1)
+        if wait > 0:
+            raise _reject("user_requests", wait)
+
+    # ---- 전역 용량 ----
+    def _global_wait(self, tokens: int) -> float:
+        return max(self.global_requests.wait_time(1), self.global_tokens.wait_time(tokens))
+
+    def _take_global(self, tokens: int) -> None:
+        self.global_requests.take(1)
+        self.global_tokens.take(tokens)
+
+    def _queued_count(self) -> int:
+        return sum(len(q) for q in self.queues.values())
+
+    def _ensure_dispatcher(self) -> None:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def _dispatch(self) -> None:
+        # 대기 중인 사용자들을 라운드로빈으로 돌며 전역 용량이 허락하는 만큼 배분
+        while True:
+            if not self.round_robin:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            user_id = self.round_robin[0]
+            q = self.queues.get(user_id)
+            while q and q[0][1].done():  # 타임아웃/취소된 대기자 정리
+                q.popleft()
+            if not q:
+                self.round_robin.popleft()
+                self.queues.pop(user_id, None)
+                continue
+            tokens, fut = q[0]
+            wait = self._global_wait(tokens)
+            if wait > 0:
+                await asyncio.sleep(min(wait, 1.0))
+                continue
+            q.popleft()
+            self._take_global(tokens)
+            fut.set_result(None)
+            self.round_robin.rotate(-1)
+            LLM_QUEUE_DEPTH.set(self._queued_count())
+
+    @asynccontextmanager
+    async def slot(self, user_id: Optional[str], tokens: int, requests: int = 1):
+        """async with llm_scheduler.slot(user_id, 추정토큰) as s: ... s.actual_tokens = usage.total_tokens
+
+        requests: 사용자 요청 한도에서 차감할 수. 한 요청을 여러 호출로 나누는 경우(포트폴리오 구간 요약) 0
+        """
+        slot = _Slot(user_id or "anonymous", tokens)
+        if not RATE_LIMIT_ENABLED:
+            yield slot
+            return
+
+        req_bucket, tok_bucket = self._user(slot.user_id)
+        user_wait = max(req_bucket.wait_time(requests) if requests else 0.0, tok_bucket.wait_time(tokens))
+        if user_wait > 0:
+            raise _reject("user_quota", user_wait)
+        req_bucket.take(requests)
+        tok_bucket.take(tokens)
+
+        try:
+            if not self.round_robin and self._global_wait(tokens) == 0:
+                self._take_global(tokens)
+            else:
+                q = self.queues.setdefault(slot.user_id, deque())
+                if len(q) >= LLM_USER_MAX_QUEUED:
+                    raise _reject("user_queue_full", self._global_wait(tokens) or 1)
+                estimated = self._global_wait(tokens) + self._queued_count() * 60.0 / max(LLM_GLOBAL_RPM, 1)
+                if estimated > LLM_QUEUE_MAX_WAIT_SEC:
+                    raise _reject("global_backlog", estimated)
+                fut = asyncio.get_running_loop().create_future()
+                q.append((tokens, fut))
+                if slot.user_id not in self.round_robin:
+                    self.round_robin.append(slot.user_id)
+                LLM_QUEUE_DEPTH.set(self._queued_count())
+                self._ensure_dispatcher()
+                self._wakeup.set()
+                try:
+                    await asyncio.wait_for(asyncio.shield(fut), timeout=LLM_QUEUE_MAX_WAIT_SEC)
+                except asyncio.TimeoutError:
+                    # 타임아웃 직전에 배분됐다면 그대로 진행
+                    if fut.cancel():
+                        raise _reject("queue_timeout", LLM_QUEUE_MAX_WAIT_SEC)
+                except asyncio.CancelledError:
+                    # 클라이언트 연결 종료 등으로 취소되면 대기열에서 빠지고, 이미 받은 전역 용량은 반납
+                    if not fut.cancel():
+                        self.global_requests.refund(1)
+                        self.global_tokens.refund(tokens)
+                    req_bucket.refund(requests)
+                    tok_bucket.refund(tokens)
+                    raise
+        except HTTPException:
+            req_bucket.refund(requests)
+            tok_bucket.refund(tokens)
+            raise
+
+        try:
+            yield slot
+        finally:
+            # 실제 사용량이 추정보다 적으면 차액 환불 (max_tokens까지 잡아둔 예약분 회수)
+            if slot.actual_tokens is not None and slot.actual_tokens < tokens:
+                diff = tokens - slot.actual_tokens
+                tok_bucket.refund(diff)
+                self.global_tokens.refund(diff)
+
+
+llm_scheduler = LLMScheduler()
@@ -0,0 +1,291 @@
+# resilience.py
+# OpenAI 호출의 꼬리 지연 제어: 요청 예산, 재시도, 헤징, 서킷 브레이커.
+#  - RequestBudgetMiddleware: 요청마다 마감 시각(REQUEST_BUDGET_SEC)을 contextvar에 기록
+#    → 호출별 타임아웃 = min(호출 자체 타임아웃, 남은 예산). 예산이 바닥나면 더 시도하지 않음
+#  - 재시도: 타임아웃/연결 오류/429/5xx만, full jitter 지수 백오프 (429의 Retry-After가 더 길면 따름)
+#  - 헤징(OPENAI_HEDGE_ENABLED): 응답이 최근 p95보다 늦으면 같은 요청을 하나 더 보내 먼저 온 결과 사용
+#  - 서킷 브레이커: 이름(호출 종류:모델)별로 연속 실패 CIRCUIT_FAILURE_THRESHOLD회면 open
+#    → CIRCUIT_OPEN_SEC 동안 즉시 CircuitOpenError, 이후 한 건만 시험(half-open)
+#  - 열려 있을 때의 대체(캐시/하위 티어/로컬 임베딩)는 호출하는 쪽(utils)에서 결정
+#
+#  bench/fake_openai.py로 재현: POST /_config {"chat_latency": "fixed:30"} 또는 {"error_rate": 1}
+import asyncio
+import contextvars
+import math
+import os
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+from fastapi import HTTPException
+
+from metrics import Counter, Gauge
+
+REQUEST_BUDGET_SEC = float(os.getenv("REQUEST_BUDGET_SEC", "120"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+OPENAI_BACKOFF_BASE_SEC = float(os.getenv("OPENAI_BACKOFF_BASE_SEC", "0.5"))
+OPENAI_BACKOFF_MAX_SEC = float(os.getenv("OPENAI_BACKOFF_MAX_SEC", "8"))
+OPENAI_MIN_ATTEMPT_SEC = float(os.getenv("OPENAI_MIN_ATTEMPT_SEC", "2"))  # 남은 예산이 이보다 적으면 시도하지 않음
+# 헤징은 느린 5% 요청의 토큰을 두 번 쓰므로 기본은 꺼 둠
+OPENAI_HEDGE_ENABLED = os.getenv("OPENAI_HEDGE_ENABLED", "0") not in ("0", "false", "False")
+OPENAI_HEDGE_MIN_DELAY_SEC = float(os.getenv("OPENAI_HEDGE_MIN_DELAY_SEC", "1"))
+OPENAI_HEDGE_MIN_SAMPLES = 20  # p95를 믿을 수 있을 만큼 모이기 전에는 헤징하지 않음
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_OPEN_SEC = float(os.getenv("CIRCUIT_OPEN_SEC", "30"))
+
+OPENAI_RETRIES = Counter("openai_retries_total", "OpenAI call attempts retried after a transient error", ("name",))
+OPENAI_HEDGES = Counter("openai_hedges_total", "Hedged duplicate OpenAI requests", ("name", "outcome"))
+OPENAI_BUDGET_EXHAUSTED = Counter("openai_budget_exhausted_total", "OpenAI calls skipped because the request budget ran out", ("name",))
+CIRCUIT_STATE = Gauge("circuit_breaker_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)", ("name",))
+CIRCUIT_REJECTIONS = Counter("circuit_breaker_rejections_total", "Calls failed fast by an open circuit breaker", ("name",))
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"circuit '{name}' is open")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class BudgetExhaustedError(Exception):
+    def __init__(self, name: str):
+        super().__init__(f"request budget exhausted before calling '{name}'")
+        self.name = name
+        self.retry_after = 1.0
+
+
+def unavailable(exc: Exception) -> HTTPException:
+    """CircuitOpenError/BudgetExhaustedError → 503 + Retry-After."""
+    retry_after = getattr(exc, "retry_after", 1.0)
+    return HTTPException(
+        status_code=503,
+        detail="AI 서비스 응답이 지연되고 있습니다. 잠시 후 다시 시도해주세요.",
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+# =========================
+# 요청 예산
+# =========================
+class RequestBudgetMiddleware:
+    # 순수 ASGI 미들웨어. 이 요청에서 시작한 OpenAI 호출(gather 하위 태스크 포함)이 같은 마감 시각을 공유
+    def __init__(self, app, budget_sec: float = REQUEST_BUDGET_SEC):
+        self.app = app
+        self.budget_sec = budget_sec
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.budget_sec <= 0:
+            await self.app(scope, receive, send)
+            return
+        token = _deadline.set(time.monotonic() + self.budget_sec)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _deadline.reset(token)
+
+
+def remaining_budget() -> float:
+    deadline = _deadline.get()
+    return math.inf if deadline is None else deadline - time.monotonic()
+
+
+# =========================
+# 서킷 브레이커
+# =========================
+class CircuitBreaker:
+    CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+
+    def __init__(self, name: str, threshold: int = CIRCUIT_FAILURE_THRESHOLD, open_sec: float = CIRCUIT_OPEN_SEC):
+        self.name = name
+        self.threshold = threshold
+        self.open_sec = open_sec
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        CIRCUIT_STATE.set(self.CLOSED, name=name)
+
+    def _set(self, state: int) -> None:
+        if state != self.state:
+            print(f"[circuit] {self.name}: {('closed', 'half-open', 'open')[self.state]} → {('closed', 'half-open', 'open')[state]}")
+        self.state = state
+        CIRCUIT_STATE.set(state, name=self.name)
+
+    def before_call(self) -> None:
+        # 통과하지 못하면 CircuitOpenError
+        if self.state == self.OPEN:
+            wait = self.opened_at + self.open_sec - time.monotonic()
+            if wait > 0:
+                CIRCUIT_REJECTIONS.inc(name=self.name)
+                raise CircuitOpenError(self.name, wait)
+            self._set(self.HALF_OPEN)
+        if self.state == self.HALF_OPEN:
+            if self.probing:
+                CIRCUIT_REJECTIONS.inc(name=self.name)
+                raise CircuitOpenError(self.name, 1.0)
+            self.probing = True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.probing = False
+        self._set(self.CLOSED)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self.probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+            self._set(self.OPEN)
+
+    def release(self) -> None:
+        # 성공/실패로 판정하지 않은 시험 호출(400 등)이 끝났을 때
+        self.probing = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "state": ("closed", "half-open", "open")[self.state],
+            "failures": self.failures,
+            "retry_after": max(0.0, self.opened_at + self.open_sec - time.monotonic()) if self.state == self.OPEN else 0.0,
+        }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_latencies: Dict[str, Deque[float]] = {}
+
+
+def breaker(name: str) -> CircuitBreaker:
+    b = _breakers.get(name)
+    if b is None:
+        b = _breakers[name] = CircuitBreaker(name)
+    return b
+
+
+def circuit_open(name: str) -> bool:
+    b = _breakers.get(name)
+    return b is not None and b.state == CircuitBreaker.OPEN and b.opened_at + b.open_sec > time.monotonic()
+
+
+def raise_if_open(name: str) -> None:
+    # 스케줄러 슬롯(사용자 토큰)을 잡기 전에 빠르게 실패
+    b = _breakers.get(name)
+    if b is not None and circuit_open(name):
+        CIRCUIT_REJECTIONS.inc(name=name)
+        raise CircuitOpenError(name, b.opened_at + b.open_sec - time.monotonic())
+
+
+def resilience_stats() -> Dict[str, Any]:
+    out = {}
+    for name, b in _breakers.items():
+        lat = sorted(_latencies.get(name, ()))
+        out[name] = {**b.snapshot(), "p95_latency_sec": lat[min(len(lat) - 1, int(len(lat) * 0.95))] if lat else None}
+    return out
+
+
+# =========================
+# 호출
+# =========================
+def _is_transient(exc: BaseException) -> bool:
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    status = getattr(exc, "status_code", None)
+    if isinstance(status, int):
+        return status in (408, 409, 429) or status >= 500
+    try:
+        import openai
+    except ImportError:
+        return False
+    return isinstance(exc, openai.APIConnectionError)  # APITimeoutError 포함
+
+
+def _retry_after(exc: BaseException) -> float:
+    response = getattr(exc, "response", None)
+    try:
+        return float(response.headers.get("retry-after") or 0) if response is not None else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _hedge_delay(name: str) -> Optional[float]:
+    if not OPENAI_HEDGE_ENABLED:
+        return None
+    lat = _latencies.get(name)
+    if not lat or len(lat) < OPENAI_HEDGE_MIN_SAMPLES:
+        return None
+    ordered = sorted(lat)
+    return max(OPENAI_HEDGE_MIN_DELAY_SEC, ordered[int(len(ordered) * 0.95)])
+
+
+async def _attempt(name: str, fn: Callable[[float], Awaitable[Any]], timeout: float) -> Any:
+    hedge_after = _hedge_delay(name)
+    if hedge_after is None or hedge_after >= timeout:
+        return await asyncio.wait_for(fn(timeout), timeout)
+
+    primary = asyncio.ensure_future(asyncio.wait_for(fn(timeout), timeout))
+    done, _ = await asyncio.wait({primary}, timeout=hedge_after)
+    if done:
+        return primary.result()
+    # p95를 넘김 → 같은 요청을 하나 더 (남은 시간 안에서), 먼저 성공한 쪽 사용
+    OPENAI_HEDGES.inc(name=name, outcome="launched")
+    hedge_timeout = timeout - hedge_after
+    hedge = asyncio.ensure_future(asyncio.wait_for(fn(hedge_timeout), hedge_timeout))
+    pending = {primary, hedge}
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is hedge:
+                        OPENAI_HEDGES.inc(name=name, outcome="won")
+                    return task.result()
+                error = error or task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def call_openai(name: str, fn: Callable[[float], Awaitable[Any]], timeout: float) -> Any:
+    """fn(timeout)을 예산/재시도/헤징/브레이커 아래에서 실행. name은 "chat:gpt-4o" 같은 브레이커 단위.
+
+    CircuitOpenError: 브레이커가 열려 있음, BudgetExhaustedError: 요청 예산 소진.
+    그 밖에는 마지막 시도의 예외를 그대로 올림.
+    """
+    b = breaker(name)
+    attempt = 0
+    while True:
+        b.before_call()
+        per_call = min(timeout, remaining_budget())
+        if per_call < OPENAI_MIN_ATTEMPT_SEC:
+            b.release()
+            OPENAI_BUDGET_EXHAUSTED.inc(name=name)
+            raise BudgetExhaustedError(name)
+        started = time.monotonic()
+        try:
+            result = await _attempt(name, fn, per_call)
+        except asyncio.CancelledError:
+            b.release()
+            raise
+        except Exception as e:
+            if not _is_transient(e):
+                b.release()
+                raise
+            b.record_failure()
+            attempt += 1
+            if attempt > OPENAI_MAX_RETRIES or b.state == CircuitBreaker.OPEN:
+                raise
+            # full jitter: 0 ~ min(최대, 기본 × 2^n)
+            delay = max(random.uniform(0, min(OPENAI_BACKOFF_MAX_SEC, OPENAI_BACKOFF_BASE_SEC * 2 ** attempt)), _retry_after(e))
+            if delay + OPENAI_MIN_ATTEMPT_SEC > remaining_budget():
+                OPENAI_BUDGET_EXHAUSTED.inc(name=name)
+                raise BudgetExhaustedError(name) from e
+            OPENAI_RETRIES.inc(name=name)
+            print(f"[resilience] {name}: {type(e).__name__} ({e}); retry {attempt}/{OPENAI_MAX_RETRIES} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+            continue
+        b.record_success()
+        _latencies.setdefault(name, deque(maxlen=200)).append(time.monotonic() - started)
+        return result
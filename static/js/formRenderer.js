@@ -98,15 +98,13 @@ function isEmptyResumeContent(content = {}) {
 
 // 304/캐시 이슈 방지 + 폴백 포함 안전 호출
 async function fetchUserProfileSafe() {
+  // cache: "no-cache" → 브라우저가 매번 ETag(If-None-Match)로 재검증.
+  // 변경이 없으면 서버가 본문 없이 304를 주고 fetch는 캐시 본문을 200으로 돌려줌
   const baseOpts = {
     method: "GET",
     credentials: IS_LOCAL ? "include" : "same-origin",
-    headers: authHeaders({
-      Accept: "application/json",
-      "Cache-Control": "no-cache",
-      Pragma: "no-cache",
-    }),
-    cache: "no-store",
+    headers: authHeaders({ Accept: "application/json" }),
+    cache: "no-cache",
   };
 
   const tryFetch = async (url) => {
@@ -114,10 +112,9 @@ async function fetchUserProfileSafe() {
     let res = await fetch(url, baseOpts);
     console.log("🛰️ [프로필 응답] status:", res.status);
 
-    // 일부 서버/프록시가 304를 돌리는 경우 캐시버스터로 1회 재시도
+    // 브라우저 캐시에 본문이 없는데 304가 온 경우(프록시 등)만 캐시를 건너뛰고 1회 재요청
     if (res.status === 304) {
-      const bust = url.includes("?") ? "&" : "?";
-      res = await fetch(`${url}${bust}_=${Date.now()}`, baseOpts);
+      res = await fetch(url, { ...baseOpts, cache: "reload" });
       console.log("🛰️ [304 재시도] status:", res.status);
     }
 
@@ -19,6 +19,7 @@ import { renderFormFields } from "./formRenderer.js";
 ---------------------------------------- */
 const ROOT_PREFIX = window.location.pathname.startsWith("/text") ? "/text" : "";
 const API_BASE = `${ROOT_PREFIX}/apiText`;
+const MAX_PORTFOLIO_PDF_BYTES = 10 * 1024 * 1024; // uploads.py PORTFOLIO_MAX_UPLOAD_MB
 
 function apiFetch(url, options = {}) {
   const token = localStorage.getItem("token");
@@ -30,6 +31,52 @@ function apiFetch(url, options = {}) {
   return fetch(url, { ...options, headers });
 }
 
+/* ---------------------------------------
+   idempotency: 같은 제출(더블 클릭/재시도)은 같은 Idempotency-Key
+   서버는 처리 중인 같은 요청에 합류하거나 끝난 결과를 재생 (idempotency.py)
+---------------------------------------- */
+const pendingSubmissionKeys = new Map(); // 요청 내용 → Idempotency-Key
+const RETRYABLE_STATUS = new Set([502, 503, 504]);
+const MAX_SUBMIT_RETRIES = 2;
+
+function newIdempotencyKey() {
+  if (window.crypto?.randomUUID) return window.crypto.randomUUID();
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
+
+function retryDelayMs(response, attempt) {
+  const retryAfter = Number(response?.headers.get("Retry-After"));
+  if (retryAfter > 0) return Math.min(retryAfter, 10) * 1000;
+  return Math.random() * 1000 * 2 ** attempt; // full jitter
+}
+
+// 네트워크 오류/502·503·504는 같은 키로 재시도 (서버가 중복 실행하지 않음)
+async function apiFetchIdempotent(url, options, fingerprint) {
+  let key = pendingSubmissionKeys.get(fingerprint);
+  if (!key) {
+    key = newIdempotencyKey();
+    pendingSubmissionKeys.set(fingerprint, key);
+  }
+  const headers = new Headers(options.headers || {});
+  headers.set("Idempotency-Key", key);
+  try {
+    for (let attempt = 0; ; attempt++) {
+      let response = null;
+      try {
+        response = await apiFetch(url, { ...options, headers });
+        if (!RETRYABLE_STATUS.has(response.status) || attempt >= MAX_SUBMIT_RETRIES) {
+          return response;
+        }
+      } catch (err) {
+        if (attempt >= MAX_SUBMIT_RETRIES) throw err;
+      }
+      await new Promise((r) => setTimeout(r, retryDelayMs(response, attempt)));
+    }
+  } finally {
+    pendingSubmissionKeys.delete(fingerprint);
+  }
+}
+
 const isVisible = (el) =>
   !!(el && (el.offsetParent !== null || el.getClientRects().length));
 
@@ -151,24 +198,39 @@ export async function handleDocumentFormSubmit(e) {
       document.getElementById("feedback-reflection-input")?.value || "";
     const companyName = companyNameInput?.value?.trim() || "";
 
-    const response = await apiFetch(
-      `${API_BASE}/analyze_document/${currentDocType}`,
-      {
-        method: "POST",
-        body: JSON.stringify({
-          job_title: jobTitle,
-          document_content: content,
-          version: currentDocVersion, // 편집 중인 현재 버전
-          feedback_reflection: feedbackReflection,
-          company_name: companyName,
-        }),
-      }
-    );
-
-    const result = await response.json();
+    const postAnalyze = (forceReanalyze) => {
+      const body = JSON.stringify({
+        job_title: jobTitle,
+        document_content: content,
+        version: currentDocVersion, // 편집 중인 현재 버전
+        feedback_reflection: feedbackReflection,
+        company_name: companyName,
+        force_reanalyze: forceReanalyze,
+      });
+      return apiFetchIdempotent(
+        `${API_BASE}/analyze_document/${currentDocType}`,
+        { method: "POST", body },
+        `analyze:${currentDocType}:${body}`
+      );
+    };
+
+    let response = await postAnalyze(false);
+    let result = await response.json();
+
+    // 경미한 변경: 서버가 이전 피드백을 재사용함 → 원하면 강제 재분석
+    if (
+      response.ok &&
+      result.minor_change &&
+      confirm(
+        "이전 버전과 거의 같아 기존 피드백을 재사용했습니다.\n그래도 AI 분석을 다시 실행할까요?"
+      )
+    ) {
+      response = await postAnalyze(true);
+      result = await response.json();
+    }
 
     if (!response.ok) {
-      const errorMsg = result.error || response.statusText || "알 수 없는 오류";
+      const errorMsg = result.error || result.detail || response.statusText || "알 수 없는 오류";
       alert(`AI 분석 오류: ${errorMsg}`);
       setAiFeedback(errorMsg, {}, currentDocType);
       return;
@@ -257,6 +319,11 @@ export async function handlePortfolioFormSubmit(e) {
 
   let hasPortfolioContent = false;
   if (pdfInput && pdfInput.files.length > 0) {
+    // 서버 한도(10MB)를 넘으면 업로드 전에 차단
+    if (pdfInput.files[0].size > MAX_PORTFOLIO_PDF_BYTES) {
+      alert("파일 크기가 너무 큽니다. 10MB 이하의 파일을 업로드해주세요.");
+      return;
+    }
     formData.append("portfolio_pdf", pdfInput.files[0]);
     hasPortfolioContent = true;
   }
@@ -272,14 +339,23 @@ export async function handlePortfolioFormSubmit(e) {
 
   showLoading(true, "포트폴리오 요약 및 PDF 생성 중...");
   try {
-    const response = await apiFetch(`${API_BASE}/portfolio_summary`, {
-      method: "POST",
-      body: formData,
-    });
+    const pdfFile = pdfInput?.files?.[0];
+    const response = await apiFetchIdempotent(
+      `${API_BASE}/portfolio_summary`,
+      { method: "POST", body: formData },
+      [
+        "portfolio",
+        jobTitle,
+        currentDocVersion,
+        companyName || "",
+        linkInput?.value?.trim() || "",
+        pdfFile ? `${pdfFile.name}:${pdfFile.size}:${pdfFile.lastModified}` : "",
+      ].join("|")
+    );
     const result = await response.json();
 
     if (!response.ok) {
-      const resultError = result.error || "알 수 없는 오류";
+      const resultError = result.error || result.detail || "알 수 없는 오류";
       alert(`요약 실패: ${resultError}`);
       setAiFeedback(`오류: ${resultError}`, {}, "portfolio");
       return;
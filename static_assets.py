@@ -0,0 +1,239 @@
+# static_assets.py
+# 정적 자산 빌드(콘텐츠 해시 파일명 + gzip/brotli 사전 압축)와 서빙.
+#
+#   python static_assets.py            # static/ → static/dist/ 빌드 (manifest.json 생성)
+#
+#  - static/dist/<경로>.<해시>.<확장자> 로 복사하면서 JS의 상대 import("./domElements.js")와
+#    CSS의 url(...)도 해시 파일명으로 치환 → 내용이 바뀌면 URL도 바뀌므로 immutable 캐시 가능
+#  - 템플릿에서는 {{ asset_url('js/main.js') }} 로 참조 (manifest가 없으면 원본 /static 경로)
+#  - PrecompressedStaticFiles: Accept-Encoding에 맞는 .br/.gz 파일이 있으면 그대로 전송
+import hashlib
+import json
+import mimetypes
+import posixpath
+import re
+import shutil
+import stat
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+
+from compression import HAS_BROTLI, accepted_encodings, compress
+
+BASE_DIR = Path(__file__).resolve().parent
+STATIC_DIR = BASE_DIR / "static"
+DIST_DIR = STATIC_DIR / "dist"
+MANIFEST_PATH = DIST_DIR / "manifest.json"
+
+# 빌드 대상 (fonts/*.pkl 같은 fpdf 캐시는 웹 자산이 아니므로 제외)
+WEB_SUFFIXES = {".js", ".css", ".svg", ".png", ".jpg", ".jpeg", ".gif", ".ico", ".webp",
+                ".ttf", ".otf", ".woff", ".woff2", ".map"}
+PRECOMPRESS_SUFFIXES = {".js", ".css", ".svg", ".ttf", ".otf", ".map", ".ico"}
+PRECOMPRESS_MIN_BYTES = 256
+HASH_LEN = 10
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# 해시가 없는 원본 경로는 매번 ETag로 재검증
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+_JS_IMPORT_RE = re.compile(
+    r"""(\b(?:import|export)\b[^'"`;]*?\bfrom\s*|\bimport\s*\(\s*|\bimport\s+)(["'])(\.{1,2}/[^"']+)\2"""
+)
+_CSS_URL_RE = re.compile(r"""url\(\s*(["']?)(?!data:|https?:|//|/)([^"')]+)\1\s*\)""")
+
+
+# =========================
+# 빌드
+# =========================
+def _fingerprinted(rel: str, digest: str) -> str:
+    stem, ext = posixpath.splitext(rel)
+    return f"{stem}.{digest[:HASH_LEN]}{ext}"
+
+
+def _refs(rel: str, text: str) -> List[str]:
+    base = posixpath.dirname(rel)
+    if rel.endswith(".js"):
+        specs = [m.group(3) for m in _JS_IMPORT_RE.finditer(text)]
+    elif rel.endswith(".css"):
+        specs = [m.group(2).split("?")[0].split("#")[0] for m in _CSS_URL_RE.finditer(text)]
+    else:
+        return []
+    return [posixpath.normpath(posixpath.join(base, s)) for s in specs]
+
+
+def _rewrite(rel: str, text: str, mapping: Dict[str, str]) -> str:
+    base = posixpath.dirname(rel)
+
+    def target(spec: str) -> Optional[str]:
+        path = spec.split("?")[0].split("#")[0]
+        resolved = posixpath.normpath(posixpath.join(base, path))
+        if resolved not in mapping:
+            return None
+        new = posixpath.relpath(mapping[resolved], base or ".")
+        return new if new.startswith(".") else "./" + new
+
+    if rel.endswith(".js"):
+        def repl_js(m):
+            new = target(m.group(3))
+            return m.group(0) if new is None else f"{m.group(1)}{m.group(2)}{new}{m.group(2)}"
+        return _JS_IMPORT_RE.sub(repl_js, text)
+
+    def repl_css(m):
+        new = target(m.group(2))
+        return m.group(0) if new is None else f"url({m.group(1)}{new}{m.group(1)})"
+    return _CSS_URL_RE.sub(repl_css, text)
+
+
+def _strongly_connected(graph: Dict[str, List[str]]) -> List[List[str]]:
+    # Tarjan: 의존 대상이 먼저 나오는 순서(역위상 순서)로 SCC 반환
+    index: Dict[str, int] = {}
+    low: Dict[str, int] = {}
+    stack: List[str] = []
+    on_stack = set()
+    groups: List[List[str]] = []
+
+    def strongconnect(v: str) -> None:
+        index[v] = low[v] = len(index)
+        stack.append(v)
+        on_stack.add(v)
+        for w in graph[v]:
+            if w not in index:
+                strongconnect(w)
+                low[v] = min(low[v], low[w])
+            elif w in on_stack:
+                low[v] = min(low[v], index[w])
+        if low[v] == index[v]:
+            group = []
+            while True:
+                w = stack.pop()
+                on_stack.discard(w)
+                group.append(w)
+                if w == v:
+                    break
+            groups.append(group)
+
+    for v in graph:
+        if v not in index:
+            strongconnect(v)
+    return groups
+
+
+def _write_precompressed(path: Path, data: bytes) -> Dict[str, int]:
+    sizes = {}
+    encodings = [("gzip", ".gz", 9)] + ([("br", ".br", 11)] if HAS_BROTLI else [])
+    for enc, suffix, level in encodings:
+        packed = compress(data, enc, level)
+        if len(packed) < len(data):  # 압축 이득이 없으면 만들지 않음
+            Path(str(path) + suffix).write_bytes(packed)
+            sizes[enc] = len(packed)
+    return sizes
+
+
+def build(static_dir: Path = STATIC_DIR, out_dir: Path = DIST_DIR) -> Dict[str, str]:
+    sources: Dict[str, Path] = {}
+    for p in sorted(static_dir.rglob("*")):
+        if not p.is_file() or p.suffix.lower() not in WEB_SUFFIXES:
+            continue
+        if out_dir in p.parents:
+            continue
+        sources[p.relative_to(static_dir).as_posix()] = p
+
+    texts = {rel: p.read_text(encoding="utf-8") for rel, p in sources.items() if p.suffix in (".js", ".css")}
+    graph = {rel: [d for d in _refs(rel, texts[rel]) if d in sources] if rel in texts else [] for rel in sources}
+    mapping: Dict[str, str] = {}
+    outputs: Dict[str, bytes] = {}
+
+    # 참조되는 파일의 해시가 먼저 정해져야 하므로 의존성 순서로 처리.
+    # ES 모듈은 순환 import가 가능하므로 순환 묶음(SCC)은 멤버 전체 내용으로 한 해시를 공유
+    for group in _strongly_connected(graph):
+        if len(group) == 1 and group[0] not in texts:
+            rel = group[0]
+            outputs[rel] = sources[rel].read_bytes()
+            mapping[rel] = _fingerprinted(rel, hashlib.sha256(outputs[rel]).hexdigest())
+            continue
+        h = hashlib.sha256()
+        for rel in sorted(group):
+            h.update(rel.encode("utf-8") + b"\0" + _rewrite(rel, texts[rel], mapping).encode("utf-8") + b"\0")
+        digest = h.hexdigest()
+        for rel in group:
+            mapping[rel] = _fingerprinted(rel, digest)
+        for rel in group:
+            outputs[rel] = _rewrite(rel, texts[rel], mapping).encode("utf-8")
+
+    if out_dir.exists():
+        shutil.rmtree(out_dir)
+    total_raw = total_best = 0
+    for rel, data in outputs.items():
+        dest = out_dir / mapping[rel]
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        dest.write_bytes(data)
+        sizes = _write_precompressed(dest, data) if dest.suffix in PRECOMPRESS_SUFFIXES and len(data) >= PRECOMPRESS_MIN_BYTES else {}
+        best = min([len(data)] + list(sizes.values()))
+        total_raw += len(data)
+        total_best += best
+        extra = " ".join(f"{k}={v}" for k, v in sizes.items())
+        print(f"{rel:<40} → {mapping[rel]:<45} {len(data):>8} B  {extra}")
+
+    (out_dir / MANIFEST_PATH.name).write_text(json.dumps(mapping, ensure_ascii=False, indent=2, sort_keys=True), encoding="utf-8")
+    print(f"\n{len(mapping)} files, {total_raw} B → {total_best} B on the wire (brotli: {'on' if HAS_BROTLI else 'off'})")
+    return mapping
+
+
+# =========================
+# 서빙
+# =========================
+_manifest: Dict[str, str] = {}
+
+
+def load_manifest() -> Dict[str, str]:
+    global _manifest
+    try:
+        _manifest = json.loads(MANIFEST_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        _manifest = {}
+    return _manifest
+
+
+def asset_url(rel: str) -> str:
+    # 템플릿용: 빌드 결과가 있으면 해시 파일명, 없으면 원본 경로
+    fingerprinted = _manifest.get(rel)
+    if fingerprinted:
+        return f"/static/dist/{fingerprinted}"
+    return f"/static/{rel}"
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    _ENCODING_SUFFIX = {"br": ".br", "gzip": ".gz"}
+
+    async def get_response(self, path: str, scope):
+        request_headers = Headers(scope=scope)
+        response = None
+        encodings = accepted_encodings(request_headers.get("accept-encoding", "")) if scope["method"] in ("GET", "HEAD") else []
+        for encoding in encodings:
+            # 미리 압축된 파일이 있으면 그대로 전송 (요청 시 압축 비용 없음)
+            full_path, stat_result = self.lookup_path(path + self._ENCODING_SUFFIX[encoding])
+            if stat_result is not None and stat.S_ISREG(stat_result.st_mode):
+                response = self.file_response(full_path, stat_result, scope)
+                media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+                if media_type.startswith("text/") or media_type in ("application/javascript", "image/svg+xml"):
+                    media_type += "; charset=utf-8"
+                response.headers["content-type"] = media_type
+                response.headers["content-encoding"] = encoding
+                break
+        if response is None:
+            response = await super().get_response(path, scope)
+        if path.startswith("dist/") and path != "dist/manifest.json":
+            response.headers["cache-control"] = IMMUTABLE_CACHE_CONTROL
+        else:
+            response.headers["cache-control"] = REVALIDATE_CACHE_CONTROL
+        response.headers["vary"] = "Accept-Encoding"
+        return response
+
+
+load_manifest()
+
+
+if __name__ == "__main__":
+    build()
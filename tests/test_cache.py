@@ -0,0 +1,102 @@
+# 2단 캐시(로컬 LRU + 공유 계층)와 공유 계층 write-behind에 대한 테스트
+import threading
+
+import pytest
+
+import cache
+from cache import CACHE_WRITES_DROPPED, InMemoryRedis, MemoryLRU, RedisCache, SQLiteCache, TieredCache, flush_writes
+
+
+class _BlockingShared(RedisCache):
+    # 공유 계층 쓰기가 느린 상황 (release 전까지 set이 끝나지 않음)
+    def __init__(self):
+        super().__init__(InMemoryRedis())
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.writes = 0
+
+    def set(self, key, value, ttl=None):
+        self.started.set()
+        self.release.wait(5)
+        self.writes += 1
+        super().set(key, value, ttl)
+
+
+class _BrokenShared(RedisCache):
+    def __init__(self):
+        super().__init__(InMemoryRedis())
+
+    def set(self, key, value, ttl=None):
+        raise OSError("disk full")
+
+    def get(self, key):
+        raise OSError("disk full")
+
+
+@pytest.fixture(autouse=True)
+def drain_writer():
+    yield
+    flush_writes()
+
+
+def _dropped():
+    return sum(CACHE_WRITES_DROPPED.values.values())
+
+
+# =========================
+# write-behind
+# =========================
+def test_set_does_not_wait_for_shared_tier():
+    shared = _BlockingShared()
+    c = TieredCache("embedding", MemoryLRU(), shared, 3600)
+    try:
+        c.set("k", [0.1, 0.2])
+        # 공유 계층 쓰기가 끝나지 않았어도 같은 프로세스에서는 바로 보임
+        assert c.get("k") == [0.1, 0.2]
+        assert shared.writes == 0
+    finally:
+        shared.release.set()
+    flush_writes()
+    assert shared.writes == 1
+    # 다른 워커(빈 로컬 LRU)에서는 공유 계층에서 읽음
+    other = TieredCache("embedding", MemoryLRU(), shared, 3600)
+    assert other.get("k") == [0.1, 0.2]
+
+
+def test_writes_beyond_queue_limit_are_dropped(monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_WRITE_QUEUE_MAX", 2)
+    shared = _BlockingShared()
+    c = TieredCache("feedback", MemoryLRU(), shared, 3600)
+    before = _dropped()
+    try:
+        c.set("a", 1)
+        assert shared.started.wait(5)  # 첫 쓰기가 전용 스레드에서 막혀 있음
+        for key in ("b", "c", "d", "e"):
+            c.set(key, key)
+        assert _dropped() - before == 3
+        # 버린 쓰기도 로컬 LRU에는 남아 있음
+        assert c.get("e") == "e"
+    finally:
+        shared.release.set()
+    flush_writes()
+    assert shared.writes == 2
+
+
+def test_shared_tier_failures_are_cache_misses():
+    c = TieredCache("company", MemoryLRU(), _BrokenShared(), 3600)
+    c.set("k", {"name": "x"})
+    flush_writes()
+    assert c.get("k") == {"name": "x"}  # 로컬 LRU
+    assert TieredCache("company", MemoryLRU(), _BrokenShared(), 3600).get("k") is None
+
+
+def test_sqlite_shared_tier_round_trip(tmp_path):
+    shared = SQLiteCache(tmp_path / "shared.sqlite3")
+    c = TieredCache("diff", MemoryLRU(), shared, 3600)
+    c.set("k", {"sections": ["a"]})
+    c.delete("gone")
+    flush_writes()
+    assert TieredCache("diff", MemoryLRU(), shared, 3600).get("k") == {"sections": ["a"]}
+    c.clear()
+    flush_writes()
+    assert TieredCache("diff", MemoryLRU(), shared, 3600).get("k") is None
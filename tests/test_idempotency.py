@@ -0,0 +1,128 @@
+# 분석/포트폴리오 요청 중복 실행 방지(single-flight, Idempotency-Key 재생)에 대한 테스트
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+
+import idempotency
+from cache import InMemoryRedis, MemoryLRU, RedisCache, TieredCache, flush_writes
+from idempotency import REPLAYED_HEADER, idempotent
+
+
+@pytest.fixture(autouse=True)
+def store(monkeypatch):
+    # 공유 sqlite 대신 테스트마다 새 인메모리 저장소
+    cache = TieredCache("idempotency", MemoryLRU(), RedisCache(InMemoryRedis()))
+    monkeypatch.setattr(idempotency, "get_cache", lambda namespace: cache)
+    monkeypatch.setattr(idempotency, "IDEMPOTENCY_ENABLED", True)
+    return cache
+
+
+def _request(key=None):
+    headers = [(b"idempotency-key", key.encode("utf-8"))] if key else []
+    return Request({"type": "http", "method": "POST", "path": "/analyze", "headers": headers})
+
+
+def _runner(calls, delay=0.0):
+    async def run():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return JSONResponse({"run": len(calls)})
+    return run
+
+
+def _body(response):
+    return json.loads(response.body)
+
+
+# =========================
+# single-flight
+# =========================
+def test_concurrent_duplicates_run_once():
+    calls = []
+
+    async def burst():
+        run = _runner(calls, delay=0.05)
+        key = ("backend", "cover_letter", 3, "hash-a")
+        return await asyncio.gather(*[idempotent(_request(), "u1", "analyze", key, run) for _ in range(3)])
+
+    responses = asyncio.run(burst())
+    assert len(calls) == 1
+    assert [_body(r) for r in responses] == [{"run": 1}] * 3
+    assert sorted(r.headers.get(REPLAYED_HEADER) for r in responses if r.headers.get(REPLAYED_HEADER)) == ["true", "true"]
+
+
+def test_different_content_runs_separately():
+    calls = []
+
+    async def two():
+        run = _runner(calls)
+        await idempotent(_request(), "u1", "analyze", ("backend", "cover_letter", 3, "hash-a"), run)
+        await idempotent(_request(), "u1", "analyze", ("backend", "cover_letter", 3, "hash-b"), run)
+        await idempotent(_request(), "u2", "analyze", ("backend", "cover_letter", 3, "hash-a"), run)
+
+    asyncio.run(two())
+    assert len(calls) == 3
+
+
+def test_finished_request_is_replayed_unless_invalidated():
+    calls = []
+    key = ("backend", "resume", 0, "hash-a")
+
+    async def again(valid):
+        return await idempotent(_request(), "u1", "analyze", key, _runner(calls), replay_valid=lambda: valid)
+
+    asyncio.run(again(True))
+    flush_writes()
+    replayed = asyncio.run(again(True))
+    assert len(calls) == 1 and replayed.headers[REPLAYED_HEADER] == "true"
+    # 롤백 등으로 결과가 더는 보이지 않으면 다시 실행
+    asyncio.run(again(False))
+    assert len(calls) == 2
+
+
+# =========================
+# Idempotency-Key
+# =========================
+def test_reused_key_with_different_body_is_422():
+    calls = []
+
+    async def first():
+        return await idempotent(_request("k-1"), "u1", "analyze", ("backend", "resume", 0, "hash-a"), _runner(calls))
+
+    async def second():
+        return await idempotent(_request("k-1"), "u1", "analyze", ("backend", "resume", 0, "hash-b"), _runner(calls))
+
+    asyncio.run(first())
+    flush_writes()
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(second())
+    assert exc.value.status_code == 422
+    assert len(calls) == 1
+
+
+def test_failed_requests_are_not_stored():
+    calls = []
+
+    async def failing():
+        calls.append(1)
+        return JSONResponse({"detail": "bad"}, status_code=500)
+
+    async def send():
+        return await idempotent(_request("k-2"), "u1", "analyze", ("backend", "resume", 0, "hash-a"), failing)
+
+    assert asyncio.run(send()).status_code == 500
+    flush_writes()
+    asyncio.run(send())
+    assert len(calls) == 2
+
+
+def test_overlong_key_is_rejected():
+    async def send():
+        return await idempotent(_request("k" * 256), "u1", "analyze", ("backend", "resume", 0, "h"), _runner([]))
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(send())
+    assert exc.value.status_code == 400
@@ -0,0 +1,98 @@
+# LLM 호출 스케줄러(사용자별 한도, 전역 용량의 공정 배분)에 대한 테스트
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import ratelimit
+from ratelimit import LLMScheduler, TokenBucket
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(ratelimit, "LLM_USER_RPM", 2)
+    monkeypatch.setattr(ratelimit, "LLM_USER_TPM", 1000)
+    monkeypatch.setattr(ratelimit, "LLM_USER_MAX_QUEUED", 4)
+    monkeypatch.setattr(ratelimit, "LLM_QUEUE_MAX_WAIT_SEC", 5)
+    return LLMScheduler()
+
+
+async def _use(scheduler, user_id, tokens=10, requests=1, order=None):
+    async with scheduler.slot(user_id, tokens, requests=requests):
+        if order is not None:
+            order.append(user_id)
+
+
+# =========================
+# 사용자 한도
+# =========================
+def test_precheck_rejects_once_user_requests_are_used(scheduler):
+    scheduler.precheck("u1")
+
+    async def two_calls():
+        await _use(scheduler, "u1")
+        await _use(scheduler, "u1")
+
+    asyncio.run(two_calls())
+    with pytest.raises(HTTPException) as exc:
+        scheduler.precheck("u1")
+    assert exc.value.status_code == 429
+    assert int(exc.value.headers["Retry-After"]) >= 1
+    # 다른 사용자와 익명 호출은 영향 없음
+    scheduler.precheck("u2")
+    scheduler.precheck(None)
+
+
+def test_embedding_calls_do_not_use_request_quota(scheduler):
+    async def calls():
+        for _ in range(5):
+            await _use(scheduler, "u1", requests=0)
+
+    asyncio.run(calls())
+    scheduler.precheck("u1")
+
+
+def test_slot_rejects_over_token_quota_and_refunds(scheduler):
+    async def calls():
+        await _use(scheduler, "u1", tokens=800)
+        await _use(scheduler, "u1", tokens=800)
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(calls())
+    assert exc.value.status_code == 429
+    # 거절된 두 번째 호출은 요청 한도(분당 2회)를 쓰지 않음
+    scheduler.precheck("u1")
+
+
+# =========================
+# 전역 용량 공정 배분
+# =========================
+def test_global_capacity_is_shared_round_robin(scheduler):
+    # 전역 버킷을 비워 두고 초당 10개씩 채움 → 모든 호출이 대기열을 거침
+    scheduler.global_requests = TokenBucket(600, capacity=1)
+    scheduler.global_requests.tokens = 0
+    order = []
+
+    async def burst():
+        heavy = [asyncio.create_task(_use(scheduler, "heavy", requests=0, order=order)) for _ in range(3)]
+        await asyncio.sleep(0)
+        light = asyncio.create_task(_use(scheduler, "light", requests=0, order=order))
+        await asyncio.gather(*heavy, light)
+
+    asyncio.run(burst())
+    # 먼저 3개를 넣은 사용자가 있어도 다른 사용자의 첫 호출이 두 번째로 배분됨
+    assert order == ["heavy", "light", "heavy", "heavy"]
+
+
+def test_user_queue_limit(scheduler, monkeypatch):
+    monkeypatch.setattr(ratelimit, "LLM_USER_MAX_QUEUED", 1)
+    scheduler.global_requests = TokenBucket(600, capacity=1)
+    scheduler.global_requests.tokens = 0
+
+    async def burst():
+        return await asyncio.gather(*[_use(scheduler, "u1", requests=0) for _ in range(2)], return_exceptions=True)
+
+    results = asyncio.run(burst())
+    rejected = [r for r in results if isinstance(r, HTTPException)]
+    assert len(rejected) == 1 and rejected[0].status_code == 429
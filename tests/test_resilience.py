@@ -0,0 +1,139 @@
+# OpenAI 호출 서킷 브레이커와 재시도에 대한 테스트
+import asyncio
+
+import pytest
+
+import resilience
+from resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    _breakers,
+    call_openai,
+    circuit_open,
+    raise_if_open,
+)
+
+
+class _ServerError(Exception):
+    status_code = 503
+
+
+class _BadRequest(Exception):
+    status_code = 400
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(resilience, "OPENAI_BACKOFF_BASE_SEC", 0)
+    monkeypatch.setattr(resilience, "OPENAI_MAX_RETRIES", 2)
+    monkeypatch.setattr(resilience, "OPENAI_HEDGE_ENABLED", False)
+    yield
+    _breakers.clear()
+
+
+def _expire(b: CircuitBreaker) -> None:
+    b.opened_at -= b.open_sec
+
+
+# =========================
+# 상태 전이
+# =========================
+def test_breaker_opens_after_threshold_failures():
+    b = CircuitBreaker("t:open", threshold=3, open_sec=30)
+    for _ in range(2):
+        b.before_call()
+        b.record_failure()
+    assert b.state == CircuitBreaker.CLOSED
+    b.before_call()
+    b.record_failure()
+    assert b.state == CircuitBreaker.OPEN
+
+    with pytest.raises(CircuitOpenError) as exc:
+        b.before_call()
+    assert 0 < exc.value.retry_after <= 30
+
+
+def test_success_resets_failure_count():
+    b = CircuitBreaker("t:reset", threshold=2, open_sec=30)
+    b.record_failure()
+    b.record_success()
+    b.record_failure()
+    assert b.state == CircuitBreaker.CLOSED and b.failures == 1
+
+
+def test_half_open_allows_a_single_probe():
+    b = CircuitBreaker("t:probe", threshold=1, open_sec=30)
+    b.record_failure()
+    _expire(b)
+
+    b.before_call()  # 시험 호출 한 건
+    assert b.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        b.before_call()
+    # 판정 없이 끝난 시험 호출(400 등)은 다음 시험을 막지 않음
+    b.release()
+    b.before_call()
+    b.record_success()
+    assert b.state == CircuitBreaker.CLOSED
+    b.before_call()
+
+
+def test_failed_probe_reopens():
+    b = CircuitBreaker("t:reopen", threshold=5, open_sec=30)
+    for _ in range(5):
+        b.record_failure()
+    _expire(b)
+    b.before_call()
+    b.record_failure()
+    assert b.state == CircuitBreaker.OPEN
+    assert b.snapshot()["retry_after"] > 0
+
+
+# =========================
+# call_openai
+# =========================
+def test_call_openai_retries_transient_errors():
+    calls = []
+
+    async def fn(timeout):
+        calls.append(timeout)
+        if len(calls) < 3:
+            raise _ServerError("upstream 503")
+        return "ok"
+
+    assert asyncio.run(call_openai("chat:retry", fn, 10)) == "ok"
+    assert len(calls) == 3
+    assert resilience.breaker("chat:retry").state == CircuitBreaker.CLOSED
+
+
+def test_call_openai_does_not_retry_or_count_client_errors():
+    calls = []
+
+    async def fn(timeout):
+        calls.append(timeout)
+        raise _BadRequest("invalid request")
+
+    with pytest.raises(_BadRequest):
+        asyncio.run(call_openai("chat:bad", fn, 10))
+    assert len(calls) == 1
+    assert resilience.breaker("chat:bad").failures == 0
+
+
+def test_open_circuit_fails_fast():
+    _breakers["chat:down"] = CircuitBreaker("chat:down", threshold=2, open_sec=30)
+    calls = []
+
+    async def fn(timeout):
+        calls.append(timeout)
+        raise _ServerError("upstream 503")
+
+    with pytest.raises(_ServerError):
+        asyncio.run(call_openai("chat:down", fn, 10))
+    # 두 번째 실패에서 열리면 더 재시도하지 않음
+    assert len(calls) == 2
+    assert circuit_open("chat:down")
+    with pytest.raises(CircuitOpenError):
+        raise_if_open("chat:down")
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(call_openai("chat:down", fn, 10))
+    assert len(calls) == 2
@@ -0,0 +1,58 @@
+# 섹션 diff (모델에 이전 버전 전체 대신 보내는 변경분)에 대한 테스트
+from text_diff import change_stats, diff_sections, diff_text, tokenize
+
+
+def _words(text):
+    return [t for t, _, _ in tokenize(text)]
+
+
+# =========================
+# 토큰화
+# =========================
+def test_tokenize_splits_korean_particles():
+    assert _words("서버에서는 API를 만들었다.") == ["서버", "에서는", "API", "를", "만들었다", "."]
+    # 어간이 한 글자만 남으면 자르지 않음
+    assert _words("나는 팀을") == ["나는", "팀을"]
+
+
+def test_tokenize_offsets_point_into_original_text():
+    text = "협업 과정에서 성능을 2.5배 개선"
+    for tok, start, end in tokenize(text):
+        assert text[start:end] == tok
+    assert "2.5" in _words(text)
+
+
+# =========================
+# 텍스트 diff
+# =========================
+def test_diff_text_changes_only_the_particle():
+    ops = diff_text("백엔드를 개발했습니다", "백엔드에서 개발했습니다")
+    assert [(op["op"], op["old"], op["new"]) for op in ops] == [("replace", "를", "에서")]
+    assert ops[0]["before"] == "백엔드"
+    assert ops[0]["after"] == "개발했습니다"
+
+
+def test_diff_text_identical_is_empty():
+    assert diff_text("같은 문장", "같은 문장") == []
+    assert change_stats("같은 문장", "같은 문장") == {"changed_chars": 0, "ratio": 0.0}
+
+
+# =========================
+# 섹션 diff
+# =========================
+def test_diff_sections_returns_changed_sections_only():
+    old = {"reason_for_application": "회사의 비전에 공감합니다", "growth_process": "꾸준히 공부했습니다"}
+    new = {"reason_for_application": "회사의 서비스에 공감합니다", "growth_process": "꾸준히 공부했습니다"}
+    result = diff_sections("cover_letter", old, new)
+    assert list(result) == ["reason_for_application"]
+    assert [(op["old"], op["new"]) for op in result["reason_for_application"]] == [("비전", "서비스")]
+
+
+def test_diff_sections_compares_resume_items_line_by_line():
+    old = {"certificates": [{"name": "정보처리기사", "date": "2022"}]}
+    new = {"certificates": [{"name": "정보처리기사", "date": "2022"}, {"name": "SQLD", "date": ""}]}
+    result = diff_sections("resume", old, new)
+    assert list(result) == ["certificates"]
+    assert result["certificates"][0]["op"] == "insert"
+    assert "name:SQLD" in result["certificates"][0]["new"]
+    assert diff_sections("resume", None, None) == {}
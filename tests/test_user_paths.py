@@ -0,0 +1,109 @@
+# 사용자 디렉터리 샤드 배치와 기존 배치(users/<user_id>)에서의 이동에 대한 테스트
+import os
+
+import pytest
+
+import user_paths
+from user_paths import (
+    iter_user_dirs,
+    layout_status,
+    legacy_user_dir,
+    migrate_all,
+    migrate_user_dir,
+    prune_links,
+    sharded_user_dir,
+    user_base_dir,
+    user_dir_name,
+)
+
+
+@pytest.fixture
+def users_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(user_paths, "USER_LAYOUT_LEGACY_FALLBACK", True)
+    d = tmp_path / "users"
+    d.mkdir()
+    return d
+
+
+def _legacy_user(users_dir, user_id, job="백엔드-개발자"):
+    doc_dir = users_dir / user_id / job / "resume"
+    doc_dir.mkdir(parents=True)
+    (doc_dir / "v0.json").write_text("{}", encoding="utf-8")
+    return users_dir / user_id
+
+
+# =========================
+# 경로 계산
+# =========================
+def test_sharded_path_layout(users_dir):
+    path = sharded_user_dir("alice", users_dir)
+    assert path.relative_to(users_dir).parts[2] == "alice"
+    assert all(len(p) == 2 for p in path.relative_to(users_dir).parts[:2])
+    # 경로로 새는 user_id는 해시 이름으로
+    assert user_dir_name("../etc").startswith("u-")
+    assert user_dir_name("..").startswith("u-")
+    assert legacy_user_dir("a/b", users_dir) is None
+    assert legacy_user_dir("..", users_dir) is None
+
+
+def test_legacy_fallback_until_migrated(users_dir):
+    legacy = _legacy_user(users_dir, "google-oauth2|123")
+    assert user_base_dir("google-oauth2|123", users_dir) == legacy
+    # 새 사용자는 샤드 위치
+    assert user_base_dir("bob", users_dir) == sharded_user_dir("bob", users_dir)
+
+
+def test_shard_named_user_only_falls_back_with_user_data(users_dir):
+    # user_id가 "ab"인 사용자와 샤드 디렉터리 users/ab/가 겹치는 경우
+    (users_dir / "ab" / "cd").mkdir(parents=True)
+    assert user_base_dir("ab", users_dir) == sharded_user_dir("ab", users_dir)
+    (users_dir / "ab" / "profile.json").write_text("{}", encoding="utf-8")
+    assert user_base_dir("ab", users_dir) == users_dir / "ab"
+
+
+# =========================
+# 이동
+# =========================
+def test_migrate_leaves_symlink_at_legacy_path(users_dir):
+    legacy = _legacy_user(users_dir, "carol")
+    report = migrate_user_dir(legacy, users_dir)
+    target = sharded_user_dir("carol", users_dir)
+
+    assert report["migrated"] == 1 and report["conflicts"] == []
+    assert (target / "백엔드-개발자" / "resume" / "v0.json").is_file()
+    assert legacy.is_symlink() and legacy.resolve() == target.resolve()
+    # 이동 전에 기존 경로를 잡은 요청도 같은 파일을 봄
+    assert (legacy / "백엔드-개발자" / "resume" / "v0.json").is_file()
+    assert user_base_dir("carol", users_dir) == target
+    # 링크는 순회에서 건너뜀 (중복 없음)
+    assert list(iter_user_dirs(users_dir)) == [target]
+    assert layout_status(users_dir) == {"sharded_users": 1, "legacy_users": 0, "legacy_links": 1}
+
+
+def test_migrate_absorbs_files_written_to_the_sharded_path(users_dir):
+    legacy = _legacy_user(users_dir, "dave")
+    target = sharded_user_dir("dave", users_dir)
+    (target / "companies").mkdir(parents=True)
+    (target / "companies" / "current_company_analysis.json").write_text("{}", encoding="utf-8")
+
+    report = migrate_user_dir(legacy, users_dir)
+    assert report["migrated"] == 1
+    assert (target / "companies" / "current_company_analysis.json").is_file()
+    assert (target / "백엔드-개발자" / "resume" / "v0.json").is_file()
+    assert legacy.is_symlink()
+
+
+def test_migrate_all_and_prune_links(users_dir):
+    for uid in ("erin", "frank", "google-oauth2|9"):
+        _legacy_user(users_dir, uid)
+    assert migrate_all(users_dir, batch_size=2, pause=0)["migrated"] == 3
+    assert layout_status(users_dir)["legacy_users"] == 0
+
+    assert prune_links(users_dir, older_than=3600) == 0  # 방금 만든 링크는 유지
+    assert prune_links(users_dir, older_than=0) == 3
+    assert not any(e.is_symlink() for e in os.scandir(users_dir))
+    # 안전하지 않은 문자("|")가 있는 user_id는 샤드 위치에서 해시 이름
+    assert sorted(iter_user_dirs(users_dir)) == sorted(
+        sharded_user_dir(uid, users_dir) for uid in ("erin", "frank", "google-oauth2|9")
+    )
+    assert user_base_dir("google-oauth2|9", users_dir).name == user_dir_name("google-oauth2|9")
@@ -0,0 +1,226 @@
+# 사용자 데이터를 지우는 경로(롤백 GC, 보존 정책)에 대한 테스트
+import json
+import os
+import time
+
+import pytest
+
+import compaction
+import version_store
+from compaction import compact_doc_dir, plan_retention
+from version_store import (
+    HEAD_FILE,
+    advance_head,
+    collect,
+    read_head,
+    rollback,
+    undo_rollback,
+    visible_versions,
+    write_versions,
+)
+
+GRACE = 600
+
+
+def _write(doc_dir, v, mtime=None, pdf=False):
+    doc_dir.mkdir(parents=True, exist_ok=True)
+    p = doc_dir / f"v{v}.json"
+    p.write_text(json.dumps({"version": v, "embedding": [0.1, 0.2]}), encoding="utf-8")
+    if pdf:
+        (doc_dir / f"v{v}_summary.pdf").write_bytes(b"%PDF")
+    if mtime is not None:
+        os.utime(p, (mtime, mtime))
+
+
+def _files(doc_dir):
+    return sorted(n for n in os.listdir(doc_dir) if n.startswith("v"))
+
+
+@pytest.fixture
+def doc_dir(tmp_path):
+    d = tmp_path / "user" / "백엔드-개발자" / "cover_letter"
+    for v in range(6):
+        _write(d, v, mtime=time.time() - 60)
+    return d
+
+
+# =========================
+# 롤백 / GC
+# =========================
+def test_rollback_hides_versions_until_gc(doc_dir):
+    result = rollback(doc_dir, 2)
+    assert result["previous_head"] == 5
+    assert visible_versions(doc_dir) == [0, 1, 2]
+    # 파일은 undo 기간 동안 그대로
+    assert _files(doc_dir) == [f"v{v}.json" for v in range(6)]
+
+    at = result["tombstone"]["at"]
+    assert collect(doc_dir, now=at + GRACE - 1, grace=GRACE)["files"] == 0
+    assert collect(doc_dir, now=at + GRACE, grace=GRACE)["files"] == 3
+    assert _files(doc_dir) == ["v0.json", "v1.json", "v2.json"]
+    assert read_head(doc_dir)["tombstones"] == []
+
+
+def test_new_writes_shrink_tombstone(doc_dir):
+    # v0..v5 → v2로 롤백 → v2 분석(v2 갱신 + v3 새로 생성) → GC는 v4, v5만 삭제
+    at = rollback(doc_dir, 2)["tombstone"]["at"]
+    _write(doc_dir, 2)
+    _write(doc_dir, 3)
+    advance_head(doc_dir, [2, 3])
+
+    state = read_head(doc_dir)
+    assert state["head"] == 3
+    assert [(t["after"], t["upto"], t["undoable"]) for t in state["tombstones"]] == [(3, 5, False)]
+
+    assert collect(doc_dir, now=at + GRACE, grace=GRACE)["files"] == 2
+    assert _files(doc_dir) == ["v0.json", "v1.json", "v2.json", "v3.json"]
+
+
+def test_tombstone_dropped_when_writes_cover_it(doc_dir):
+    rollback(doc_dir, 4)
+    _write(doc_dir, 5)
+    _write(doc_dir, 6)
+    advance_head(doc_dir, [5, 6])
+    assert read_head(doc_dir)["tombstones"] == []
+    assert visible_versions(doc_dir) == list(range(7))
+
+
+def test_collect_keeps_files_written_after_rollback(doc_dir):
+    tombstone = rollback(doc_dir, 2)["tombstone"]
+    # 롤백 이후에 (head를 옮기기 전) 새로 쓴 파일은 삭제하지 않음
+    newer = tombstone["at"] + 5
+    os.utime(doc_dir / "v5.json", (newer, newer))
+    collect(doc_dir, now=tombstone["at"] + GRACE, grace=GRACE)
+    assert _files(doc_dir) == ["v0.json", "v1.json", "v2.json", "v5.json"]
+
+
+def test_write_versions_advances_head_under_lock(doc_dir):
+    at = rollback(doc_dir, 2)["tombstone"]["at"]
+    write_versions(doc_dir, [3], lambda: _write(doc_dir, 3))
+    assert read_head(doc_dir)["head"] == 3
+    assert collect(doc_dir, now=at + GRACE, grace=GRACE)["files"] == 2
+    assert _files(doc_dir) == ["v0.json", "v1.json", "v2.json", "v3.json"]
+    # 잠금은 쓰는 동안만 유지됨
+    assert str(doc_dir) not in version_store._thread_locks
+
+
+def test_collect_removes_summary_pdfs(tmp_path):
+    d = tmp_path / "portfolio"
+    for v in range(3):
+        _write(d, v, mtime=time.time() - 60, pdf=True)
+    at = rollback(d, 0)["tombstone"]["at"]
+    assert collect(d, now=at + GRACE, grace=GRACE)["files"] == 4
+    assert sorted(os.listdir(d)) == sorted([HEAD_FILE, ".lock", "v0.json", "v0_summary.pdf"])
+
+
+def test_undo_restores_head(doc_dir):
+    tombstone = rollback(doc_dir, 1)["tombstone"]
+    assert undo_rollback(doc_dir, tombstone["id"]) == {"head": 5, "undone": tombstone["id"]}
+    assert visible_versions(doc_dir) == list(range(6))
+    # 되돌린 뒤에는 GC가 지울 것이 없음
+    assert collect(doc_dir, now=time.time() + GRACE, grace=GRACE)["files"] == 0
+    assert len(_files(doc_dir)) == 6
+
+
+def test_undo_not_allowed_after_new_write_or_gc(doc_dir):
+    at = rollback(doc_dir, 2)["tombstone"]["at"]
+    _write(doc_dir, 3)
+    advance_head(doc_dir, [3])
+    with pytest.raises(LookupError):
+        undo_rollback(doc_dir)
+
+    collect(doc_dir, now=at + GRACE, grace=GRACE)
+    with pytest.raises(LookupError):
+        undo_rollback(doc_dir)
+
+
+def test_rollback_rejects_invalid_targets(tmp_path, doc_dir):
+    with pytest.raises(ValueError):
+        rollback(doc_dir, 6)
+    with pytest.raises(ValueError):
+        rollback(doc_dir, -1)
+    with pytest.raises(FileNotFoundError):
+        rollback(tmp_path / "empty", 0)
+    assert read_head(doc_dir) is None
+
+
+# =========================
+# 보존 정책
+# =========================
+DAY = 86400
+
+
+@pytest.fixture
+def retention(monkeypatch):
+    monkeypatch.setattr(compaction, "RETENTION_KEEP_LAST", 3)
+    monkeypatch.setattr(compaction, "RETENTION_KEEP_DAILY_DAYS", 5)
+    monkeypatch.setattr(compaction, "RETENTION_HOT_VERSIONS", 2)
+    monkeypatch.setattr(compaction, "COMPACTION_MIN_AGE_SEC", 3600)
+
+
+def test_plan_retention_keeps_last_and_one_per_day(retention):
+    now = 100 * DAY + 12 * 3600  # 날짜 경계에서 떨어진 시각
+    # 최신순: v9..v0. v9~v7은 최근 3개, v6/v5는 같은 날, v4는 다른 날(창 안), v3 이하는 창 밖
+    versions = [
+        (9, now - 2 * DAY), (8, now - 2 * DAY), (7, now - 2 * DAY),
+        (6, now - 3 * DAY), (5, now - 3 * DAY - 10),
+        (4, now - 4 * DAY),
+        (3, now - 10 * DAY), (2, now - 11 * DAY), (1, now - 12 * DAY), (0, now - 13 * DAY),
+    ]
+    plan = plan_retention(versions, now)
+    assert plan["keep"] == [9, 8, 7, 6, 4]
+    assert plan["delete"] == [5, 3, 2, 1, 0]
+    assert plan["cold"] == [7, 6, 4]
+
+
+def test_plan_retention_never_deletes_recent_versions(retention):
+    now = 100 * DAY
+    versions = [(v, now - 60) for v in range(9, -1, -1)]
+    plan = plan_retention(versions, now)
+    assert plan["delete"] == []
+    assert plan["keep"] == list(range(9, -1, -1))
+
+
+def test_compact_doc_dir_ignores_versions_above_head(tmp_path, retention):
+    d = tmp_path / "cover_letter"
+    old = time.time() - 30 * DAY
+    for v in range(8):
+        _write(d, v, mtime=old + v)
+    rollback(d, 5)  # v6, v7은 version_store GC 담당
+
+    report = compact_doc_dir(d)
+    assert report["deleted_versions"] == 3
+    assert _files(d) == ["v3.json", "v4.json", "v5.json", "v6.json", "v7.json"]
+    # 최신 2개를 제외한 남은 버전은 embedding만 비움 (mtime 유지)
+    assert json.loads((d / "v3.json").read_text())["embedding"] == []
+    assert json.loads((d / "v5.json").read_text())["embedding"] == [0.1, 0.2]
+    assert (d / "v3.json").stat().st_mtime == pytest.approx(old + 3)
+
+
+def test_compact_doc_dir_dry_run_changes_nothing(tmp_path, retention):
+    d = tmp_path / "resume"
+    old = time.time() - 30 * DAY
+    for v in range(6):
+        _write(d, v, mtime=old + v)
+    report = compact_doc_dir(d, dry_run=True)
+    assert report["deleted_versions"] == 3 and report["reclaimed_bytes"] > 0
+    assert len(_files(d)) == 6
+
+
+def test_compact_doc_dir_skips_versions_rewritten_after_planning(tmp_path, retention, monkeypatch):
+    d = tmp_path / "portfolio"
+    old = time.time() - 30 * DAY
+    for v in range(6):
+        _write(d, v, mtime=old + v)
+
+    plan = compaction.plan_retention
+
+    def plan_then_rewrite(versions, now):
+        result = plan(versions, now)
+        _write(d, 0)  # 계획과 삭제 사이에 다시 쓰인 버전
+        return result
+
+    monkeypatch.setattr(compaction, "plan_retention", plan_then_rewrite)
+    report = compact_doc_dir(d)
+    assert report["deleted_versions"] == 2
+    assert _files(d) == ["v0.json", "v3.json", "v4.json", "v5.json"]
@@ -0,0 +1,189 @@
+# text_diff.py
+import difflib
+import json
+import re
+from typing import Dict, Any, Optional, List, Tuple
+
+from job_data import DOC_SECTION_KEYS, DOC_SECTION_LABELS
+
+# =========================
+# 토큰화 (한국어 어절 → 어간 + 조사 분리)
+# =========================
+# 한글/영문/숫자 덩어리, 그 외 단일 문자(문장부호)를 토큰으로 사용
+_TOKEN_RE = re.compile(r"[가-힣]+|[A-Za-z]+|\d+(?:[.,]\d+)*|[^\s]")
+
+# 어절 끝의 흔한 조사/어미. 긴 것부터 검사해야 "에서는"이 "는"으로 잘리지 않음
+_KO_PARTICLES = sorted([
+    "에서는", "으로는", "에게서", "이라는", "에서", "에게", "으로", "까지", "부터",
+    "처럼", "보다", "하고", "이나", "라는", "은", "는", "이", "가", "을", "를",
+    "에", "의", "와", "과", "도", "로", "만",
+], key=len, reverse=True)
+
+
+def tokenize(text: str) -> List[Tuple[str, int, int]]:
+    """텍스트를 (토큰, 시작, 끝) 목록으로 나눕니다. 한글 어절은 어간/조사로 한 번 더 나눕니다."""
+    tokens: List[Tuple[str, int, int]] = []
+    for m in _TOKEN_RE.finditer(text or ""):
+        tok, start, end = m.group(0), m.start(), m.end()
+        if "가" <= tok[0] <= "힣" and len(tok) >= 3:
+            for p in _KO_PARTICLES:
+                if tok.endswith(p) and len(tok) - len(p) >= 2:
+                    cut = end - len(p)
+                    tokens.append((tok[: -len(p)], start, cut))
+                    tokens.append((p, cut, end))
+                    break
+            else:
+                tokens.append((tok, start, end))
+        else:
+            tokens.append((tok, start, end))
+    return tokens
+
+
+def _span(text: str, toks: List[Tuple[str, int, int]], i: int, j: int) -> str:
+    if i >= j:
+        return ""
+    return text[toks[i][1]: toks[j - 1][2]]
+
+
+# =========================
+# 텍스트 diff
+# =========================
+def diff_text(old: str, new: str, context_tokens: int = 3) -> List[Dict[str, str]]:
+    """
+    두 텍스트의 형태소 단위 차이를 반환합니다.
+    각 항목: {"op": "insert"|"delete"|"replace", "old", "new", "before", "after"}
+    """
+    old, new = old or "", new or ""
+    if old == new:
+        return []
+    a, b = tokenize(old), tokenize(new)
+    matcher = difflib.SequenceMatcher(None, [t[0] for t in a], [t[0] for t in b], autojunk=False)
+    ops: List[Dict[str, str]] = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        ops.append({
+            "op": tag,
+            "old": _span(old, a, i1, i2),
+            "new": _span(new, b, j1, j2),
+            "before": _span(new, b, max(0, j1 - context_tokens), j1),
+            "after": _span(new, b, j2, min(len(b), j2 + context_tokens)),
+        })
+    return ops
+
+
+def change_stats(old: str, new: str) -> Dict[str, float]:
+    """변경된 글자 수와 변경 비율(0~1)."""
+    old, new = old or "", new or ""
+    if old == new:
+        return {"changed_chars": 0, "ratio": 0.0}
+    matcher = difflib.SequenceMatcher(None, old, new, autojunk=False)
+    changed = 0
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != "equal":
+            changed += max(i2 - i1, j2 - j1)
+    return {"changed_chars": changed, "ratio": changed / max(len(old), len(new), 1)}
+
+
+# =========================
+# 섹션 단위 diff
+# =========================
+def section_text(doc_type: str, content: Optional[Dict[str, Any]], key: str) -> str:
+    """섹션 값을 비교 가능한 텍스트로 변환합니다 (이력서 항목은 한 줄씩)."""
+    value = (content or {}).get(key, "")
+    if isinstance(value, str):
+        return value
+    if isinstance(value, list):
+        lines = []
+        for item in value:
+            if isinstance(item, dict):
+                lines.append(", ".join(f"{k}:{v}" for k, v in item.items() if v not in (None, "")))
+            else:
+                lines.append(str(item))
+        return "\n".join(lines)
+    return json.dumps(value, ensure_ascii=False)
+
+
+def diff_sections(
+    doc_type: str,
+    old_content: Optional[Dict[str, Any]],
+    new_content: Optional[Dict[str, Any]],
+    context_tokens: int = 3,
+) -> Dict[str, List[Dict[str, str]]]:
+    """변경된 섹션만 {섹션키: diff 목록} 형태로 반환합니다."""
+    result: Dict[str, List[Dict[str, str]]] = {}
+    for key in DOC_SECTION_KEYS.get(doc_type, []):
+        ops = diff_text(
+            section_text(doc_type, old_content, key),
+            section_text(doc_type, new_content, key),
+            context_tokens=context_tokens,
+        )
+        if ops:
+            result[key] = ops
+    return result
+
+
+def diff_document(
+    doc_type: str,
+    old_content: Optional[Dict[str, Any]],
+    new_content: Optional[Dict[str, Any]],
+    context_tokens: int = 3,
+) -> Dict[str, Any]:
+    """편집기 표시용: 모든 섹션의 라벨, diff 목록, 변경 통계와 변경된 섹션 키 목록."""
+    labels = DOC_SECTION_LABELS.get(doc_type, {})
+    sections: Dict[str, Dict[str, Any]] = {}
+    for key in DOC_SECTION_KEYS.get(doc_type, []):
+        old_text = section_text(doc_type, old_content, key)
+        new_text = section_text(doc_type, new_content, key)
+        ops = diff_text(old_text, new_text, context_tokens=context_tokens)
+        sections[key] = {"label": labels.get(key, key), "ops": ops, **change_stats(old_text, new_text)}
+    return {"sections": sections, "changed_sections": [k for k, v in sections.items() if v["ops"]]}
+
+
+def _clip(s: str, limit: int) -> str:
+    s = " ".join((s or "").split())
+    return s if len(s) <= limit else s[:limit] + "…"
+
+
+def format_section_diffs(
+    doc_type: str,
+    section_diffs: Dict[str, List[Dict[str, str]]],
+    max_ops_per_section: int = 8,
+    max_span_chars: int = 160,
+) -> str:
+    """프롬프트용 diff 텍스트. 추가(+), 삭제(-), 수정(~)만 짧은 문맥과 함께 나열합니다."""
+    if not section_diffs:
+        return "(변경 없음)"
+    labels = DOC_SECTION_LABELS.get(doc_type, {})
+    lines: List[str] = []
+    for key in DOC_SECTION_KEYS.get(doc_type, []):
+        ops = section_diffs.get(key)
+        if not ops:
+            continue
+        lines.append(f"■ {labels.get(key, key)}")
+        for op in ops[:max_ops_per_section]:
+            pre = f"…{_clip(op['before'], 30)} " if op["before"] else ""
+            post = f" {_clip(op['after'], 30)}…" if op["after"] else ""
+            if op["op"] == "insert":
+                lines.append(f"  + {pre}[{_clip(op['new'], max_span_chars)}]{post}")
+            elif op["op"] == "delete":
+                lines.append(f"  - {pre}[{_clip(op['old'], max_span_chars)}]{post}")
+            else:
+                lines.append(
+                    f"  ~ {pre}[{_clip(op['old'], max_span_chars)}] → [{_clip(op['new'], max_span_chars)}]{post}"
+                )
+        if len(ops) > max_ops_per_section:
+            lines.append(f"  (외 {len(ops) - max_ops_per_section}건 변경)")
+    unchanged = [labels.get(k, k) for k in DOC_SECTION_KEYS.get(doc_type, []) if k not in section_diffs]
+    if unchanged:
+        lines.append(f"(변경 없음: {', '.join(unchanged)})")
+    return "\n".join(lines)
+
+
+def condense_feedback(feedback: Any, max_chars: int = 300) -> str:
+    """이전 피드백을 앞부분 위주로 압축합니다."""
+    if not feedback:
+        return "(없음)"
+    if not isinstance(feedback, str):
+        feedback = json.dumps(feedback, ensure_ascii=False)
+    return _clip(feedback, max_chars)
@@ -0,0 +1,127 @@
+# uploads.py
+# 포트폴리오 PDF 업로드 크기 제한과 디스크 스풀링.
+#  - UploadLimitMiddleware: 본문을 읽기 전에 Content-Length로 거절하고,
+#    길이를 모르는(chunked) 요청은 받는 도중 누적 크기가 한도를 넘는 순간 413
+#  - spool_upload: UploadFile을 청크 단위로 임시 파일에 복사 (메모리에 전체를 올리지 않음)
+#    복사하면서 크기 확인과 SHA-256 계산을 함께 수행
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import Iterable, Optional, Tuple
+
+from fastapi import HTTPException
+
+import fastjson
+from metrics import Counter
+
+MAX_UPLOAD_BYTES = int(float(os.getenv("PORTFOLIO_MAX_UPLOAD_MB", "10")) * 1024 * 1024)
+# multipart 경계/다른 폼 필드 몫으로 허용하는 여유분
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+UPLOAD_CHUNK_BYTES = 64 * 1024
+UPLOAD_TMP_DIR = os.getenv("UPLOAD_TMP_DIR") or None  # None이면 시스템 임시 디렉터리
+UPLOAD_LIMITED_PATHS = ("/apiText/portfolio_summary",)
+
+TOO_LARGE_DETAIL = f"파일 크기가 너무 큽니다. {MAX_UPLOAD_BYTES // (1024 * 1024)}MB 이하의 파일을 업로드해주세요."
+
+UPLOAD_REJECTIONS = Counter("upload_rejections_total", "Uploads rejected for size", ("stage",))
+
+
+def _too_large(stage: str) -> HTTPException:
+    UPLOAD_REJECTIONS.inc(stage=stage)
+    return HTTPException(status_code=413, detail=TOO_LARGE_DETAIL)
+
+
+class UploadLimitMiddleware:
+    # 순수 ASGI 미들웨어. 지정 경로의 요청 본문 크기를 제한
+    def __init__(self, app, paths: Iterable[str] = UPLOAD_LIMITED_PATHS,
+                 max_body: int = MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES):
+        self.app = app
+        self.paths = tuple(paths)
+        self.max_body = max_body
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("method") != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        for k, v in scope.get("headers", []):
+            if k == b"content-length":
+                try:
+                    declared = int(v)
+                except ValueError:
+                    declared = 0
+                if declared > self.max_body:
+                    # 본문을 한 바이트도 읽지 않고 바로 거절
+                    UPLOAD_REJECTIONS.inc(stage="content_length")
+                    body = fastjson.dumps({"detail": TOO_LARGE_DETAIL})
+                    await send({
+                        "type": "http.response.start",
+                        "status": 413,
+                        "headers": [
+                            (b"content-type", b"application/json"),
+                            (b"content-length", str(len(body)).encode("latin-1")),
+                            (b"connection", b"close"),
+                        ],
+                    })
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                break
+
+        received = 0
+
+        async def _receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body:
+                    # 폼 파싱 도중 발생 → FastAPI가 HTTPException 그대로 413 응답
+                    raise _too_large("stream")
+            return message
+
+        await self.app(scope, _receive, send)
+
+
+async def spool_upload(file, max_bytes: int = MAX_UPLOAD_BYTES) -> Tuple[Path, int, str]:
+    """UploadFile → 임시 파일. (경로, 크기, sha256 hex). 호출한 쪽에서 경로를 삭제."""
+    size = getattr(file, "size", None)
+    if size is not None and size > max_bytes:
+        raise _too_large("upload_size")
+    digest = hashlib.sha256()
+    total = 0
+    fd, name = tempfile.mkstemp(prefix="upload_", suffix=".pdf", dir=UPLOAD_TMP_DIR)
+    path = Path(name)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                total += len(chunk)
+                if total > max_bytes:
+                    raise _too_large("spool")
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+    return path, total, digest.hexdigest()
+
+
+async def upload_sha256(file) -> str:
+    """UploadFile 내용의 SHA-256 (처음부터 다시 읽을 수 있도록 되감아 둠). 중복 요청 판별용."""
+    digest = hashlib.sha256()
+    await file.seek(0)
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            break
+        digest.update(chunk)
+    await file.seek(0)
+    return digest.hexdigest()
+
+
+def discard_spooled(path: Optional[Path]) -> None:
+    if path is not None:
+        path.unlink(missing_ok=True)
@@ -0,0 +1,108 @@
+# user_cache.py
+# 자주 읽는 작은 사용자 문서(profile.json, current_company_analysis.json)용 write-through 캐시.
+#  - 파일 경로 단위로 직렬화된 응답 바이트와 강한 ETag를 메모리에 보관 (LRU, 항목 수 상한)
+#  - 저장은 put()으로 파일과 캐시를 함께 갱신 → 같은 프로세스에서는 즉시 정확히 반영
+#  - 다른 워커가 파일을 바꾼 경우를 위해 USER_DOC_REVALIDATE_SEC 이 지난 항목만 mtime으로 확인
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+
+import fastjson
+from metrics import record_cache
+
+USER_DOC_CACHE_MAX_ENTRIES = int(os.getenv("USER_DOC_CACHE_MAX_ENTRIES", "10000"))
+USER_DOC_REVALIDATE_SEC = float(os.getenv("USER_DOC_REVALIDATE_SEC", "2"))
+# 브라우저는 매번 ETag로 재검증 (변경 없으면 304, 본문 전송 없음)
+USER_DOC_CACHE_CONTROL = "private, no-cache"
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def _mtime_ns(path: Path) -> Optional[int]:
+    try:
+        return os.stat(str(path)).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class UserDocCache:
+    def __init__(self, max_entries: int = USER_DOC_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        # 경로 → (etag, body, 파일 mtime_ns 또는 None(기본값), 마지막 확인 시각)
+        self._entries: "OrderedDict[str, Tuple[str, bytes, Optional[int], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _store(self, key: str, body: bytes, mtime: Optional[int]) -> Tuple[str, bytes]:
+        etag = _etag(body)
+        with self._lock:
+            self._entries[key] = (etag, body, mtime, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return etag, body
+
+    def get(self, path: Path, default: Any) -> Tuple[str, bytes]:
+        """(etag, 응답 바이트). 파일이 없으면 default를 직렬화해 캐시."""
+        key = str(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is not None:
+            etag, body, mtime, checked = entry
+            now = time.monotonic()
+            if now - checked < USER_DOC_REVALIDATE_SEC:
+                record_cache("user_doc", True)
+                return etag, body
+            if _mtime_ns(path) == mtime:
+                with self._lock:
+                    self._entries[key] = (etag, body, mtime, now)
+                record_cache("user_doc", True)
+                return etag, body
+        record_cache("user_doc", False)
+        mtime = _mtime_ns(path)
+        if mtime is None:
+            return self._store(key, fastjson.dumps(default), None)
+        body = fastjson.dumps(fastjson.load_file(path))  # 파싱 후 재직렬화 (손상된 파일이면 예외)
+        return self._store(key, body, _mtime_ns(path))
+
+    def put(self, path: Path, obj: Any) -> Tuple[str, bytes]:
+        # write-through: 파일 저장 + 캐시 갱신
+        body = fastjson.dumps(obj)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(str(path), "wb") as f:
+            f.write(body)
+        return self._store(str(path), body, _mtime_ns(path))
+
+    def invalidate(self, path: Path) -> None:
+        with self._lock:
+            self._entries.pop(str(path), None)
+
+
+user_doc_cache = UserDocCache()
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # If-None-Match는 약한 비교 (압축 미들웨어가 W/ 를 붙인 경우도 같은 표현으로 취급)
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    strip = lambda t: t.strip()[2:] if t.strip().startswith("W/") else t.strip()
+    return any(strip(t) == strip(etag) for t in if_none_match.split(","))
+
+
+def cached_json_response(request: Request, etag: str, body: bytes) -> Response:
+    headers = {"ETag": etag, "Cache-Control": USER_DOC_CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
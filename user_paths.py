@@ -0,0 +1,367 @@
+# user_paths.py
+# 사용자 데이터 디렉터리 배치와 경로 계산 (main/utils/version_store/compaction/embeddings 공용).
+#
+#   python user_paths.py status                      # 샤드/기존 배치 사용자 수, 남은 심볼릭 링크 수
+#   python user_paths.py migrate                     # 기존 users/<user_id>를 샤드 위치로 이동 (서비스 중 실행 가능)
+#   python user_paths.py migrate --dry-run           # 옮기지 않고 계획만 출력
+#   python user_paths.py prune-links --older-than 3600
+#
+#  - 배치: users/<h[0:2]>/<h[2:4]>/<user 디렉터리명> (h = sha256(user_id) 16진수)
+#    → 한 디렉터리의 항목 수가 사용자 수와 무관하게 작음 (65536개 leaf, 사용자 수십만 명에도 수 개씩)
+#  - 사용자 디렉터리명: 안전한 문자만 있으면 user_id 그대로, 아니면 "u-" + 해시 ("/", ".." 등이 경로로 새지 않음)
+#    (샤드 배치에만 적용. 기존 배치 대체 경로는 예전처럼 원래 user_id)
+#  - 직무 디렉터리명: 요청의 job_slug를 정규화해 미리 계산한 JOB_DIR_KEYS에서 찾음 (모르는 직무는 404)
+#  - 경로 계산은 LRU 캐시 조회 (처음 한 번만 해시), 디렉터리 나열 없음
+#  - 이동 중에는 USER_LAYOUT_LEGACY_FALLBACK으로 샤드 위치에 없으면 기존 위치를 사용
+#    migrate는 디렉터리를 rename(같은 inode 유지)한 뒤 기존 경로에 심볼릭 링크를 남김
+#    → 이미 기존 경로를 잡고 처리 중인 요청도 같은 파일/flock을 보게 됨. 링크는 prune-links로 나중에 정리
+import argparse
+import hashlib
+import os
+import re
+import shutil
+import time
+import unicodedata
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set
+from urllib.parse import unquote
+
+from fastapi import HTTPException
+
+from job_data import ALL_JOB_SLUGS
+from metrics import Counter
+
+USERS_DIR = Path(__file__).resolve().parent / "data" / "users"
+DOC_TYPES = ("resume", "cover_letter", "portfolio")
+
+# 이동이 끝나면 0으로 두어 기존 위치 확인(stat)을 생략
+USER_LAYOUT_LEGACY_FALLBACK = os.getenv("USER_LAYOUT_LEGACY_FALLBACK", "1") not in ("0", "false", "False")
+USER_PATH_CACHE_SIZE = int(os.getenv("USER_PATH_CACHE_SIZE", "65536"))
+USER_MIGRATION_BATCH_SIZE = int(os.getenv("USER_MIGRATION_BATCH_SIZE", "500"))
+USER_MIGRATION_PAUSE_SEC = float(os.getenv("USER_MIGRATION_PAUSE_SEC", "0.5"))
+
+_SHARD_RE = re.compile(r"[0-9a-f]{2}")
+_SAFE_NAME_RE = re.compile(r"[\w.@+-]{1,128}")
+
+USER_LAYOUT_LEGACY_HITS = Counter("user_layout_legacy_hits_total", "User paths resolved to the legacy (unsharded) layout")
+
+
+# =========================
+# 직무 디렉터리 키
+# =========================
+def normalize_job_slug(job_slug: str) -> str:
+    # URL 인코딩/유니코드 정규화(NFC, macOS 등에서 NFD로 오는 경우)/대소문자/공백 차이를 흡수
+    s = unicodedata.normalize("NFC", unquote(job_slug)).strip().lower()
+    return re.sub(r"[\s/]+", "-", s)
+
+
+# 정규화된 슬러그 → 디스크의 직무 디렉터리명 (기존 배치와 같은 이름)
+JOB_DIR_KEYS: Dict[str, str] = {normalize_job_slug(slug): slug for slug in ALL_JOB_SLUGS}
+
+
+@lru_cache(maxsize=1024)
+def job_dir_key(job_slug: str) -> Optional[str]:
+    return JOB_DIR_KEYS.get(normalize_job_slug(job_slug))
+
+
+# =========================
+# 사용자 디렉터리
+# =========================
+def user_dir_name(user_id: str) -> str:
+    if _SAFE_NAME_RE.fullmatch(user_id) and user_id not in (".", ".."):
+        return user_id
+    return "u-" + hashlib.sha256(user_id.encode("utf-8")).hexdigest()[:32]
+
+
+@lru_cache(maxsize=USER_PATH_CACHE_SIZE)
+def sharded_user_dir(user_id: str, users_dir: Path = USERS_DIR) -> Path:
+    h = hashlib.sha256(user_id.encode("utf-8")).hexdigest()
+    return users_dir / h[0:2] / h[2:4] / user_dir_name(user_id)
+
+
+@lru_cache(maxsize=USER_PATH_CACHE_SIZE)
+def legacy_user_dir(user_id: str, users_dir: Path = USERS_DIR) -> Optional[Path]:
+    # 예전 배치 users/<user_id>. "u-" 변환 없이 원래 user_id 그대로 (예: "google-oauth2|123")
+    # "/"가 있거나 "."/".."이면 예전에도 users/<user_id> 한 단계 디렉터리가 아니었으므로 없음
+    if not user_id or "/" in user_id or "\0" in user_id or user_id in (".", ".."):
+        return None
+    return users_dir / user_id
+
+
+def _legacy_dir_exists(legacy: Path) -> bool:
+    if not _SHARD_RE.fullmatch(legacy.name):
+        return legacy.is_dir()
+    # user_id가 샤드 이름과 같으면 그 디렉터리에 샤드가 아닌 항목(예전 사용자 데이터)이 있을 때만
+    try:
+        return any(not _SHARD_RE.fullmatch(e.name) for e in os.scandir(legacy))
+    except (FileNotFoundError, NotADirectoryError):
+        return False
+
+
+# 샤드 위치에 디렉터리가 있는 것으로 확인된 경로 (한 번 생기면 없어지지 않으므로 다시 확인하지 않음)
+_sharded_seen: Set[Path] = set()
+
+
+def user_base_dir(user_id: str, users_dir: Path = USERS_DIR) -> Path:
+    path = sharded_user_dir(user_id, users_dir)
+    if not USER_LAYOUT_LEGACY_FALLBACK or path in _sharded_seen:
+        return path
+    if path.exists():
+        if len(_sharded_seen) >= USER_PATH_CACHE_SIZE:
+            _sharded_seen.clear()
+        _sharded_seen.add(path)
+        return path
+    legacy = legacy_user_dir(user_id, users_dir)
+    if legacy is not None and _legacy_dir_exists(legacy):
+        USER_LAYOUT_LEGACY_HITS.inc()
+        return legacy
+    return path
+
+
+def user_job_dir(user_id: str, job_slug: str) -> Path:
+    key = job_dir_key(job_slug)
+    if key is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return user_base_dir(user_id) / key
+
+
+def user_doc_dir(user_id: str, job_slug: str, doc_type: str) -> Path:
+    if doc_type not in DOC_TYPES:
+        raise HTTPException(status_code=404, detail="Unknown document type")
+    return user_job_dir(user_id, job_slug) / doc_type
+
+
+def user_company_file(user_id: str) -> Path:
+    return user_base_dir(user_id) / "companies" / "current_company_analysis.json"
+
+
+def user_profile_file(user_id: str) -> Path:
+    return user_base_dir(user_id) / "profile.json"
+
+
+# =========================
+# 전체 순회 (백그라운드 작업/CLI용)
+# =========================
+def _is_shard_name(name: str) -> bool:
+    return bool(_SHARD_RE.fullmatch(name))
+
+
+def iter_legacy_user_dirs(users_dir: Path = USERS_DIR) -> Iterator[Path]:
+    if not users_dir.is_dir():
+        return
+    for e in os.scandir(users_dir):
+        if e.name.startswith(".") or not e.is_dir(follow_symlinks=False):
+            continue  # 잠금 파일, 이동 후 남긴 심볼릭 링크
+        # 2자리 16진수 이름은 샤드 디렉터리. 기존 배치의 user_id가 우연히 같은 경우에만 다른 항목이 섞여 있음
+        if not _is_shard_name(e.name) or any(not _is_shard_name(c.name) for c in os.scandir(e.path)):
+            yield Path(e.path)
+
+
+def iter_sharded_user_dirs(users_dir: Path = USERS_DIR) -> Iterator[Path]:
+    if not users_dir.is_dir():
+        return
+    for a in sorted(os.scandir(users_dir), key=lambda e: e.name):
+        if not (_is_shard_name(a.name) and a.is_dir(follow_symlinks=False)):
+            continue
+        for b in sorted(os.scandir(a.path), key=lambda e: e.name):
+            if not (_is_shard_name(b.name) and b.is_dir(follow_symlinks=False)):
+                continue
+            for u in sorted(os.scandir(b.path), key=lambda e: e.name):
+                if u.is_dir(follow_symlinks=False):
+                    yield Path(u.path)
+
+
+def iter_user_dirs(users_dir: Path = USERS_DIR) -> Iterator[Path]:
+    """모든 사용자 디렉터리 (샤드 배치 + 아직 옮기지 않은 기존 배치). 심볼릭 링크는 건너뛰어 중복 없음."""
+    yield from iter_sharded_user_dirs(users_dir)
+    yield from iter_legacy_user_dirs(users_dir)
+
+
+def iter_doc_dirs(user_dir: Path) -> Iterator[Path]:
+    # <user>/<job>/<doc_type> (companies, 그리고 위와 같은 경우 섞여 있는 샤드 디렉터리는 제외)
+    for d in user_dir.glob("*/*"):
+        if d.is_dir() and d.parent.name != "companies" and not _is_shard_name(d.parent.name):
+            yield d
+
+
+# =========================
+# 이동 (기존 배치 → 샤드 배치)
+# =========================
+def _merge_into(src: Path, dst: Path, report: Dict[str, Any]) -> None:
+    # 이동 도중 기존 경로에 새로 생긴 파일을 샤드 쪽으로 합침. 양쪽에 있는 파일은 건드리지 않고 보고
+    for root, _, files in os.walk(src):
+        rel = Path(root).relative_to(src)
+        for f in files:
+            s, d = Path(root) / f, dst / rel / f
+            if d.exists():
+                if f != ".lock":
+                    report["conflicts"].append(str(s))
+                continue
+            d.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(s, d)
+
+
+def _normalize_job_dirs(user_dir: Path, dry_run: bool, report: Dict[str, Any]) -> None:
+    # 예전에 unquote만 거쳐 저장된 직무 디렉터리(인코딩/정규화 차이)를 표준 이름으로
+    for e in os.scandir(user_dir):
+        if not e.is_dir(follow_symlinks=False) or e.name == "companies" or _is_shard_name(e.name):
+            continue
+        key = job_dir_key(e.name)
+        if key is None:
+            report["unknown_job_dirs"].append(e.path)
+        elif key != e.name:
+            target = user_dir / key
+            if target.exists():
+                report["conflicts"].append(e.path)
+            else:
+                if not dry_run:
+                    os.rename(e.path, target)
+                report["renamed_job_dirs"] += 1
+
+
+def _absorb(legacy: Path, target: Path, report: Dict[str, Any]) -> bool:
+    # legacy에 있는 파일을 target으로 합치고 비운 legacy를 지움. 충돌이 있으면 그대로 두고 False
+    _merge_into(legacy, target, report)
+    if report["conflicts"]:
+        return False
+    shutil.rmtree(legacy)  # 남은 것은 빈 디렉터리와 .lock뿐
+    return True
+
+
+def migrate_user_dir(legacy: Path, users_dir: Path = USERS_DIR, dry_run: bool = False) -> Dict[str, Any]:
+    report: Dict[str, Any] = {"migrated": 0, "renamed_job_dirs": 0, "conflicts": [], "unknown_job_dirs": []}
+    user_id = legacy.name
+    target = sharded_user_dir(user_id, users_dir)
+    _normalize_job_dirs(legacy, dry_run, report)
+    if dry_run:
+        report["migrated"] = 1
+        return report
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    if _is_shard_name(user_id):
+        # 샤드 디렉터리와 이름이 같은 사용자: 샤드가 아닌 항목만 하나씩 옮김 (대체 경로를 쓰지 않으므로 링크 없음)
+        target.mkdir(exist_ok=True)
+        for e in os.scandir(legacy):
+            if _is_shard_name(e.name):
+                continue
+            if (target / e.name).exists():
+                report["conflicts"].append(e.path)
+            else:
+                os.rename(e.path, target / e.name)
+        report["migrated"] = int(not report["conflicts"])
+        return report
+    if target.exists():
+        # 대체 경로를 끈 채로 서비스하다가 샤드 쪽에 먼저 생긴 경우
+        if not _absorb(legacy, target, report):
+            return report
+    else:
+        os.rename(legacy, target)
+    # 기존 경로에 링크를 둠 (임시 이름으로 만든 뒤 교체 → 링크가 없는 순간이 최소)
+    tmp = users_dir / f".{user_id}.link.tmp"
+    tmp.unlink(missing_ok=True)
+    os.symlink(os.path.relpath(target, users_dir), tmp)
+    try:
+        os.replace(tmp, legacy)
+    except OSError:
+        # rename과 링크 사이에 처리 중이던 요청이 기존 경로를 다시 만든 경우 → 합친 뒤 한 번 더
+        if legacy.is_symlink() or not legacy.is_dir() or not _absorb(legacy, target, report):
+            tmp.unlink(missing_ok=True)
+            return report
+        os.replace(tmp, legacy)
+    report["migrated"] = 1
+    return report
+
+
+def migrate_all(users_dir: Path = USERS_DIR, batch_size: int = USER_MIGRATION_BATCH_SIZE,
+                pause: float = USER_MIGRATION_PAUSE_SEC, dry_run: bool = False, limit: int = 0) -> Dict[str, Any]:
+    total: Dict[str, Any] = {"migrated": 0, "renamed_job_dirs": 0, "failed": 0, "conflicts": [], "unknown_job_dirs": []}
+    batch: List[Path] = []
+
+    def _flush():
+        for legacy in batch:
+            try:
+                r = migrate_user_dir(legacy, users_dir, dry_run)
+            except OSError as e:
+                print(f"[user-paths] {legacy}: {e}")
+                total["failed"] += 1
+                continue
+            total["migrated"] += r["migrated"]
+            total["renamed_job_dirs"] += r["renamed_job_dirs"]
+            total["conflicts"] += r["conflicts"]
+            total["unknown_job_dirs"] += r["unknown_job_dirs"]
+        print(f"[user-paths] {total['migrated']} users migrated" + (" (dry run)" if dry_run else ""))
+        batch.clear()
+
+    # 목록을 한꺼번에 만들지 않고 배치 단위로 옮긴 뒤 잠시 쉼 (서비스 I/O와 경쟁 완화)
+    # 순회 중 바뀐 항목(링크로 바뀐 것)은 건너뜀. 놓친 사용자는 다시 실행하면 이어서 처리
+    for legacy in iter_legacy_user_dirs(users_dir):
+        if limit and total["migrated"] + len(batch) >= limit:
+            break
+        batch.append(legacy)
+        if len(batch) >= batch_size:
+            _flush()
+            if pause:
+                time.sleep(pause)
+    if batch:
+        _flush()
+    return total
+
+
+def prune_links(users_dir: Path = USERS_DIR, older_than: float = 3600, dry_run: bool = False) -> int:
+    # 이동 후 남긴 기존 경로 링크 제거 (그 사이 시작된 요청이 모두 끝났을 만큼 지난 것만)
+    removed = 0
+    now = time.time()
+    for e in os.scandir(users_dir):
+        if not e.is_symlink():
+            continue
+        if now - e.stat(follow_symlinks=False).st_mtime < older_than:
+            continue
+        if not dry_run:
+            os.unlink(e.path)
+        removed += 1
+    return removed
+
+
+def layout_status(users_dir: Path = USERS_DIR) -> Dict[str, int]:
+    links = sum(1 for e in os.scandir(users_dir) if e.is_symlink()) if users_dir.is_dir() else 0
+    return {
+        "sharded_users": sum(1 for _ in iter_sharded_user_dirs(users_dir)),
+        "legacy_users": sum(1 for _ in iter_legacy_user_dirs(users_dir)),
+        "legacy_links": links,
+    }
+
+
+# =========================
+# CLI
+# =========================
+def main():
+    import fastjson
+
+    parser = argparse.ArgumentParser(description="Sharded user directory layout")
+    parser.add_argument("--users-dir", default=str(USERS_DIR))
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="Count users per layout")
+    mig = sub.add_parser("migrate", help="Move legacy users/<user_id> directories into the sharded layout")
+    mig.add_argument("--batch-size", type=int, default=USER_MIGRATION_BATCH_SIZE)
+    mig.add_argument("--pause", type=float, default=USER_MIGRATION_PAUSE_SEC, help="Seconds to sleep between batches")
+    mig.add_argument("--limit", type=int, default=0, help="Stop after this many users (0 = all)")
+    mig.add_argument("--dry-run", action="store_true")
+    prune = sub.add_parser("prune-links", help="Remove compatibility symlinks left by migrate")
+    prune.add_argument("--older-than", type=float, default=3600)
+    prune.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    users_dir = Path(args.users_dir)
+    if args.command == "status":
+        print(fastjson.dumps(layout_status(users_dir)).decode("utf-8"))
+    elif args.command == "migrate":
+        report = migrate_all(users_dir, args.batch_size, args.pause, args.dry_run, args.limit)
+        print(fastjson.dumps(report).decode("utf-8"))
+    else:
+        n = prune_links(users_dir, args.older_than, args.dry_run)
+        print(f"{'would remove' if args.dry_run else 'removed'} {n} links")
+
+
+if __name__ == "__main__":
+    main()
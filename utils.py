@@ -7,64 +7,114 @@ import os
 import aiofiles
 import json
 import traceback
-from urllib.parse import unquote
 import hashlib
-import PyPDF2
-import numpy as np
-import io
-from fpdf import FPDF
-
-from job_data import JOB_CATEGORIES, JOB_DETAILS
-from prompts import get_document_analysis_prompt, get_company_analysis_prompt
-from openai import OpenAI
-from dotenv import load_dotenv
-
-load_dotenv()
+import asyncio
+import zlib
+import time
+
+from job_data import JOB_DETAILS, JOB_SLUG_TO_TITLE, DOC_SECTION_KEYS
+from prompts import get_document_analysis_prompt, get_company_analysis_prompt, get_portfolio_chunk_prompt
+from text_diff import change_stats, section_text
+from user_paths import USERS_DIR, job_dir_key, user_job_dir, user_doc_dir, user_company_file  # 사용자별 경로 (샤드 배치)
+from metrics import Counter, stage_timer, record_cache, record_openai_call, OPENAI_IN_FLIGHT
+from ratelimit import llm_scheduler, estimate_tokens
+import fastjson
+from fastjson import FastJSONResponse
+from cache import get_cache, make_key
+from user_cache import user_doc_cache
+from uploads import spool_upload, discard_spooled
+from version_store import list_version_files, write_versions
+from resilience import (
+    call_openai,
+    circuit_open,
+    raise_if_open,
+    unavailable,
+    CircuitOpenError,
+    BudgetExhaustedError,
+)
+from embeddings import (
+    OPENAI_EMBEDDING_MODEL,
+    EMBEDDING_BACKEND,
+    EMBEDDING_FALLBACK,
+    local_vectorizer,
+    embedding_model_of,
+    document_embedding_text,
+    cosine_scores,
+)
 
 # =========================
 # OpenAI 설정
 # =========================
 OPENAI_MODEL = "gpt-4o"
-OPENAI_EMBEDDING_MODEL = "text-embedding-3-small"
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+_client = None
+
+
+def get_openai_client():
+    # openai 패키지 import(수백 ms)와 클라이언트 생성을 첫 사용(또는 warmup)까지 미룸
+    # OPENAI_BASE_URL로 로컬 대역 서버(bench/fake_openai.py) 등을 가리킬 수 있음
+    global _client
+    if _client is None:
+        from openai import AsyncOpenAI
+
+        _client = AsyncOpenAI(  # 이벤트 루프를 막지 않도록 비동기 클라이언트 사용
+            api_key=os.getenv("OPENAI_API_KEY"),
+            base_url=os.getenv("OPENAI_BASE_URL") or None,
+            max_retries=0,  # 재시도/백오프는 resilience.call_openai에서 (요청 예산 안에서만)
+        )
+    return _client
+
+# =========================
+# 모델 티어 (변경 규모 기반 라우팅)
+# =========================
+# 작은 수정은 빠르고 저렴한 모델, 큰 수정/첫 분석은 전체 모델
+MODEL_TIERS: Dict[str, Dict[str, Any]] = {
+    "light": {
+        "model": os.getenv("OPENAI_MODEL_LIGHT", "gpt-4o-mini"),
+        "timeout": float(os.getenv("OPENAI_TIMEOUT_LIGHT", "30")),
+        "max_tokens": int(os.getenv("OPENAI_MAX_TOKENS_LIGHT", "2000")),
+    },
+    "full": {
+        "model": os.getenv("OPENAI_MODEL_FULL", OPENAI_MODEL),
+        "timeout": float(os.getenv("OPENAI_TIMEOUT_FULL", "90")),
+        "max_tokens": int(os.getenv("OPENAI_MAX_TOKENS_FULL", "4000")),
+    },
+}
+TIER_SMALL_EDIT_CHARS = int(os.getenv("TIER_SMALL_EDIT_CHARS", "300"))     # 이하 변경 글자 수면 light
+TIER_SMALL_EDIT_RATIO = float(os.getenv("TIER_SMALL_EDIT_RATIO", "0.15"))  # 이하 변경 비율이면 light
+TIER_LONG_DOC_CHARS = int(os.getenv("TIER_LONG_DOC_CHARS", "8000"))        # 이보다 긴 문서는 항상 full
+
+OPENAI_EMBEDDING_TIMEOUT = float(os.getenv("OPENAI_EMBEDDING_TIMEOUT", "10"))
+OPENAI_COMPANY_TIMEOUT = float(os.getenv("OPENAI_COMPANY_TIMEOUT", "90"))
+# full 티어 서킷이 열려 있으면 light 티어로 대체
+OPENAI_DEGRADE_TO_LIGHT = os.getenv("OPENAI_DEGRADE_TO_LIGHT", "1") not in ("0", "false", "False")
+OPENAI_DEGRADED = Counter("openai_degraded_total", "Responses served in a degraded mode while a circuit was open", ("kind",))
+
+# 근사 중복(오타/공백 수정) 판단 기준: 임베딩 유사도 이상 + 변경 글자 수 이하
+NEAR_DUP_SIMILARITY = float(os.getenv("NEAR_DUP_SIMILARITY", "0.985"))
+NEAR_DUP_MAX_CHAR_DIFF = int(os.getenv("NEAR_DUP_MAX_CHAR_DIFF", "20"))
+
+# 유사 이력 검색 후보: 최신 N개 이전 버전만 (embedding이 비어 있으면 이 후보에 한해 다시 계산)
+RETRIEVAL_MAX_CANDIDATES = int(os.getenv("RETRIEVAL_MAX_CANDIDATES", "10"))
 
 # =========================
 # 경로
 # =========================
 BASE_DIR = Path(__file__).resolve().parent
 DATA_DIR = BASE_DIR / "data"
-USERS_DIR = DATA_DIR / "users"
-os.makedirs(DATA_DIR, exist_ok=True)
-os.makedirs(USERS_DIR, exist_ok=True)
-
-# ---- 사용자별 경로 헬퍼 ----
-def _user_base_dir(user_id: str) -> Path:
-    return USERS_DIR / user_id
-
-def _user_job_dir(user_id: str, job_slug: str) -> Path:
-    return _user_base_dir(user_id) / unquote(job_slug)
-
-def _user_doc_dir(user_id: str, job_slug: str, doc_type: str) -> Path:
-    return _user_job_dir(user_id, job_slug) / doc_type
-
-def _user_company_file(user_id: str) -> Path:
-    return _user_base_dir(user_id) / "companies" / "current_company_analysis.json"
+PDF_FONT_PATH = BASE_DIR / "static" / "fonts" / "NotoSansKR-Regular.ttf"
 
 # =========================
 # 공통 유틸
 # =========================
 def get_job_title_from_slug(job_slug: str) -> Optional[str]:
-    decoded_job_slug = unquote(job_slug)
-    for category_jobs in JOB_CATEGORIES.values():
-        for j_title in category_jobs:
-            normalized_j_title_slug = j_title.replace(" ", "-").replace("/", "-").lower()
-            if normalized_j_title_slug == decoded_job_slug:
-                return j_title
-    return None
+    key = job_dir_key(job_slug)
+    return JOB_SLUG_TO_TITLE.get(key) if key else None
 
 def _cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
     if not vec1 or not vec2 or len(vec1) != len(vec2):
         return 0.0
+    import numpy as np
+
     vec1_np = np.array(vec1)
     vec2_np = np.array(vec2)
     dot_product = np.dot(vec1_np, vec2_np)
@@ -78,6 +128,98 @@ def calculate_content_hash(content: Dict[str, Any]) -> str:
     sorted_items_str = json.dumps(content, ensure_ascii=False, sort_keys=True)
     return hashlib.sha256(sorted_items_str.encode("utf-8")).hexdigest()
 
+def calculate_section_hashes(doc_type: str, content: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    # 섹션별 해시 (resume/cover_letter만). 변경된 섹션만 재분석하는 데 사용
+    c = content or {}
+    return {k: calculate_content_hash({k: c.get(k)}) for k in DOC_SECTION_KEYS.get(doc_type, [])}
+
+def get_changed_sections(
+    doc_type: str,
+    content: Dict[str, Any],
+    previous_document_data: Optional[Dict[str, Any]],
+) -> Tuple[Optional[List[str]], Dict[str, str]]:
+    """
+    이전 버전과 비교해 (재분석할 섹션 목록, 재사용할 기존 피드백)을 반환합니다.
+    섹션 구조가 없거나 재사용할 피드백이 없으면 (None, {}) → 전체 분석.
+    """
+    keys = DOC_SECTION_KEYS.get(doc_type)
+    if not keys or not previous_document_data:
+        return None, {}
+    prev_feedbacks = previous_document_data.get("individual_feedbacks") or {}
+    prev_hashes = previous_document_data.get("section_hashes") or calculate_section_hashes(
+        doc_type, previous_document_data.get("content")
+    )
+    cur_hashes = calculate_section_hashes(doc_type, content)
+    changed = [k for k in keys if cur_hashes[k] != prev_hashes.get(k) or not prev_feedbacks.get(k)]
+    reused = {k: prev_feedbacks[k] for k in keys if k not in changed}
+    if not reused:
+        return None, {}
+    return changed, reused
+
+# =========================
+# 모델 티어 선택 & 사용량 기록
+# =========================
+def select_model_tier(
+    doc_type: str,
+    document_content: Dict[str, Any],
+    previous_document_data: Optional[Dict[str, Any]] = None,
+) -> Tuple[str, str]:
+    """(티어, 선택 사유)를 반환합니다."""
+    keys = DOC_SECTION_KEYS.get(doc_type)
+    if not keys:
+        return "full", "unsectioned_doc_type"
+    if not previous_document_data or not previous_document_data.get("feedback"):
+        return "full", "first_analysis"
+    prev_content = previous_document_data.get("content") or {}
+    if previous_document_data.get("content_hash") == calculate_content_hash(document_content):
+        return "light", "unchanged"
+
+    total_chars = 0
+    changed_chars = 0
+    for k in keys:
+        old_text = section_text(doc_type, prev_content, k)
+        new_text = section_text(doc_type, document_content, k)
+        total_chars += max(len(old_text), len(new_text))
+        changed_chars += change_stats(old_text, new_text)["changed_chars"]
+
+    if total_chars > TIER_LONG_DOC_CHARS:
+        return "full", "long_document"
+    ratio = changed_chars / max(total_chars, 1)
+    if changed_chars <= TIER_SMALL_EDIT_CHARS and ratio <= TIER_SMALL_EDIT_RATIO:
+        return "light", f"small_edit({changed_chars}chars,{ratio:.0%})"
+    return "full", f"major_edit({changed_chars}chars,{ratio:.0%})"
+
+def is_minor_change(
+    doc_type: str,
+    document_content: Dict[str, Any],
+    embedding: Optional[List[float]],
+    previous_document_data: Optional[Dict[str, Any]],
+    embedding_model: Optional[str],
+) -> bool:
+    # 이전 버전 피드백을 그대로 재사용해도 되는 수준의 변경인지 (공백 차이는 무시)
+    keys = DOC_SECTION_KEYS.get(doc_type)
+    if not keys or not embedding or not previous_document_data:
+        return False
+    if not previous_document_data.get("feedback") or not previous_document_data.get("embedding"):
+        return False
+    if not previous_document_data.get("summary"):
+        return False  # summary 필드 이전에 저장된 버전은 재사용할 요약이 없음
+    if embedding_model_of(previous_document_data) != embedding_model:
+        return False  # 다른 모델의 벡터끼리는 비교하지 않음
+    prev_content = previous_document_data.get("content") or {}
+    changed_chars = 0
+    for k in keys:
+        old_text = " ".join(section_text(doc_type, prev_content, k).split())
+        new_text = " ".join(section_text(doc_type, document_content, k).split())
+        changed_chars += change_stats(old_text, new_text)["changed_chars"]
+        if changed_chars > NEAR_DUP_MAX_CHAR_DIFF:
+            return False
+    return float(_cosine_similarity(embedding, previous_document_data["embedding"])) >= NEAR_DUP_SIMILARITY
+
+def _record_tier_usage(tier: str, latency_sec: float, usage: Any = None, error: bool = False) -> None:
+    # 티어별 호출 수/지연/토큰은 /metrics (openai_* 메트릭, tier 라벨)로 노출
+    record_openai_call("chat", MODEL_TIERS[tier]["model"], tier, latency_sec, usage, error)
+
 # =========================
 # OpenAI 호출
 # =========================
@@ -90,6 +232,10 @@ async def get_ai_feedback(
     additional_user_context: Optional[str] = None,
     company_name: Optional[str] = None,
     company_analysis: Optional[Dict[str, Any]] = None,
+    target_sections: Optional[List[str]] = None,
+    reused_feedbacks: Optional[Dict[str, str]] = None,
+    model_tier: str = "full",
+    user_id: Optional[str] = None,
 ) -> JSONResponse:
     try:
         job_detail = JOB_DETAILS.get(job_title)
@@ -105,30 +251,71 @@ async def get_ai_feedback(
             additional_user_context=additional_user_context,
             company_name=company_name,
             company_analysis=company_analysis,
+            target_sections=target_sections,
+            reused_feedbacks=reused_feedbacks,
         )
         if user_prompt.startswith("오류:"):
-            return JSONResponse(content={"error": user_prompt}, status_code=400)
-
-        response = client.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=[
-                {"role": "system", "content": system_instruction},
-                {"role": "user", "content": user_prompt},
-            ],
-            response_format={"type": "json_object"},
-        )
+            return FastJSONResponse(content={"error": user_prompt}, status_code=400)
+
+        tier_name = model_tier if model_tier in MODEL_TIERS else "full"
+        if tier_name == "full" and OPENAI_DEGRADE_TO_LIGHT and circuit_open(f"chat:{MODEL_TIERS['full']['model']}"):
+            # 전체 모델이 장애 중이면 light 모델로라도 응답 (품질보다 가용성)
+            print(f"[model-tier] {MODEL_TIERS['full']['model']} circuit open, degrading to light tier")
+            OPENAI_DEGRADED.inc(kind="feedback_light_tier")
+            tier_name = "light"
+        tier = MODEL_TIERS[tier_name]
+        # 같은 프롬프트(모델/출력 한도 포함)는 워커와 상관없이 공유 캐시에서 재사용
+        feedback_cache = get_cache("feedback")
+        cache_key = make_key(tier["model"], tier["max_tokens"], system_instruction, user_prompt)
+        parsed_feedback = feedback_cache.get(cache_key)
+        from_cache = parsed_feedback is not None
+        if not from_cache:
+            # 예약 토큰 = 프롬프트 추정치 + 최대 출력 (호출 후 실제 사용량으로 정산)
+            est_tokens = estimate_tokens(system_instruction) + estimate_tokens(user_prompt) + tier["max_tokens"]
+            circuit = f"chat:{tier['model']}"
+            raise_if_open(circuit)
+            async with llm_scheduler.slot(user_id, est_tokens) as slot:
+                started = time.perf_counter()
+                OPENAI_IN_FLIGHT.inc(kind="chat")
+                try:
+                    response = await call_openai(circuit, lambda timeout: get_openai_client().chat.completions.create(
+                        model=tier["model"],
+                        messages=[
+                            {"role": "system", "content": system_instruction},
+                            {"role": "user", "content": user_prompt},
+                        ],
+                        response_format={"type": "json_object"},
+                        max_tokens=tier["max_tokens"],
+                        timeout=timeout,
+                    ), tier["timeout"])
+                except Exception:
+                    _record_tier_usage(tier_name, time.perf_counter() - started, error=True)
+                    raise
+                finally:
+                    OPENAI_IN_FLIGHT.dec(kind="chat")
+                slot.actual_tokens = getattr(response.usage, "total_tokens", None)
+            _record_tier_usage(tier_name, time.perf_counter() - started, response.usage)
 
-        ai_raw_response = response.choices[0].message.content.strip()
-        parsed_feedback = json.loads(ai_raw_response)
+            ai_raw_response = response.choices[0].message.content.strip()
+            parsed_feedback = json.loads(ai_raw_response)
 
         summary_text = parsed_feedback.get("summary", "요약 내용을 생성할 수 없습니다.")
         overall_feedback = parsed_feedback.get("overall_feedback", "AI 피드백을 생성하는 데 문제가 발생했습니다.")
         individual_feedbacks = parsed_feedback.get("individual_feedbacks", {})
 
         if "unable to access external URLs" in overall_feedback:
-            return JSONResponse(content={"error": overall_feedback}, status_code=400)
-
-        return JSONResponse(
+            return FastJSONResponse(content={"error": overall_feedback}, status_code=400)
+        if not from_cache:
+            feedback_cache.set(cache_key, parsed_feedback)
+
+        # 부분 재분석: 재분석한 섹션만 새 피드백, 나머지는 기존 피드백 유지
+        if target_sections is not None:
+            individual_feedbacks = {
+                k: (individual_feedbacks.get(k, "") if k in target_sections else (reused_feedbacks or {}).get(k, ""))
+                for k in DOC_SECTION_KEYS.get(doc_type, [])
+            }
+
+        return FastJSONResponse(
             content={
                 "summary": summary_text,
                 "overall_feedback": overall_feedback,
@@ -137,8 +324,13 @@ async def get_ai_feedback(
             status_code=200,
         )
 
+    except HTTPException:
+        # 429(Retry-After) 등은 그대로 전달
+        raise
+    except (CircuitOpenError, BudgetExhaustedError) as e:
+        raise unavailable(e)
     except json.JSONDecodeError:
-        return JSONResponse(
+        return FastJSONResponse(
             content={
                 "summary": "AI 응답 파싱 오류로 요약 불가",
                 "overall_feedback": "AI 응답 파싱 오류: 유효한 JSON 형식이 아닙니다.",
@@ -148,64 +340,132 @@ async def get_ai_feedback(
         )
     except Exception as e:
         traceback.print_exc()
-        return JSONResponse(content={"error": f"AI 요약 오류: {e}"}, status_code=500)
+        return FastJSONResponse(content={"error": f"AI 요약 오류: {e}"}, status_code=500)
+
+EMBEDDING_FALLBACKS = Counter("embedding_fallbacks_total", "Embeddings served by the local backend after an OpenAI failure")
+
 
-async def get_embedding(text: str) -> List[float]:
+async def get_embedding(text: str, user_id: Optional[str] = None) -> Tuple[str, List[float]]:
+    """(모델 ID, 벡터). 저장할 때 모델 ID를 "embedding_model"로 함께 기록."""
+    text = text.replace("\n", " ")
+    if EMBEDDING_BACKEND == "local":
+        local = local_vectorizer()
+        return local.model_id, local.embed(text)
     try:
-        text = text.replace("\n", " ")
-        response = client.embeddings.create(input=text, model=OPENAI_EMBEDDING_MODEL)
-        return response.data[0].embedding
+        embedding_cache = get_cache("embedding")
+        cache_key = make_key(OPENAI_EMBEDDING_MODEL, text)
+        cached = embedding_cache.get(cache_key)
+        if cached is not None:
+            return OPENAI_EMBEDDING_MODEL, cached
+        circuit = f"embedding:{OPENAI_EMBEDDING_MODEL}"
+        raise_if_open(circuit)
+        # 임베딩은 분석 요청에 딸린 호출이므로 사용자 요청 수 한도에서는 차감하지 않음 (토큰/전역 한도만)
+        async with llm_scheduler.slot(user_id, estimate_tokens(text), requests=0) as slot:
+            started = time.perf_counter()
+            OPENAI_IN_FLIGHT.inc(kind="embedding")
+            try:
+                response = await call_openai(circuit, lambda timeout: get_openai_client().embeddings.create(
+                    input=text, model=OPENAI_EMBEDDING_MODEL, timeout=timeout,
+                ), OPENAI_EMBEDDING_TIMEOUT)
+            except Exception:
+                record_openai_call("embedding", OPENAI_EMBEDDING_MODEL, "embedding", time.perf_counter() - started, error=True)
+                raise
+            finally:
+                OPENAI_IN_FLIGHT.dec(kind="embedding")
+            slot.actual_tokens = getattr(response.usage, "total_tokens", None)
+        record_openai_call("embedding", OPENAI_EMBEDDING_MODEL, "embedding", time.perf_counter() - started, response.usage)
+        embedding = response.data[0].embedding
+        embedding_cache.set(cache_key, embedding)
+        return OPENAI_EMBEDDING_MODEL, embedding
     except Exception as e:
-        print(f"Error generating embedding: {e}")
-        raise HTTPException(status_code=500, detail=f"Embedding generation failed: {e}")
+        if EMBEDDING_FALLBACK != "local":
+            if isinstance(e, HTTPException):
+                raise
+            if isinstance(e, (CircuitOpenError, BudgetExhaustedError)):
+                raise unavailable(e)
+            print(f"Error generating embedding: {e}")
+            raise HTTPException(status_code=500, detail=f"Embedding generation failed: {e}")
+        # API 장애/한도 초과여도 분석은 계속 (로컬 벡터는 모델 ID가 달라 OpenAI 벡터와 섞이지 않음)
+        print(f"Embedding via OpenAI failed, using local backend: {e}")
+        EMBEDDING_FALLBACKS.inc()
+        local = local_vectorizer()
+        return local.model_id, local.embed(text)
 
 # =========================
 # 기업 분석 로드/저장 (사용자별)
 # =========================
 async def load_company_analysis(user_id: str) -> Optional[Dict[str, Any]]:
-    path = _user_company_file(user_id)
+    path = user_company_file(user_id)
     if not path.exists():
         return None
-    async with aiofiles.open(str(path), "r", encoding="utf-8") as f:
+    async with aiofiles.open(str(path), "rb") as f:
         content = await f.read()
     try:
-        return json.loads(content)
+        return fastjson.loads(content)
     except Exception:
         return None
 
-async def perform_company_analysis(company_name: str, file_path: str | Path) -> JSONResponse:
+async def perform_company_analysis(company_name: str, file_path: str | Path, user_id: Optional[str] = None) -> JSONResponse:
     try:
         existing: Optional[Dict[str, Any]] = None
         if Path(file_path).exists():
-            async with aiofiles.open(str(file_path), "r", encoding="utf-8") as f:
+            async with aiofiles.open(str(file_path), "rb") as f:
                 try:
-                    loaded = json.loads(await f.read())
+                    loaded = fastjson.loads(await f.read())
                     if loaded.get("company_name") == company_name:
                         existing = loaded
                 except Exception:
                     existing = None
+        record_cache("company_analysis", existing is not None)
         if existing:
-            return JSONResponse(
+            return FastJSONResponse(
                 content={"message": f"'{company_name}' 기업 분석을 성공적으로 불러왔습니다.", "company_analysis": existing}
             )
 
         system_instruction, user_prompt = get_company_analysis_prompt(company_name)
-        response = client.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=[{"role": "system", "content": system_instruction}, {"role": "user", "content": user_prompt}],
-            response_format={"type": "json_object"},
-        )
-
-        ai_raw_response = response.choices[0].message.content.strip()
-        parsed_analysis = json.loads(ai_raw_response)
+        # 같은 기업 분석은 사용자/워커 간에 공유 (기업 분석 결과는 사용자와 무관)
+        company_cache = get_cache("company")
+        cache_key = make_key(OPENAI_MODEL, system_instruction, user_prompt)
+        parsed_analysis = company_cache.get(cache_key)
+        if parsed_analysis is None:
+            # 출력 길이 제한이 없으므로 출력은 넉넉히 2000토큰으로 예약
+            est_tokens = estimate_tokens(system_instruction) + estimate_tokens(user_prompt) + 2000
+            circuit = f"chat:{OPENAI_MODEL}"
+            raise_if_open(circuit)
+            async with llm_scheduler.slot(user_id, est_tokens) as slot:
+                started = time.perf_counter()
+                OPENAI_IN_FLIGHT.inc(kind="chat")
+                try:
+                    response = await call_openai(circuit, lambda timeout: get_openai_client().chat.completions.create(
+                        model=OPENAI_MODEL,
+                        messages=[{"role": "system", "content": system_instruction}, {"role": "user", "content": user_prompt}],
+                        response_format={"type": "json_object"},
+                        timeout=timeout,
+                    ), OPENAI_COMPANY_TIMEOUT)
+                except Exception:
+                    record_openai_call("chat", OPENAI_MODEL, "company", time.perf_counter() - started, error=True)
+                    raise
+                finally:
+                    OPENAI_IN_FLIGHT.dec(kind="chat")
+                slot.actual_tokens = getattr(response.usage, "total_tokens", None)
+            record_openai_call("chat", OPENAI_MODEL, "company", time.perf_counter() - started, response.usage)
+
+            ai_raw_response = response.choices[0].message.content.strip()
+            parsed_analysis = json.loads(ai_raw_response)
+            company_cache.set(cache_key, parsed_analysis)
         parsed_analysis["company_name"] = company_name
 
         path = Path(file_path)
         os.makedirs(path.parent, exist_ok=True)
-        async with aiofiles.open(str(path), "w", encoding="utf-8") as f:
-            await f.write(json.dumps(parsed_analysis, ensure_ascii=False, indent=4))
+        async with aiofiles.open(str(path), "wb") as f:
+            await f.write(fastjson.dumps(parsed_analysis))
+        user_doc_cache.invalidate(path)  # load_last_company_analysis가 다음 요청에서 새 파일을 읽도록
 
-        return JSONResponse(content={"message": f"'{company_name}' 기업 분석을 성공적으로 완료했습니다.", "company_analysis": parsed_analysis})
+        return FastJSONResponse(content={"message": f"'{company_name}' 기업 분석을 성공적으로 완료했습니다.", "company_analysis": parsed_analysis})
+    except HTTPException:
+        raise
+    except (CircuitOpenError, BudgetExhaustedError) as e:
+        raise unavailable(e)
     except Exception as e:
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"기업 분석 중 오류가 발생했습니다: {e}")
@@ -214,7 +474,7 @@ async def perform_company_analysis(company_name: str, file_path: str | Path) ->
 # 파일 시스템 연동 (사용자별)
 # =========================
 async def load_documents_from_file_system(user_id: str, job_slug: str) -> Dict[str, List[Dict[str, Any]]]:
-    base = _user_job_dir(user_id, job_slug)
+    base = user_job_dir(user_id, job_slug)
     loaded_data: Dict[str, List[Dict[str, Any]]] = {"resume": [], "cover_letter": [], "portfolio": []}
     if not base.exists():
         return loaded_data
@@ -224,38 +484,18 @@ async def load_documents_from_file_system(user_id: str, job_slug: str) -> Dict[s
         if not d.exists():
             continue
         versions: List[Dict[str, Any]] = []
-        for p in d.iterdir():
-            if p.is_file() and p.suffix == ".json" and p.name.startswith("v"):
-                async with aiofiles.open(str(p), "r", encoding="utf-8") as f:
+        # HEAD(롤백 포인터) 이하 버전만 (롤백으로 버려진 파일은 GC 전이라도 제외)
+        for name in list_version_files(d):
+            p = d / name
+            if p.is_file():
+                async with aiofiles.open(str(p), "rb") as f:
                     content = await f.read()
                 try:
-                    doc_data = json.loads(content)
+                    doc_data = fastjson.loads(content)
                     doc_data.setdefault("individual_feedbacks", {})
-
-                    # 임베딩 없으면 생성 (신규 스키마 우선)
-                    if "embedding" not in doc_data or not doc_data["embedding"]:
-                        c = doc_data.get("content", {}) or {}
-                        text_to_embed = ""
-                        if doc_type == "cover_letter":
-                            cl_keys = [
-                                "reason_for_application",
-                                "expertise_experience",
-                                "collaboration_experience",
-                                "challenging_goal_experience",
-                                "growth_process",
-                            ]
-                            text_to_embed = " ".join([c.get(k, "") for k in cl_keys])
-                        elif doc_type == "resume":
-                            text_to_embed = " ".join([
-                                json.dumps(c.get("education", []), ensure_ascii=False),
-                                json.dumps(c.get("activities", []), ensure_ascii=False),
-                                json.dumps(c.get("awards", []), ensure_ascii=False),
-                                json.dumps(c.get("certificates", []), ensure_ascii=False),
-                            ])
-                        elif doc_type == "portfolio":
-                            text_to_embed = c.get("summary", "") or ""
-
-                        doc_data["embedding"] = await get_embedding(text_to_embed) if text_to_embed.strip() else []
+                    # 임베딩이 없는 버전(compaction으로 비운 오래된 버전 등)은 여기서 계산하지 않음
+                    # → 검색 후보가 될 때만 _ensure_embedding으로 (embedding 캐시 경유)
+                    doc_data.setdefault("embedding", [])
 
                     versions.append(doc_data)
                 except json.JSONDecodeError:
@@ -271,17 +511,31 @@ async def save_document_to_file_system(user_id: str, document_data: Dict[str, An
     doc_type = document_data["doc_type"]
     version = document_data["version"]
 
-    out_dir = _user_doc_dir(user_id, job_slug, doc_type)
+    out_dir = user_doc_dir(user_id, job_slug, doc_type)
     os.makedirs(out_dir, exist_ok=True)
 
     file_path = out_dir / f"v{version}.json"
-    async with aiofiles.open(str(file_path), "w", encoding="utf-8") as f:
-        await f.write(json.dumps(document_data, ensure_ascii=False, indent=4))
+    payload = fastjson.dumps(document_data)
+    await asyncio.to_thread(write_versions, out_dir, [version], lambda: file_path.write_bytes(payload))
     return True
 
 # =========================
 # 유사 이력 검색 (사용자별)
 # =========================
+async def _ensure_embedding(doc_type: str, entry: Dict[str, Any], user_id: str) -> None:
+    # 메모리에서만 채움 (파일은 compaction이 비운 그대로 둠)
+    if entry.get("embedding"):
+        return
+    text = document_embedding_text(doc_type, entry.get("content", {}))
+    if not text.strip():
+        return
+    try:
+        entry["embedding_model"], entry["embedding"] = await get_embedding(text, user_id=user_id)
+    except HTTPException as e:
+        # 다시 계산하지 못한 버전은 검색 대상에서만 빠짐
+        print(f"Skipping embedding for v{entry.get('version')}: {e.detail}")
+
+
 async def retrieve_relevant_feedback_history(
     user_id: str,
     job_slug: str,
@@ -294,6 +548,10 @@ async def retrieve_relevant_feedback_history(
     loaded_all_docs = await load_documents_from_file_system(user_id, job_slug)
     all_docs_of_type: List[Dict[str, Any]] = [doc for doc in loaded_all_docs.get(doc_type, []) if doc.get("version", 0) < current_version]
     all_docs_of_type.sort(key=lambda x: x.get("version", 0), reverse=True)
+    all_docs_of_type = all_docs_of_type[:RETRIEVAL_MAX_CANDIDATES]
+    if not all_docs_of_type:
+        # 비교할 이전 버전이 없으면 현재 입력 임베딩(긴 포트폴리오 원문이면 수만 토큰)을 만들지 않음
+        return []
 
     # 현재 입력으로부터 임베딩 텍스트 구성
     text_for_current_embedding = ""
@@ -320,16 +578,25 @@ async def retrieve_relevant_feedback_history(
     if not text_for_current_embedding.strip():
         return []
 
-    current_embedding = await get_embedding(text_for_current_embedding)
+    current_model, current_embedding = await get_embedding(text_for_current_embedding, user_id=user_id)
     if not current_embedding:
         return []
 
-    sim_results: List[Tuple[float, Dict[str, Any]]] = []
-    for entry in all_docs_of_type:
-        if "embedding" not in entry or not entry["embedding"]:
-            continue
-        similarity = _cosine_similarity(current_embedding, entry["embedding"])
-        sim_results.append((similarity, entry))
+    # compaction으로 임베딩을 비운 후보만 다시 계산 (텍스트가 같으면 embedding 캐시에서 바로 나옴)
+    await asyncio.gather(*[_ensure_embedding(doc_type, entry, user_id) for entry in all_docs_of_type])
+    candidates = [entry for entry in all_docs_of_type if entry.get("embedding")]
+    if not candidates:
+        return []
+    if all(embedding_model_of(entry) == current_model for entry in candidates):
+        scores = cosine_scores(current_embedding, [entry["embedding"] for entry in candidates])
+    else:
+        # 모델이 섞여 있으면(백엔드 전환, OpenAI 장애 중 로컬 대체 등) 전부 로컬 공간에서 다시 계산해 비교
+        local = local_vectorizer()
+        scores = cosine_scores(
+            local.transform(text_for_current_embedding),
+            [local.transform(document_embedding_text(doc_type, entry.get("content", {}))) for entry in candidates],
+        )
+    sim_results: List[Tuple[float, Dict[str, Any]]] = [(float(sc), entry) for sc, entry in zip(scores, candidates)]
 
     sim_results.sort(key=lambda x: x[0], reverse=True)
     retrieved_history = [entry for sim, entry in sim_results[:top_k]]
@@ -339,6 +606,162 @@ async def retrieve_relevant_feedback_history(
 # =========================
 # 포트폴리오 요약 & PDF
 # =========================
+# 추출 방식이 바뀌면 올려서 이전 캐시를 무효화
+PDF_TEXT_EXTRACTOR = "pypdf2-pages-1"
+
+
+def _extract_pdf_pages(path: Path) -> Dict[str, Any]:
+    # 파일에서 필요한 부분만 읽음 (전체를 메모리에 올리지 않음). CPU 작업이라 스레드에서 호출
+    import PyPDF2  # PDF 업로드에서만 필요하므로 지연 import
+
+    with open(path, "rb") as f:
+        reader = PyPDF2.PdfReader(f)
+        texts = [(page.extract_text() or "") for page in reader.pages]
+    return {
+        "page_count": len(texts),
+        "chars": sum(len(t) for t in texts),
+        "pages": [{"page": i + 1, "chars": len(t), "text": t} for i, t in enumerate(texts)],
+    }
+
+
+async def extract_pdf_pages(path: Path, sha256: str) -> Dict[str, Any]:
+    """업로드 바이트의 SHA-256으로 추출 결과를 캐시. 같은 PDF를 다시 올리면 파싱 생략."""
+    pdf_cache = get_cache("pdf_text")
+    cache_key = make_key(PDF_TEXT_EXTRACTOR, sha256)
+    cached = pdf_cache.get_bytes(cache_key)
+    if cached is not None:
+        return fastjson.loads(zlib.decompress(cached))
+    with stage_timer("portfolio_summary", "pdf_parse"):
+        doc = await asyncio.to_thread(_extract_pdf_pages, path)
+    pdf_cache.set_bytes(cache_key, zlib.compress(fastjson.dumps(doc), 6))
+    return doc
+
+
+# 이 글자 수 이하면 map 없이 전체 텍스트로 한 번에 요약
+PORTFOLIO_DIRECT_MAX_CHARS = int(os.getenv("PORTFOLIO_DIRECT_MAX_CHARS", "6000"))
+PORTFOLIO_CHUNK_CHARS = int(os.getenv("PORTFOLIO_CHUNK_CHARS", "4000"))
+# 구간 수 상한 (넘으면 구간을 키움) → 호출 수와 전체 지연 시간이 문서 길이에 비례해 늘지 않음
+PORTFOLIO_MAX_CHUNKS = int(os.getenv("PORTFOLIO_MAX_CHUNKS", "16"))
+# map 단계 입력 총량 상한 (사용자 분당 토큰 한도 안에 들도록). 넘으면 각 구간을 같은 비율로 앞부분만 사용
+PORTFOLIO_MAP_MAX_CHARS = int(os.getenv("PORTFOLIO_MAP_MAX_CHARS", "80000"))
+PORTFOLIO_MAP_CONCURRENCY = int(os.getenv("PORTFOLIO_MAP_CONCURRENCY", "4"))
+PORTFOLIO_MAP_TIER = os.getenv("PORTFOLIO_MAP_TIER", "light")
+PORTFOLIO_MAP_MAX_TOKENS = int(os.getenv("PORTFOLIO_MAP_MAX_TOKENS", "600"))  # 구간 요약 출력 한도
+
+
+def _pack_pages(pages: List[Dict[str, Any]], max_chars: int) -> List[Dict[str, Any]]:
+    # 연속 페이지를 max_chars 이내로 묶음. 한 페이지가 더 길면 줄 경계에서 나눔
+    chunks: List[Dict[str, Any]] = []
+    buf: List[str] = []
+    first = last = 0
+
+    def flush():
+        nonlocal buf
+        text = "".join(buf).strip()
+        if text:
+            chunks.append({"first_page": first, "last_page": last, "text": text})
+        buf = []
+
+    for p in pages:
+        text = p["text"]
+        if buf and sum(len(b) for b in buf) + len(text) > max_chars:
+            flush()
+        if not buf:
+            first = p["page"]
+        last = p["page"]
+        while len(text) > max_chars:
+            cut = text.rfind("\n", 0, max_chars)
+            cut = cut if cut > max_chars // 2 else max_chars
+            buf.append(text[:cut])
+            flush()
+            first = p["page"]
+            text = text[cut:]
+        buf.append(text)
+    flush()
+    return chunks
+
+
+def split_portfolio_chunks(pages: List[Dict[str, Any]], max_chars: int = PORTFOLIO_CHUNK_CHARS) -> List[Dict[str, Any]]:
+    total = sum(len(p["text"]) for p in pages)
+    max_chars = max(max_chars, -(-total // max(PORTFOLIO_MAX_CHUNKS, 1)))
+    chunks = _pack_pages(pages, max_chars)
+    while len(chunks) > PORTFOLIO_MAX_CHUNKS:
+        # 페이지 경계 때문에 구간 수가 넘치면 구간을 키워 다시 묶음
+        max_chars = int(max_chars * 1.5)
+        chunks = _pack_pages(pages, max_chars)
+    if total > PORTFOLIO_MAP_MAX_CHARS and chunks:
+        # 모든 구간이 고르게 반영되도록 구간마다 같은 몫만 남김
+        share = PORTFOLIO_MAP_MAX_CHARS // len(chunks)
+        for c in chunks:
+            c["text"] = c["text"][:share]
+    return chunks
+
+
+async def _summarize_portfolio_chunk(chunk: Dict[str, Any], total_pages: int, user_id: Optional[str]) -> str:
+    system_instruction, user_prompt = get_portfolio_chunk_prompt(
+        chunk["text"], chunk["first_page"], chunk["last_page"], total_pages
+    )
+    tier = MODEL_TIERS[PORTFOLIO_MAP_TIER if PORTFOLIO_MAP_TIER in MODEL_TIERS else "light"]
+    # 구간 텍스트가 같으면(같은 PDF 재업로드, 다른 직무) 결과 재사용
+    chunk_cache = get_cache("portfolio_chunk")
+    cache_key = make_key(tier["model"], PORTFOLIO_MAP_MAX_TOKENS, system_instruction, user_prompt)
+    cached = chunk_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    est_tokens = estimate_tokens(system_instruction) + estimate_tokens(user_prompt) + PORTFOLIO_MAP_MAX_TOKENS
+    # 문서 하나를 나눈 호출이므로 사용자 요청 수는 차감하지 않고 토큰 한도로만 제한
+    circuit = f"chat:{tier['model']}"
+    raise_if_open(circuit)  # 열려 있으면 map_portfolio_chunks가 원문 앞부분으로 대체
+    async with llm_scheduler.slot(user_id, est_tokens, requests=0) as slot:
+        started = time.perf_counter()
+        OPENAI_IN_FLIGHT.inc(kind="chat")
+        try:
+            response = await call_openai(circuit, lambda timeout: get_openai_client().chat.completions.create(
+                model=tier["model"],
+                messages=[{"role": "system", "content": system_instruction}, {"role": "user", "content": user_prompt}],
+                response_format={"type": "json_object"},
+                max_tokens=PORTFOLIO_MAP_MAX_TOKENS,
+                timeout=timeout,
+            ), tier["timeout"])
+        except Exception:
+            record_openai_call("chat", tier["model"], "portfolio_map", time.perf_counter() - started, error=True)
+            raise
+        finally:
+            OPENAI_IN_FLIGHT.dec(kind="chat")
+        slot.actual_tokens = getattr(response.usage, "total_tokens", None)
+    record_openai_call("chat", tier["model"], "portfolio_map", time.perf_counter() - started, response.usage)
+
+    summary = json.loads(response.choices[0].message.content.strip()).get("chunk_summary", "").strip()
+    if summary:
+        chunk_cache.set(cache_key, summary)
+    return summary
+
+
+async def map_portfolio_chunks(pages: List[Dict[str, Any]], user_id: Optional[str] = None) -> List[Dict[str, str]]:
+    """구간별 요약을 동시에(PORTFOLIO_MAP_CONCURRENCY 이하) 생성. reduce 프롬프트용 [{pages, summary}]."""
+    chunks = split_portfolio_chunks(pages)
+    sem = asyncio.Semaphore(max(PORTFOLIO_MAP_CONCURRENCY, 1))
+
+    async def _one(chunk):
+        async with sem:
+            return await _summarize_portfolio_chunk(chunk, len(pages), user_id)
+
+    results = await asyncio.gather(*[_one(c) for c in chunks], return_exceptions=True)
+    summaries = []
+    for chunk, result in zip(chunks, results):
+        if isinstance(result, HTTPException):
+            raise result  # 429 등은 그대로 전달
+        if isinstance(result, BaseException) or not result:
+            # 일부 구간 실패 시 원문 앞부분으로 대체 (전체 요약은 계속 진행)
+            if isinstance(result, BaseException):
+                print("".join(traceback.format_exception(type(result), result, result.__traceback__)))
+            result = chunk["text"][:300] + "..."
+        pages_label = f"{chunk['first_page']}" if chunk["first_page"] == chunk["last_page"] else f"{chunk['first_page']}-{chunk['last_page']}"
+        summaries.append({"pages": pages_label, "summary": result})
+    return summaries
+
+
 async def summarize_portfolio_and_generate_pdf(
     user_id: str,
     file=None,
@@ -354,15 +777,17 @@ async def summarize_portfolio_and_generate_pdf(
 
     if file and getattr(file, "filename", None):
         doc_type_for_prompt = "portfolio_summary_text"
-        contents = await file.read()
-        if len(contents) > 10 * 1024 * 1024:
-            raise HTTPException(status_code=400, detail="파일 크기가 너무 큽니다. 10MB 이하의 파일을 업로드해주세요.")
+        # 업로드를 청크 단위로 임시 파일에 스풀 (크기 초과 시 읽는 도중 413)
+        spooled_path, _, upload_sha256 = await spool_upload(file)
         try:
-            reader = PyPDF2.PdfReader(io.BytesIO(contents))
-            extracted_text = "".join([(page.extract_text() or "") for page in reader.pages])
+            pdf_doc = await extract_pdf_pages(spooled_path, upload_sha256)
+            pdf_pages = pdf_doc["pages"]
+            extracted_text = "".join(p["text"] for p in pdf_doc["pages"])
         except Exception as e:
             traceback.print_exc()
             raise HTTPException(status_code=400, detail=f"PDF 처리 중 오류: {e}")
+        finally:
+            discard_spooled(spooled_path)
         if not extracted_text.strip():
             raise HTTPException(status_code=400, detail="PDF에서 텍스트를 추출하지 못했습니다. 스캔 PDF일 수 있습니다.")
         prompt_content_for_ai = {"extracted_text": extracted_text}
@@ -378,29 +803,38 @@ async def summarize_portfolio_and_generate_pdf(
     # AI 요약 & 피드백
     try:
         job_slug = (job_title or "").replace(" ", "-").replace("/", "-").lower()
-        relevant_history_entries = await retrieve_relevant_feedback_history(
-            user_id=user_id,
-            job_slug=job_slug,
-            doc_type=doc_type_for_prompt,
-            current_content=prompt_content_for_ai,
-            current_version=version or 1,
-            top_k=2,
-        )
+        with stage_timer("portfolio_summary", "history_retrieval"):
+            relevant_history_entries = await retrieve_relevant_feedback_history(
+                user_id=user_id,
+                job_slug=job_slug,
+                doc_type=doc_type_for_prompt,
+                current_content=prompt_content_for_ai,
+                current_version=version or 1,
+                top_k=2,
+            )
         prev = relevant_history_entries[0] if relevant_history_entries else None
         older = relevant_history_entries[1] if len(relevant_history_entries) > 1 else None
 
-        company_analysis = await load_company_analysis(user_id)
-
-        ai_response_json = await get_ai_feedback(
-            job_title or "",
-            doc_type_for_prompt,
-            prompt_content_for_ai,
-            previous_document_data=prev,
-            older_document_data=older,
-            additional_user_context=feedback_reflection,
-            company_name=company_name,
-            company_analysis=company_analysis,
-        )
+        with stage_timer("portfolio_summary", "company_load"):
+            company_analysis = await load_company_analysis(user_id)
+
+        if doc_type_for_prompt == "portfolio_summary_text" and len(prompt_content_for_ai["extracted_text"]) > PORTFOLIO_DIRECT_MAX_CHARS:
+            # 긴 문서는 구간별 요약(map) 후 한 번 더 종합(reduce)해 전체 내용을 반영
+            with stage_timer("portfolio_summary", "llm_map"):
+                prompt_content_for_ai["chunk_summaries"] = await map_portfolio_chunks(pdf_pages, user_id=user_id)
+
+        with stage_timer("portfolio_summary", "llm_call"):
+            ai_response_json = await get_ai_feedback(
+                job_title or "",
+                doc_type_for_prompt,
+                prompt_content_for_ai,
+                previous_document_data=prev,
+                older_document_data=older,
+                additional_user_context=feedback_reflection,
+                company_name=company_name,
+                company_analysis=company_analysis,
+                user_id=user_id,
+            )
         if ai_response_json.status_code != 200:
             data = json.loads(ai_response_json.body.decode("utf-8"))
             raise HTTPException(status_code=ai_response_json.status_code, detail=data.get("error", "AI 호출 오류"))
@@ -418,32 +852,36 @@ async def summarize_portfolio_and_generate_pdf(
 
     # PDF 생성 & 저장
     try:
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_auto_page_break(auto=True, margin=15)
-
-        font_path = BASE_DIR / "static" / "fonts" / "NotoSansKR-Regular.ttf"
-        if not font_path.exists():
-            raise FileNotFoundError(f"폰트 파일을 찾을 수 없습니다: {font_path}")
-        pdf.add_font("NotoSansKR", "", str(font_path), uni=True)
-        pdf.set_font("NotoSansKR", "", 12)
-
-        title_text = f"{job_title or '포트폴리오'} 요약본\n"
-        pdf.multi_cell(0, 10, txt=title_text, align="C")
-        pdf.ln(10)
-        pdf.set_font("NotoSansKR", "", 14)
-        pdf.cell(0, 10, "▶ 포트폴리오 요약", ln=1, align="L")
-        pdf.set_font("NotoSansKR", "", 12)
-        pdf.multi_cell(0, 10, txt=overall_summary_text)
-        pdf.ln(10)
+        with stage_timer("portfolio_summary", "pdf_render"):
+            from fpdf import FPDF  # 포트폴리오 요약에서만 필요하므로 지연 import
+
+            pdf = FPDF()
+            pdf.add_page()
+            pdf.set_auto_page_break(auto=True, margin=15)
+
+            font_path = PDF_FONT_PATH
+            if not font_path.exists():
+                raise FileNotFoundError(f"폰트 파일을 찾을 수 없습니다: {font_path}")
+            pdf.add_font("NotoSansKR", "", str(font_path), uni=True)
+            pdf.set_font("NotoSansKR", "", 12)
+
+            title_text = f"{job_title or '포트폴리오'} 요약본\n"
+            pdf.multi_cell(0, 10, txt=title_text, align="C")
+            pdf.ln(10)
+            pdf.set_font("NotoSansKR", "", 14)
+            pdf.cell(0, 10, "▶ 포트폴리오 요약", ln=1, align="L")
+            pdf.set_font("NotoSansKR", "", 12)
+            pdf.multi_cell(0, 10, txt=overall_summary_text)
+            pdf.ln(10)
 
         job_slug = (job_title or "portfolio").replace(" ", "-").replace("/", "-").lower()
-        out_dir = _user_doc_dir(user_id, job_slug, "portfolio")
+        out_dir = user_doc_dir(user_id, job_slug, "portfolio")
         os.makedirs(out_dir, exist_ok=True)
 
         pdf_filename = f"v{(version or 1)}_summary.pdf"
         pdf_file_path = out_dir / pdf_filename
-        pdf.output(str(pdf_file_path))
+        with stage_timer("portfolio_summary", "disk_write"):
+            pdf.output(str(pdf_file_path))
 
         return str(pdf_file_path), f"/api/download_pdf/{job_slug}/portfolio/{pdf_filename}", overall_summary_text
 
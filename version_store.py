@@ -0,0 +1,261 @@
+# version_store.py
+# 문서 버전 디렉터리(users/<샤드>/<user>/<job>/<doc_type>/vN.json)의 head 포인터와 롤백 tombstone.
+#  - HEAD.json: {"head": N, "tombstones": [...]} → head 이하 버전만 보임 (없으면 모든 vN.json이 보임)
+#  - 롤백은 head를 옮기고 tombstone을 남기는 것뿐 (원자적 교체, 버려지는 버전 수와 무관하게 일정 시간)
+#  - 버려진 vN.json / vN_summary.pdf는 ROLLBACK_UNDO_WINDOW_SEC 이후 백그라운드 GC가 삭제
+#    그 전에는 undo_rollback으로 되돌릴 수 있음
+#  - 새 버전을 쓰면 head가 앞으로 가고, 겹치는 tombstone은 범위가 줄어 undo 불가가 됨
+import asyncio
+import fcntl
+import os
+import re
+import threading
+import time
+import traceback
+import uuid
+import weakref
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+import fastjson
+from metrics import Counter, Gauge
+from user_paths import iter_doc_dirs, iter_user_dirs
+
+ROLLBACK_UNDO_WINDOW_SEC = float(os.getenv("ROLLBACK_UNDO_WINDOW_SEC", "600"))
+VERSION_GC_INTERVAL_SEC = float(os.getenv("VERSION_GC_INTERVAL_SEC", "30"))
+VERSION_GC_ENABLED = os.getenv("VERSION_GC_ENABLED", "1") not in ("0", "false", "False")
+
+HEAD_FILE = "HEAD.json"
+LOCK_FILE = ".lock"
+_VERSION_RE = re.compile(r"v(\d+)\.json")
+
+VERSION_GC_FILES = Counter("version_gc_files_total", "Files removed by the version garbage collector", ("kind",))
+VERSION_GC_BYTES = Counter("version_gc_bytes_total", "Bytes reclaimed by the version garbage collector")
+VERSION_GC_PENDING = Gauge("version_gc_pending_dirs", "Document directories with tombstones awaiting collection")
+
+# 잠금을 쓰는 동안만 남아 있음 (쓰는 쪽이 강한 참조를 쥐고, 아무도 안 쓰면 자동으로 빠짐)
+_thread_locks: "weakref.WeakValueDictionary[str, threading.Lock]" = weakref.WeakValueDictionary()
+_thread_locks_guard = threading.Lock()
+# 이 프로세스에서 롤백한 디렉터리 (나머지는 기동 시 전체 스캔으로 찾음)
+_pending: Set[str] = set()
+
+
+# =========================
+# HEAD 파일
+# =========================
+@contextmanager
+def doc_dir_lock(doc_dir: Path):
+    # 같은 프로세스의 스레드끼리는 threading.Lock, 워커 프로세스끼리는 flock
+    key = str(doc_dir)
+    with _thread_locks_guard:
+        lock = _thread_locks.get(key)
+        if lock is None:
+            lock = _thread_locks[key] = threading.Lock()
+    with lock:
+        doc_dir.mkdir(parents=True, exist_ok=True)
+        with open(doc_dir / LOCK_FILE, "a+b") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def read_head(doc_dir: Path) -> Optional[Dict[str, Any]]:
+    try:
+        return fastjson.load_file(doc_dir / HEAD_FILE)
+    except FileNotFoundError:
+        return None
+
+
+def _write_head(doc_dir: Path, state: Dict[str, Any]) -> None:
+    # 임시 파일에 쓴 뒤 os.replace → 읽는 쪽은 항상 이전 또는 새 HEAD 전체를 봄
+    tmp = doc_dir / f".{HEAD_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(fastjson.dumps(state))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, doc_dir / HEAD_FILE)
+
+
+def _scan_versions(doc_dir: Path) -> List[int]:
+    if not doc_dir.is_dir():
+        return []
+    return sorted(int(m.group(1)) for m in (_VERSION_RE.fullmatch(n) for n in os.listdir(doc_dir)) if m)
+
+
+def visible_versions(doc_dir: Path) -> List[int]:
+    versions = _scan_versions(doc_dir)
+    state = read_head(doc_dir)
+    if state is None:
+        return versions
+    return [v for v in versions if v <= state["head"]]
+
+
+def list_version_files(doc_dir: Path) -> List[str]:
+    """head 이하 버전 파일명 (버전 오름차순)."""
+    return [f"v{v}.json" for v in visible_versions(doc_dir)]
+
+
+def is_visible(doc_dir: Path, version: int) -> bool:
+    state = read_head(doc_dir)
+    return state is None or version <= state["head"]
+
+
+# =========================
+# 쓰기 / 롤백 / 되돌리기
+# =========================
+def advance_head(doc_dir: Path, versions: Iterable[int]) -> None:
+    """vN.json을 쓴 뒤 호출. head를 앞으로 옮기고 새로 쓴 버전과 겹치는 tombstone은 취소(범위 축소)."""
+    if not (doc_dir / HEAD_FILE).exists():
+        return  # 롤백한 적이 없으면 모든 파일이 보이므로 할 일 없음
+    with doc_dir_lock(doc_dir):
+        _advance_head_locked(doc_dir, max(versions))
+
+
+def write_versions(doc_dir: Path, versions: Iterable[int], write: Callable[[], None]) -> None:
+    """write()로 vN.json을 쓰고 head를 옮기는 것을 한 잠금 안에서 (GC가 방금 쓴 파일을 지우지 않도록)."""
+    versions = list(versions)
+    with doc_dir_lock(doc_dir):
+        write()
+        _advance_head_locked(doc_dir, max(versions))
+
+
+def _advance_head_locked(doc_dir: Path, newest: int) -> None:
+    state = read_head(doc_dir)
+    if state is None or newest <= state["head"]:
+        return
+    state["head"] = newest
+    kept = []
+    for t in state["tombstones"]:
+        if newest > t["after"]:
+            # newest 이하 파일은 새 내용이므로 GC/undo 대상에서 제외
+            t["after"] = newest
+            t["undoable"] = False
+        if t["after"] < t["upto"]:
+            kept.append(t)
+    state["tombstones"] = kept
+    _write_head(doc_dir, state)
+
+
+def rollback(doc_dir: Path, target: int) -> Dict[str, Any]:
+    """head를 target으로. ValueError: 범위 밖. 반환: {"previous_head", "tombstone"}"""
+    with doc_dir_lock(doc_dir):
+        state = read_head(doc_dir)
+        if state is None:
+            versions = _scan_versions(doc_dir)
+            if not versions:
+                raise FileNotFoundError("No versions to rollback")
+            state = {"head": versions[-1], "tombstones": []}
+        previous_head = state["head"]
+        if target < 0 or target > previous_head:
+            raise ValueError("Invalid target version")
+        tombstone = None
+        if target < previous_head:
+            tombstone = {
+                "id": uuid.uuid4().hex,
+                "after": target,
+                "upto": previous_head,
+                "at": time.time(),
+                "undoable": True,
+            }
+            state["tombstones"].append(tombstone)
+            state["head"] = target
+            _write_head(doc_dir, state)
+    if tombstone is not None:
+        _pending.add(str(doc_dir))
+        VERSION_GC_PENDING.set(len(_pending))
+    return {"previous_head": previous_head, "tombstone": tombstone}
+
+
+def undo_rollback(doc_dir: Path, tombstone_id: Optional[str] = None) -> Dict[str, Any]:
+    """가장 최근(또는 지정한) 롤백을 되돌림. LookupError: 되돌릴 수 있는 롤백이 없음."""
+    with doc_dir_lock(doc_dir):
+        state = read_head(doc_dir)
+        candidates = [t for t in (state or {}).get("tombstones", []) if t.get("undoable")]
+        if tombstone_id:
+            candidates = [t for t in candidates if t["id"] == tombstone_id]
+        # head 바로 위에서 시작하는(가장 최근) 롤백만 되돌릴 수 있음
+        candidates = [t for t in candidates if t["after"] == state["head"]]
+        if not candidates:
+            raise LookupError("No rollback to undo")
+        t = max(candidates, key=lambda x: x["at"])
+        state["tombstones"] = [x for x in state["tombstones"] if x["id"] != t["id"]]
+        state["head"] = t["upto"]
+        _write_head(doc_dir, state)
+    return {"head": t["upto"], "undone": t["id"]}
+
+
+# =========================
+# 백그라운드 GC
+# =========================
+def collect(doc_dir: Path, now: Optional[float] = None, grace: float = ROLLBACK_UNDO_WINDOW_SEC) -> Dict[str, int]:
+    """undo 기간이 지난 tombstone의 파일 삭제. {"files", "bytes"}"""
+    now = time.time() if now is None else now
+    if not (doc_dir / HEAD_FILE).exists():
+        _pending.discard(str(doc_dir))
+        return {"files": 0, "bytes": 0}
+    with doc_dir_lock(doc_dir):
+        state = read_head(doc_dir)
+        if state is None:
+            return {"files": 0, "bytes": 0}
+        due = [t for t in state["tombstones"] if t["at"] + grace <= now]
+        if not due:
+            return {"files": 0, "bytes": 0}
+        # 먼저 HEAD에서 제거 (이후로는 undo 불가) → 같은 잠금 안에서 파일 삭제
+        # (vN 쓰기와 head 이동도 이 잠금 안에서 하므로 head 위의 파일은 버려진 것뿐)
+        state["tombstones"] = [t for t in state["tombstones"] if t not in due]
+        head = state["head"]
+        _write_head(doc_dir, state)
+
+        files = nbytes = 0
+        for t in due:
+            for v in range(max(t["after"], head) + 1, t["upto"] + 1):
+                for name, kind in ((f"v{v}.json", "version"), (f"v{v}_summary.pdf", "summary_pdf")):
+                    p = doc_dir / name
+                    try:
+                        st = p.stat()
+                    except FileNotFoundError:
+                        continue
+                    if st.st_mtime > t["at"]:
+                        continue  # 롤백 이후에 새로 쓴 파일
+                    p.unlink(missing_ok=True)
+                    files += 1
+                    nbytes += st.st_size
+                    VERSION_GC_FILES.inc(kind=kind)
+    if not state["tombstones"]:
+        _pending.discard(str(doc_dir))
+    VERSION_GC_BYTES.inc(nbytes)
+    return {"files": files, "bytes": nbytes}
+
+
+def find_pending(users_dir: Path) -> List[Path]:
+    # 기동 시 한 번: tombstone이 남은 디렉터리 (다른 워커/이전 프로세스가 롤백한 것 포함)
+    found = []
+    for user_dir in iter_user_dirs(users_dir):
+        for doc_dir in iter_doc_dirs(user_dir):
+            try:
+                if (read_head(doc_dir) or {}).get("tombstones"):
+                    found.append(doc_dir)
+            except Exception:
+                traceback.print_exc()
+    return found
+
+
+async def run_version_gc(users_dir: Path, interval: float = VERSION_GC_INTERVAL_SEC) -> None:
+    try:
+        for d in await asyncio.to_thread(find_pending, users_dir):
+            _pending.add(str(d))
+    except Exception:
+        traceback.print_exc()
+    while True:
+        VERSION_GC_PENDING.set(len(_pending))
+        for d in list(_pending):
+            try:
+                result = await asyncio.to_thread(collect, Path(d))
+                if result["files"]:
+                    print(f"[version-gc] {d}: removed {result['files']} files ({result['bytes']} bytes)")
+            except Exception:
+                traceback.print_exc()
+        await asyncio.sleep(interval)
@@ -0,0 +1,160 @@
+# warmup.py
+# 기동 후 워밍업 단계와 readiness 상태.
+#  - import 시점에는 무거운 의존성(openai, PyPDF2, fpdf, numpy)을 불러오지 않고,
+#    startup 이후 워밍업 단계에서 미리 로드 → 첫 요청 지연 없이 기동 시간만 단축
+#  - WARMUP_STEPS 로 실행할 단계 선택 (기본 all, none이면 워밍업 없이 즉시 ready)
+#  - /readyz 는 워밍업이 끝나야 200, 그 전에는 503 (로드밸런서/오토스케일러가 트래픽을 보내지 않도록)
+import asyncio
+import os
+import time
+import traceback
+from typing import Any, Callable, Dict, List, Optional
+
+from metrics import Gauge
+
+WARMUP_STEPS = os.getenv("WARMUP_STEPS", "all")
+# 1이면 워밍업이 끝날 때까지 startup을 막음 (기본은 백그라운드로 진행하고 readiness로 알림)
+WARMUP_BLOCKING = os.getenv("WARMUP_BLOCKING", "0") in ("1", "true", "True")
+IMPORT_TIME_BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", "1500"))
+
+APP_IMPORT_SECONDS = Gauge("app_import_seconds", "Time spent importing main.py")
+WARMUP_STEP_SECONDS = Gauge("warmup_step_seconds", "Duration of each warm-up step", ("step",))
+APP_READY = Gauge("app_ready", "1 once warm-up has finished")
+
+_STEPS: Dict[str, Callable[[], Any]] = {}
+
+state: Dict[str, Any] = {
+    "ready": False,
+    "import_ms": None,
+    "import_budget_ms": IMPORT_TIME_BUDGET_MS,
+    "warmup_ms": None,
+    "steps": {},
+}
+
+
+def warmup_step(name: str):
+    # 다른 모듈에서도 @warmup_step("이름") 으로 단계를 추가할 수 있음 (동기 함수, 스레드에서 실행)
+    def deco(fn: Callable[[], Any]):
+        _STEPS[name] = fn
+        return fn
+    return deco
+
+
+def record_import_time(seconds: float) -> None:
+    state["import_ms"] = round(seconds * 1000, 1)
+    APP_IMPORT_SECONDS.set(seconds)
+    if state["import_ms"] > IMPORT_TIME_BUDGET_MS:
+        print(f"[warmup] import took {state['import_ms']}ms (budget {IMPORT_TIME_BUDGET_MS:.0f}ms)")
+
+
+def selected_steps() -> List[str]:
+    spec = WARMUP_STEPS.strip().lower()
+    if spec in ("", "none", "0"):
+        return []
+    if spec == "all":
+        return list(_STEPS)
+    return [s.strip() for s in spec.split(",") if s.strip() in _STEPS]
+
+
+async def run_warmup() -> None:
+    started = time.perf_counter()
+    for name in selected_steps():
+        t0 = time.perf_counter()
+        try:
+            detail = await asyncio.to_thread(_STEPS[name])
+            result: Dict[str, Any] = {"ok": True}
+            if detail is not None:
+                result["detail"] = detail
+        except Exception as e:
+            # 워밍업 실패는 첫 요청에서 다시 시도되므로 readiness는 막지 않음
+            traceback.print_exc()
+            result = {"ok": False, "error": str(e)}
+        result["ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        state["steps"][name] = result
+        WARMUP_STEP_SECONDS.set(result["ms"] / 1000, step=name)
+    state["warmup_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    state["ready"] = True
+    APP_READY.set(1)
+    print(f"[warmup] ready in {state['warmup_ms']}ms: " + ", ".join(f"{k}={v['ms']}ms" for k, v in state["steps"].items()))
+
+
+def readiness() -> Dict[str, Any]:
+    return {"status": "ready" if state["ready"] else "warming_up", **state}
+
+
+# =========================
+# 기본 단계
+# =========================
+@warmup_step("dirs")
+def _dirs() -> None:
+    from user_paths import USERS_DIR
+
+    USERS_DIR.mkdir(parents=True, exist_ok=True)
+
+
+@warmup_step("openai_client")
+def _openai_client() -> None:
+    from utils import get_openai_client
+
+    get_openai_client()
+
+
+@warmup_step("job_tables")
+def _job_tables() -> int:
+    from job_data import ALL_JOB_SLUGS, JOB_DOCUMENT_SCHEMAS, get_job_document_schema
+
+    for slug in ALL_JOB_SLUGS:
+        for doc_type in JOB_DOCUMENT_SCHEMAS:
+            get_job_document_schema(slug, doc_type)
+    return len(ALL_JOB_SLUGS)
+
+
+@warmup_step("static_manifest")
+def _static_manifest() -> int:
+    from static_assets import load_manifest
+
+    return len(load_manifest())
+
+
+@warmup_step("cache")
+def _cache() -> Dict[str, Any]:
+    # 공유 캐시(sqlite 연결/스키마 또는 redis 연결)를 첫 요청 전에 열어 둠
+    from cache import cache_stats, get_cache
+
+    get_cache("embedding")
+    return cache_stats()["shared"]
+
+
+@warmup_step("numpy")
+def _numpy() -> None:
+    from utils import _cosine_similarity
+
+    _cosine_similarity([1.0, 0.0], [1.0, 0.0])
+
+
+@warmup_step("local_embedding")
+def _local_embedding() -> str:
+    # IDF 표 로드 (OpenAI 장애 시 대체 경로도 첫 호출부터 빠르게)
+    from embeddings import local_vectorizer
+
+    local = local_vectorizer()
+    local.embed("워밍업")
+    return local.model_id
+
+
+@warmup_step("pdf_libs")
+def _pdf_libs() -> None:
+    import PyPDF2  # noqa: F401
+    import fpdf  # noqa: F401
+
+
+@warmup_step("fonts")
+def _fonts() -> Optional[str]:
+    # 한글 폰트를 한 번 등록해 fpdf 폰트 캐시(.pkl)를 만들고 디스크 캐시에 올려 둠
+    from fpdf import FPDF
+    from utils import PDF_FONT_PATH
+
+    if not PDF_FONT_PATH.exists():
+        return f"missing {PDF_FONT_PATH.name}"
+    FPDF().add_font("NotoSansKR", "", str(PDF_FONT_PATH), uni=True)
+    return None